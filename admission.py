@@ -0,0 +1,204 @@
+"""Admission control: keep server threads free for the tills.
+
+Each worker process serves WEB_THREADS requests at a time. Requests fall in
+three classes, by endpoint:
+
+  critical  billing and product lookup (CRITICAL): always admitted
+  heavy     PDFs, invoice lists, exports, dashboard (HEAVY): at most
+            ADMISSION_HEAVY_LIMIT at once, the rest wait in a queue of
+            ADMISSION_HEAVY_QUEUE for up to ADMISSION_QUEUE_TIMEOUT seconds
+  normal    everything else
+
+  stream    event streams (STREAMS): hold their thread for as long as a
+            page is open; at most ADMISSION_STREAM_LIMIT at once, no queue
+
+Heavy, normal and stream requests together may hold at most WEB_THREADS -
+ADMISSION_RESERVED threads, waiting ones included (a queued request still
+occupies its thread). So the reserved threads are only ever used by
+critical requests. A request that finds no room is shed with
+503 and Retry-After instead of stalling the till behind it. A stream keeps
+its place until the client goes away, not just until the view returns.
+
+Static assets and the metrics endpoints (EXEMPT) are not counted: they must
+answer while the server is overloaded.
+"""
+import threading
+import time
+
+from flask import g, jsonify, make_response, request
+
+
+CRITICAL = {
+    'create_bill', 'createbill_api', 'api_product_lookup', 'search_products', 'search_product_by_barcode',
+    'api_product_changes', 'create_draft', 'get_draft', 'save_draft_changes', 'finalize_draft', 'save_draft',
+    'quick_add_customer', 'confirm_payment', 'complete_payment', 'billing', 'login',
+}
+HEAVY = {
+    'generate_pdf', 'print_receipt', 'print_invoice', 'invoices', 'dashboard', 'api_report',
+    'day_close', 'day_close_pdf', 'api_gstr1_generate', 'gstr1_file',
+}
+STREAMS = {'dashboard_stream', 'inventory_alerts'}
+EXEMPT = {
+    'static', 'asset', 'worker_metrics', 'query_cache_metrics', 'memory_metrics', 'db_routing_metrics',
+    'admission_metrics',
+}
+
+_state = {"enabled": False, "capacity": 8, "reserved": 2, "retry_after": 5}
+
+
+class Gate:
+    """At most `limit` holders; up to `queue_size` more wait (FIFO-ish) for `timeout` seconds."""
+
+    def __init__(self, limit, queue_size=0, timeout=0.0):
+        self.limit, self.queue_size, self.timeout = limit, queue_size, timeout
+        self.cond = threading.Condition()
+        self.active = self.waiting = 0
+        self.stats = {"admitted": 0, "queued": 0, "shed": 0, "max_queue_depth": 0, "wait_seconds": 0.0}
+
+    def acquire(self):
+        with self.cond:
+            if self.active < self.limit and not self.waiting:
+                self.active += 1
+                self.stats["admitted"] += 1
+                return True
+            if self.waiting >= self.queue_size:
+                self.stats["shed"] += 1
+                return False
+            self.waiting += 1
+            self.stats["queued"] += 1
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.waiting)
+            started = time.monotonic()
+            deadline = started + self.timeout
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["shed"] += 1
+                        return False
+                    self.cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+                self.stats["wait_seconds"] += time.monotonic() - started
+            self.active += 1
+            self.stats["admitted"] += 1
+            return True
+
+    def release(self):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify()
+
+    def snapshot(self):
+        with self.cond:
+            stats = dict(self.stats, in_flight=self.active, queue_depth=self.waiting, limit=self.limit)
+        attempts = stats["admitted"] + stats["shed"]
+        waited = stats.pop("wait_seconds")
+        stats["shed_rate"] = round(stats["shed"] / attempts, 4) if attempts else 0.0
+        stats["avg_wait_ms"] = round(waited * 1000 / stats["queued"], 1) if stats["queued"] else 0.0
+        return stats
+
+
+_gates = {}
+_critical = {"in_flight": 0, "admitted": 0}
+_shed_by_endpoint = {}
+_lock = threading.Lock()
+
+
+def init_app(app):
+    if not app.config.get('ADMISSION'):
+        return
+    capacity = app.config.get('WEB_THREADS', 8)
+    reserved = min(app.config.get('ADMISSION_RESERVED', 2), capacity - 1)
+    _state.update(enabled=True, capacity=capacity, reserved=reserved,
+                  retry_after=app.config.get('ADMISSION_RETRY_AFTER', 5))
+    # Threads heavy and normal requests may occupy, waiting or running
+    _gates["shared"] = Gate(capacity - reserved)
+    _gates["heavy"] = Gate(min(app.config.get('ADMISSION_HEAVY_LIMIT', 2), capacity - reserved),
+                           app.config.get('ADMISSION_HEAVY_QUEUE', 2),
+                           app.config.get('ADMISSION_QUEUE_TIMEOUT', 5))
+    _gates["streams"] = Gate(min(app.config.get('ADMISSION_STREAM_LIMIT', 2), capacity - reserved))
+    # First in line, so a shed request does no other work
+    app.before_request_funcs.setdefault(None, []).insert(0, _admit)
+    app.after_request(_hold_stream)
+    app.teardown_request(_release)
+
+
+def classify(endpoint):
+    if endpoint in EXEMPT or endpoint is None:
+        return 'exempt'
+    if endpoint in CRITICAL:
+        return 'critical'
+    if endpoint in STREAMS:
+        return 'stream'
+    return 'heavy' if endpoint in HEAVY else 'normal'
+
+
+def _admit():
+    kind = classify(request.endpoint)
+    if kind == 'exempt':
+        return None
+    if kind == 'critical':
+        with _lock:
+            _critical["in_flight"] += 1
+            _critical["admitted"] += 1
+        g.admission = ('critical',)
+        return None
+
+    held = []
+    if _gates["shared"].acquire():
+        held.append("shared")
+        if kind in ('heavy', 'stream'):
+            gate = 'heavy' if kind == 'heavy' else 'streams'
+            if _gates[gate].acquire():
+                held.append(gate)
+            else:
+                _gates["shared"].release()
+                held = []
+    if not held:
+        with _lock:
+            _shed_by_endpoint[request.endpoint] = _shed_by_endpoint.get(request.endpoint, 0) + 1
+        return _busy()
+    g.admission = tuple(held)
+    return None
+
+
+def _hold_stream(response):
+    # The request ends when the view returns, the stream when the client leaves
+    if g.get('admission', ())[-1:] == ('streams',) and response.is_streamed:
+        held = g.pop('admission')
+        response.call_on_close(lambda: _free(held))
+    return response
+
+
+def _release(exc=None):
+    _free(g.pop('admission', ()))
+
+
+def _free(held):
+    if held == ('critical',):
+        with _lock:
+            _critical["in_flight"] -= 1
+        return
+    for name in reversed(held):
+        _gates[name].release()
+
+
+def _busy():
+    message = 'Server busy, please retry shortly'
+    if request.path.startswith('/api/') or request.is_json or request.accept_mimetypes.best == 'application/json':
+        response = make_response(jsonify({'error': message, 'retry_after': _state["retry_after"]}), 503)
+    else:
+        response = make_response(message, 503)
+    response.headers['Retry-After'] = str(_state["retry_after"])
+    return response
+
+
+def stats():
+    if not _state["enabled"]:
+        return {"enabled": False}
+    with _lock:
+        critical = dict(_critical)
+        shed = dict(_shed_by_endpoint)
+    return {"enabled": True, "capacity": _state["capacity"], "reserved_for_critical": _state["reserved"],
+            "critical": critical, "shared": _gates["shared"].snapshot(), "heavy": _gates["heavy"].snapshot(),
+            "streams": _gates["streams"].snapshot(), "shed_by_endpoint": shed}
@@ -1,19 +1,36 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, send_file
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, send_file, Response
 from flask_mysqldb import MySQL
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch
+import click
 import datetime
 import json
 import os
-import io
+import time
 import MySQLdb.cursors  
 from config import Config
+import admission
+import catalog
+import compression
+import customers as customers_db
+import drafts
+import events
+import fuzzy
+import idempotency
+import inventory
+import memprofile
+import migrations
+import partitions
+import printing
+import popularity
+import querycache
+import replicas
+import reports
+import shards
+import snapshots
+import versions
+import workers
+from events import broadcaster
 
 app = Flask(__name__)
 app.config.from_object(Config)
@@ -26,34 +43,323 @@ app.config['MYSQL_DB'] = Config.MYSQL_DB
 app.config['MYSQL_PORT'] = Config.MYSQL_PORT
 
 mysql = MySQL(app)
+replicas.init_app(app, mysql)
+shards.init_app(app, mysql)
+compression.init_app(app)
+querycache.init_app(app)
+events.init_app(app)
+memprofile.init_app(app)
+admission.init_app(app)
+snapshots.register('fuzzy', fuzzy.versions, fuzzy.dump, fuzzy.restore)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
 class User(UserMixin):
-    def __init__(self, id, username):
+    def __init__(self, id, username, store_id=None):
         self.id = id
         self.username = username
+        self.store_id = store_id or shards.DEFAULT_STORE_ID
 
 @login_manager.user_loader
 def load_user(user_id):
     cur = mysql.connection.cursor()
-    cur.execute("SELECT * FROM users WHERE id = %s", (user_id,))
+    cur.execute("SELECT id, username, store_id FROM users WHERE id = %s", (user_id,))
     user = cur.fetchone()
     cur.close()
     if user:
-        return User(user[0], user[1])  
+        return User(user[0], user[1], user[2])
     return None
 
 
 def get_db_connection():
     return mysql.connection
 
+def store_db():
+    # Shard holding the logged-in user's store
+    return shards.connection()
+
+def read_db():
+    # Replica (or primary fallback) for read-only queries on the user's store
+    if shards.is_default():
+        return replicas.read_connection()
+    return shards.connection()
+
+
+def cached_rows(name, tables, sql, params=()):
+    # Served from the query cache while `tables` are unchanged; rows are shared, do not modify them
+    return querycache.fetch(read_db, shards.current_store_id(), name, tables, sql, params)
+
+def tagged_rows(name, tables, sql, params=()):
+    # cached_rows plus `.etag`, the versions of `tables` the rows were read at
+    return querycache.fetch(read_db, shards.current_store_id(), name, tables, sql, params,
+                            query=versions.tagged_query(tables))
+
+def invalidate(*tables):
+    # After commit: drops cached results reading these tables in every worker
+    querycache.invalidate(shards.current_store_id(), *tables)
+
+
+printing.init_app(app, read_db)
+
+
 def generate_bill_number():
     today = datetime.datetime.now()
     return f"BILL{today.strftime('%Y%m%d%H%M%S')}"
 
 
+def publish_bill_event(bill_id, bill_number, customer_id, final_amount):
+    # One event per committed bill, fanned out to every open dashboard on this host
+    customer = None
+    if customer_id:
+        try:
+            cur = store_db().cursor()
+            cur.execute("SELECT name FROM customers WHERE id = %s", (customer_id,))
+            row = cur.fetchone()
+            cur.close()
+            customer = row[0] if row else None
+        except MySQLdb.Error:
+            pass
+
+    amount = float(final_amount or 0)
+    broadcaster.publish(f'dashboard:{shards.current_store_id()}', {
+        'today_sales_delta': amount,
+        'bill_count_delta': 1,
+        'bill': {
+            'id': bill_id,
+            'bill_number': bill_number,
+            'customer': customer,
+            'final_amount': amount,
+            'created_at': datetime.datetime.now().strftime('%Y-%m-%d %H:%M'),
+        },
+    }, event='bill')
+
+
+_schema_state = {}
+# While migrations are pending, look again this often, so workers notice
+# `db-upgrade` without a restart
+SCHEMA_RECHECK_SECONDS = 5
+
+@app.before_request
+def check_schema():
+    # Once per process, then every few seconds until nothing is pending:
+    # compare applied migrations with database/migrations
+    if Config.MIGRATIONS_CHECK == 'off':
+        return
+    first = 'pending' not in _schema_state
+    if first or (_schema_state['pending']
+                 and time.monotonic() - _schema_state['checked_at'] >= SCHEMA_RECHECK_SECONDS):
+        pending, changed = migrations.status(mysql.connection)
+        _schema_state.update(pending=pending, checked_at=time.monotonic())
+        if first:
+            for version, name in pending:
+                app.logger.warning("Migration %04d_%s has not been applied", version, name)
+            for version, name in changed:
+                app.logger.warning("Migration %04d_%s changed after it was applied", version, name)
+        elif not pending:
+            app.logger.info("Schema is up to date")
+    if _schema_state['pending'] and Config.MIGRATIONS_CHECK == 'fail':
+        return "Database schema is out of date. Run: flask --app app db-upgrade", 503
+
+
+@app.before_request
+def start_background_workers():
+    # One process per host runs the jobs, however many server workers there are
+    if not Config.BACKGROUND_WORKERS or not workers.is_leader(Config.LEADER_LOCK_PATH):
+        return
+    printing.start_pdf_workers()
+    workers.start_periodic(app, 'reports', Config.REPORT_REFRESH_SECONDS,
+                           lambda: shards.for_each_shard(
+                               lambda conn, store_id: reports.refresh_facts(conn)))
+    workers.start_periodic(app, 'inventory', Config.INVENTORY_REFRESH_SECONDS,
+                           lambda: shards.for_each_shard(
+                               lambda conn, store_id: inventory.refresh_low_stock(
+                                   conn,
+                                   window_days=Config.VELOCITY_WINDOW_DAYS,
+                                   lead_time_days=Config.REORDER_LEAD_TIME_DAYS,
+                                   safety_days=Config.REORDER_SAFETY_DAYS,
+                                   min_stock=Config.LOW_STOCK_MIN,
+                                   channel=f'inventory:{store_id}')))
+    workers.start_periodic(app, 'popularity', Config.POPULARITY_REFRESH_SECONDS,
+                           lambda: shards.for_each_shard(
+                               lambda conn, store_id: popularity.refresh_popularity(
+                                   conn, half_life_days=Config.POPULARITY_HALF_LIFE_DAYS)))
+    workers.start_periodic(app, 'idempotency', 3600,
+                           lambda: shards.for_each_shard(
+                               lambda conn, store_id: idempotency.purge(conn, Config.IDEMPOTENCY_KEY_HOURS)))
+    workers.start_periodic(app, 'drafts', 3600,
+                           lambda: shards.for_each_shard(
+                               lambda conn, store_id: drafts.purge(conn, Config.DRAFT_ABANDON_HOURS)))
+    workers.start_periodic(app, 'catalog', 86400,
+                           lambda: shards.for_each_shard(
+                               lambda conn, store_id: catalog.purge_tombstones(
+                                   conn, Config.CATALOG_TOMBSTONE_DAYS)))
+    if Config.GSTIN:
+        workers.start_periodic(app, 'gstr1', 86400, _generate_missing_gstr1)
+    workers.start_periodic(app, 'day-close', 3600, _close_open_days)
+    workers.start_periodic(app, 'partitions', 86400,
+                           lambda: shards.for_each_shard(
+                               lambda conn, store_id: partitions.ensure_partitions(
+                                   conn, Config.PARTITION_MONTHS_AHEAD)))
+    if Config.WARM_SNAPSHOT_PATH:
+        workers.start_periodic(app, 'snapshot', Config.WARM_SNAPSHOT_SECONDS, _write_warm_snapshot)
+
+
+def _write_warm_snapshot():
+    """Bring every store's lookup index up to date, then save them if anything changed."""
+    shards.for_each_shard(lambda conn, store_id: fuzzy.index_for(conn, store_id, 0))
+    return snapshots.write(Config.WARM_SNAPSHOT_PATH)
+
+
+def _generate_gstr1(conn, store_id, period):
+    import gstr1
+
+    return gstr1.generate(conn, store_id, period, gstr1.output_dir(Config.GSTR1_OUTPUT_DIR, store_id, period),
+                          Config.GSTIN, Config.GST_STATE_CODE, Config.GSTR1_B2CL_LIMIT)
+
+
+def _generate_missing_gstr1():
+    """Last month's return for every store that does not have one yet."""
+    import gstr1
+
+    period = gstr1.previous_month()
+    return shards.for_each_shard(
+        lambda conn, store_id: None
+        if gstr1.read_summary(gstr1.output_dir(Config.GSTR1_OUTPUT_DIR, store_id, period))
+        else _generate_gstr1(conn, store_id, period)['counts'])
+
+
+def _close_open_days():
+    import zreport
+
+    return shards.for_each_shard(
+        lambda conn, store_id: zreport.close_open_days(conn, store_id, Config.DAY_CLOSE_CATCHUP_DAYS))
+
+
+@app.cli.command('refresh-reports')
+def refresh_reports_command():
+    """Fold new bills into the reporting fact tables."""
+    counts = shards.for_each_shard(lambda conn, store_id: reports.refresh_facts(conn))
+    for store_id, count in counts.items():
+        print(f"Store {store_id}: aggregated {count} new bills")
+
+
+@app.cli.command('db-upgrade')
+@click.option('--target', type=int, default=None, help='Stop after this migration version.')
+def db_upgrade_command(target):
+    """Apply pending schema migrations on every store's database."""
+    for store_id, count in shards.for_each_shard(
+            lambda conn, store_id: migrations.upgrade(conn, target)).items():
+        print(f"Store {store_id}: applied {count} migrations")
+
+
+@app.cli.command('db-status')
+def db_status_command():
+    """List pending and modified migrations."""
+    for store_id, (pending, changed) in shards.for_each_shard(
+            lambda conn, store_id: migrations.status(conn)).items():
+        print(f"Store {store_id}: {len(pending)} pending")
+        for version, name in pending:
+            print(f"  pending  {version:04d}_{name}")
+        for version, name in changed:
+            print(f"  changed  {version:04d}_{name}")
+
+
+@app.cli.command('db-explain-check')
+@click.option('--min-rows', type=int, default=1000)
+def db_explain_check_command(min_rows):
+    """Fail if a hot query's plan regresses to a full table scan."""
+    failures = migrations.explain_hot_queries(mysql.connection, min_rows)
+    for name, table, rows in failures:
+        print(f"FULL SCAN  {name}: table {table}, ~{rows} rows")
+    if failures:
+        raise SystemExit(1)
+    print(f"{len(migrations.HOT_QUERIES)} hot queries use indexes")
+
+
+@app.cli.command('partition-bills')
+def partition_bills_command():
+    """Partition bills/bill_items by month (after database/partitioning.sql)."""
+    for store_id, months in shards.for_each_shard(
+            lambda conn, store_id: partitions.partition_tables(conn, Config.PARTITION_MONTHS_AHEAD)).items():
+        print(f"Store {store_id}: {months} monthly partitions")
+
+
+@app.cli.command('archive-fy')
+@click.argument('year', type=int)
+def archive_fiscal_year_command(year):
+    """Move fiscal year YEAR (e.g. 2024 = Apr 2024 - Mar 2025) to the archive tables."""
+    for store_id, (bills, items) in shards.for_each_shard(
+            lambda conn, store_id: partitions.archive_fiscal_year(
+                conn, year, Config.FISCAL_YEAR_START_MONTH)).items():
+        print(f"Store {store_id}: archived {bills} bills, {items} items")
+
+
+@app.cli.command('gstr1')
+@click.option('--period', default=None, help='YYYY-MM or YYYY-MM:YYYY-MM (default: last month).')
+@click.option('--store', 'store_id', type=int, default=None, help='Only this store.')
+def gstr1_command(period, store_id):
+    """Generate GSTR-1 return data (JSON + CSV) for each store."""
+    import gstr1
+
+    period = period or gstr1.previous_month()
+    for store, summary in shards.for_each_shard(
+            lambda conn, store: _generate_gstr1(conn, store, period)
+            if store_id in (None, store) else None).items():
+        if summary:
+            counts = summary['counts']
+            print(f"Store {store}: {counts['bills']} bills ({counts['b2b']} B2B, {counts['b2cl']} B2CL, "
+                  f"{counts['b2cs']} B2CS) in {summary['seconds']} s -> "
+                  f"{gstr1.output_dir(Config.GSTR1_OUTPUT_DIR, store, period)}")
+            for warning in summary['warnings']:
+                print(f"  warning  {warning}")
+
+
+@app.cli.command('close-day')
+@click.option('--date', 'day', default=None, help='YYYY-MM-DD (default: yesterday).')
+def close_day_command(day):
+    """Freeze the end-of-day Z-report for every store (no cash count)."""
+    import zreport
+
+    day = zreport.parse_date(day) if day else datetime.date.today() - datetime.timedelta(days=1)
+    for store_id, (report, created) in shards.for_each_shard(
+            lambda conn, store_id: zreport.close_day(conn, store_id, day)).items():
+        totals = report['totals']
+        print(f"Store {store_id}: {day} {'closed' if created else 'was already closed'}, "
+              f"{totals['bills']} bills, net {totals['net']:.2f}, cash expected {report['cash']['expected']:.2f}")
+
+
+@app.cli.command('queue-invoice-pdfs')
+@click.option('--date', 'day', default=None, help='YYYY-MM-DD (default: yesterday).')
+def queue_invoice_pdfs_command(day):
+    """Queue a day's invoice PDFs behind receipts and on-demand invoices."""
+    day = datetime.date.fromisoformat(day) if day else datetime.date.today() - datetime.timedelta(days=1)
+    for store_id, jobs in shards.for_each_shard(lambda conn, store_id: printing.queue_day(conn, day)).items():
+        print(f"Store {store_id}: queued {len(jobs)} invoices from {day}")
+        for number, job_id in jobs:
+            print(f"  {number}  {job_id}")
+
+
+@app.cli.command('merge-customers')
+@click.option('--dry-run', is_flag=True, help='List the duplicates without merging them.')
+@click.option('--batch', type=int, default=customers_db.MERGE_BATCH, help='Bills repointed per commit.')
+def merge_customers_command(dry_run, batch):
+    """Merge customers that share a phone number into the oldest record."""
+    def merge(conn, store_id):
+        result = customers_db.merge_duplicates(conn, store_id, batch, dry_run, log=print)
+        if not dry_run:
+            cur = conn.cursor()
+            versions.bump(cur, 'customers')
+            conn.commit()
+            cur.close()
+            querycache.invalidate(store_id, 'customers', 'bills')
+        return result
+
+    for store_id, (groups, removed, moved) in shards.for_each_shard(merge).items():
+        print(f"Store {store_id}: {groups} duplicate phones, {removed} customers "
+              f"{'to merge' if dry_run else 'merged'}, {moved} bills repointed")
+
+
 @app.route('/')
 def index():
     if current_user.is_authenticated:
@@ -76,7 +382,7 @@ def login():
         cur.close()
         
         if user and check_password_hash(user['password_hash'], password):
-            user_obj = User(user['id'], user['username'])
+            user_obj = User(user['id'], user['username'], user.get('store_id'))
             login_user(user_obj)
             next_page = request.args.get('next')
             return redirect(next_page) if next_page else redirect(url_for('dashboard'))
@@ -176,7 +482,7 @@ def logout():
 @app.route('/dashboard')
 @login_required
 def dashboard():
-    cur = mysql.connection.cursor()
+    cur = read_db().cursor()
 
     # --- Weekly Sales (Last 7 Days) ---
     cur.execute("""
@@ -203,32 +509,31 @@ def dashboard():
         sales.append(amount)
 
     # --- Stock Availability (Top 10 products) ---
-    cur = mysql.connection.cursor()
-    cur.execute("""
+    stock_data = cached_rows('dashboard_stock', ('products',), """
         SELECT name, stock FROM products WHERE stock > 0 ORDER BY stock DESC LIMIT 10
     """)
-    stock_data = cur.fetchall()
     stock_labels = [row[0] for row in stock_data]
     stock_values = [row[1] for row in stock_data]
 
     # --- Dashboard Cards ---
-    cur.execute("SELECT SUM(final_amount) FROM bills WHERE DATE(created_at) = CURDATE()")
+    # Plain ranges on created_at so only the current month's partition is read
+    cur.execute("SELECT SUM(final_amount) FROM bills WHERE created_at >= CURDATE() "
+                "AND created_at < CURDATE() + INTERVAL 1 DAY")
     today_sales = cur.fetchone()[0] or 0
 
     month_start = today.replace(day=1)
-    cur.execute("SELECT SUM(final_amount) FROM bills WHERE DATE(created_at) >= %s", (month_start,))
+    cur.execute("SELECT SUM(final_amount) FROM bills WHERE created_at >= %s", (month_start,))
     monthly_sales = cur.fetchone()[0] or 0
 
-    cur.execute("SELECT COUNT(*) FROM products")
-    total_products = cur.fetchone()[0]
+    total_products = cached_rows('product_count', ('products',), "SELECT COUNT(*) FROM products")[0][0]
 
-    cur.execute("SELECT COUNT(*) FROM bills")
-    total_bills = cur.fetchone()[0]
+    total_bills = reports.total_bill_count(read_db())
 
     cur.execute("""
         SELECT b.id, b.bill_number, c.name, b.final_amount, b.created_at
         FROM bills b
         LEFT JOIN customers c ON b.customer_id = c.id
+        WHERE b.created_at >= DATE_SUB(CURDATE(), INTERVAL 31 DAY)
         ORDER BY b.created_at DESC
         LIMIT 5
     """)
@@ -254,19 +559,23 @@ def dashboard():
         stock_values=stock_values
     )
 
+@app.route('/dashboard/stream')
+@login_required
+def dashboard_stream():
+    # Deltas only: the page already rendered the totals, so nothing is replayed
+    return Response(broadcaster.stream(f'dashboard:{shards.current_store_id()}', replay_last=False), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/products')
 @login_required
 def products():
     search = request.args.get('search', '')
-    cur = mysql.connection.cursor()
     
     if search:
-        cur.execute("SELECT * FROM products WHERE name LIKE %s", (f'%{search}%',))
+        products = cached_rows('products_search', ('products',),
+                               "SELECT * FROM products WHERE name LIKE %s", (f'%{search}%',))
     else:
-        cur.execute("SELECT * FROM products")
-    
-    products = cur.fetchall()
-    cur.close()
+        products = cached_rows('products', ('products',), "SELECT * FROM products")
     return render_template('products.html', products=products, search=search)
 
 @app.route('/products/add', methods=['POST'])
@@ -275,12 +584,15 @@ def add_product():
     name = request.form['name']
     price = float(request.form['price'])
     stock = int(request.form['stock'])
+    hsn_code = request.form.get('hsn_code', '').strip() or None
     
-    cur = mysql.connection.cursor()
-    cur.execute("INSERT INTO products (name, price, stock) VALUES (%s, %s, %s)", 
-                (name, price, stock))
-    mysql.connection.commit()
+    cur = store_db().cursor()
+    cur.execute("INSERT INTO products (name, price, stock, hsn_code) VALUES (%s, %s, %s, %s)", 
+                (name, price, stock, hsn_code))
+    catalog.bump(cur, [cur.lastrowid])
+    store_db().commit()
     cur.close()
+    invalidate('products')
     
     flash('Product added successfully!', 'success')
     return redirect(url_for('products'))
@@ -291,12 +603,15 @@ def edit_product(product_id):
     name = request.form['name']
     price = float(request.form['price'])
     stock = int(request.form['stock'])
+    hsn_code = request.form.get('hsn_code', '').strip() or None
     
-    cur = mysql.connection.cursor()
-    cur.execute("UPDATE products SET name = %s, price = %s, stock = %s WHERE id = %s", 
-                (name, price, stock, product_id))
-    mysql.connection.commit()
+    cur = store_db().cursor()
+    cur.execute("UPDATE products SET name = %s, price = %s, stock = %s, hsn_code = COALESCE(%s, hsn_code) "
+                "WHERE id = %s", (name, price, stock, hsn_code, product_id))
+    catalog.bump(cur, [product_id])
+    store_db().commit()
     cur.close()
+    invalidate('products')
     
     flash('Product updated successfully!', 'success')
     return redirect(url_for('products'))
@@ -304,9 +619,11 @@ def edit_product(product_id):
 @app.route('/products/delete/<int:product_id>')
 @login_required
 def delete_product(product_id):
-    cur = mysql.connection.cursor()
+    cur = store_db().cursor()
     cur.execute("DELETE FROM products WHERE id = %s", (product_id,))
-    mysql.connection.commit()
+    catalog.bump(cur, deleted_ids=[product_id])
+    store_db().commit()
+    invalidate('products')
     cur.close()
     
     flash('Product deleted successfully!', 'success')
@@ -316,16 +633,16 @@ def delete_product(product_id):
 @login_required
 def customers():
     search = request.args.get('search', '')
-    cur = mysql.connection.cursor()
+    cur = read_db().cursor()
 
     if search:
         cur.execute(
-            "SELECT id, name, phone, email, address, created_at "
+            "SELECT id, name, phone, email, address, created_at, gstin "
             "FROM customers WHERE name LIKE %s OR phone LIKE %s",
             (f'%{search}%', f'%{search}%')
         )
     else:
-        cur.execute("SELECT id, name, phone, email, address, created_at FROM customers")
+        cur.execute("SELECT id, name, phone, email, address, created_at, gstin FROM customers")
 
     rows = cur.fetchall()
     cur.close()
@@ -339,7 +656,8 @@ def customers():
             "phone": c[2],
             "email": c[3],
             "address": c[4],
-            "created_at": c[5].strftime("%Y-%m-%d")
+            "created_at": c[5].strftime("%Y-%m-%d"),
+            "gstin": c[6]
         })
 
     return render_template('customers.html', customers=customers, search=search)
@@ -351,12 +669,20 @@ def add_customer():
     phone = request.form['phone']
     email = request.form['email']
     address = request.form['address']
+    gstin = request.form.get('gstin', '').strip().upper() or None
     
-    cur = mysql.connection.cursor()
-    cur.execute("INSERT INTO customers (name, phone, email, address) VALUES (%s, %s, %s, %s)", 
-                (name, phone, email, address))
-    mysql.connection.commit()
+    cur = store_db().cursor()
+    try:
+        cur.execute("INSERT INTO customers (store_id, name, phone, phone_key, email, address, gstin) VALUES (%s, %s, %s, %s, %s, %s, %s)", 
+                    (shards.current_store_id(), name, phone, customers_db.phone_key(phone), email, address, gstin))
+    except MySQLdb.IntegrityError:
+        cur.close()
+        flash(f'A customer with phone {phone} already exists', 'danger')
+        return redirect(url_for('customers', search=phone))
+    versions.bump(cur, 'customers')
+    store_db().commit()
     cur.close()
+    invalidate('customers')
     
     flash('Customer added successfully!', 'success')
     return redirect(url_for('customers'))
@@ -368,12 +694,20 @@ def edit_customer(customer_id):
     phone = request.form['phone']
     email = request.form['email']
     address = request.form['address']
+    gstin = request.form.get('gstin', '').strip().upper() or None
     
-    cur = mysql.connection.cursor()
-    cur.execute("UPDATE customers SET name = %s, phone = %s, email = %s, address = %s WHERE id = %s", 
-                (name, phone, email, address, customer_id))
-    mysql.connection.commit()
+    cur = store_db().cursor()
+    try:
+        cur.execute("UPDATE customers SET name = %s, phone = %s, phone_key = %s, email = %s, address = %s, gstin = %s WHERE id = %s", 
+                    (name, phone, customers_db.phone_key(phone), email, address, gstin, customer_id))
+    except MySQLdb.IntegrityError:
+        cur.close()
+        flash(f'Another customer already has phone {phone}', 'danger')
+        return redirect(url_for('customers', search=phone))
+    versions.bump(cur, 'customers')
+    store_db().commit()
     cur.close()
+    invalidate('customers')
     
     flash('Customer updated successfully!', 'success')
     return redirect(url_for('customers'))
@@ -381,10 +715,12 @@ def edit_customer(customer_id):
 @app.route('/customers/delete/<int:customer_id>')
 @login_required
 def delete_customer(customer_id):
-    cur = mysql.connection.cursor()
+    cur = store_db().cursor()
     cur.execute("DELETE FROM customers WHERE id = %s", (customer_id,))
-    mysql.connection.commit()
+    versions.bump(cur, 'customers')
+    store_db().commit()
     cur.close()
+    invalidate('customers')
     
     flash('Customer deleted successfully!', 'success')
     return redirect(url_for('customers'))
@@ -393,18 +729,14 @@ def delete_customer(customer_id):
 @app.route('/billing')
 @login_required
 def billing():
-    cur = mysql.connection.cursor()
-    cur.execute("SELECT * FROM products WHERE stock > 0")
-    products = cur.fetchall()
-    
-    cur.execute("SELECT * FROM customers")
-    customers = cur.fetchall()
-    
-    cur.close()
-    return render_template('billing.html', products=products, customers=customers)
+    products = cached_rows('billing_products', ('products',), "SELECT * FROM products WHERE stock > 0")
+    customers = cached_rows('billing_customers', ('customers',), "SELECT * FROM customers")
+    return render_template('billing.html', products=products, customers=customers,
+                           store_id=shards.current_store_id())
 
 @app.route('/billing/create', methods=['POST'])
 @login_required
+@idempotency.idempotent(store_db)
 def create_bill():
     data = request.get_json()
     customer_id = data.get('customer_id')
@@ -416,14 +748,15 @@ def create_bill():
     gst_amount = subtotal * 0.18  # 18% GST
     final_amount = subtotal + gst_amount
     
-    cur = mysql.connection.cursor()
+    cur = store_db().cursor()
     
    
     bill_number = generate_bill_number()
     cur.execute("""
-        INSERT INTO bills (customer_id, bill_number, total_amount, gst_amount, final_amount, payment_method) 
-        VALUES (%s, %s, %s, %s, %s, %s)
-    """, (customer_id, bill_number, subtotal, gst_amount, final_amount, payment_method))
+        INSERT INTO bills (store_id, customer_id, bill_number, total_amount, gst_amount, final_amount, payment_method, user_id) 
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, (shards.current_store_id(), customer_id, bill_number, subtotal, gst_amount, final_amount, payment_method,
+          current_user.id))
     
     bill_id = cur.lastrowid
     
@@ -436,13 +769,22 @@ def create_bill():
         
         cur.execute("UPDATE products SET stock = stock - %s WHERE id = %s", 
                    (item['quantity'], item['product_id']))
+
+    result = {'success': True, 'bill_id': bill_id, 'bill_number': bill_number}
+    idempotency.record(cur, result, bill_id)
+    # Stock changed: last statement before commit, so the version lock is brief
+    catalog.bump(cur, [item['product_id'] for item in items])
     
-    mysql.connection.commit()
+    store_db().commit()
     cur.close()
+    invalidate('products', 'bills')
+
+    publish_bill_event(bill_id, bill_number, customer_id, final_amount)
     
-    return jsonify({'success': True, 'bill_id': bill_id, 'bill_number': bill_number})
+    return jsonify(result)
     
 @app.route('/createbill', methods=['POST'])
+@idempotency.idempotent(store_db)
 def createbill_api():
     data = request.get_json()
     
@@ -462,7 +804,7 @@ def createbill_api():
     status = 'Completed'  # Mark as completed for generated bills
     
     try:
-        cursor = mysql.connection.cursor()
+        cursor = store_db().cursor()
         
         # Generate bill number
         bill_number = generate_bill_number()
@@ -472,12 +814,13 @@ def createbill_api():
         
         # Insert into bills table
         cursor.execute("""
-            INSERT INTO bills (customer_id, bill_number, total_amount, discount_type, 
+            INSERT INTO bills (store_id, customer_id, bill_number, total_amount, discount_type, 
                              discount_value, discount_amount, gst_type, cgst_amount, 
-                             sgst_amount, igst_amount, gst_amount, final_amount, payment_method)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        """, (customer, bill_number, subtotal, discounttype, discountvalue,
-              discountamount, gsttype, cgst, sgst, igst, gst_amount, finaltotal, payment))
+                             sgst_amount, igst_amount, gst_amount, final_amount, payment_method, user_id)
+            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+        """, (shards.current_store_id(), customer, bill_number, subtotal, discounttype, discountvalue,
+              discountamount, gsttype, cgst, sgst, igst, gst_amount, finaltotal, payment,
+              current_user.id if current_user.is_authenticated else None))
         
         billid = cursor.lastrowid
         
@@ -488,14 +831,20 @@ def createbill_api():
                 VALUES (%s,%s,%s,%s,%s)
             """, (billid, item['product_id'], item['qty'],
                   item['price'], item['total']))
+
+        result = {'status': 'success', 'bill_id': billid}
+        idempotency.record(cursor, result, billid)
         
-        mysql.connection.commit()
+        store_db().commit()
         cursor.close()
+        invalidate('bills')
+
+        publish_bill_event(billid, bill_number, customer, finaltotal)
         
-        return jsonify({'status': 'success', 'bill_id': billid})
+        return jsonify(result)
         
     except Exception as e:
-        mysql.connection.rollback()
+        store_db().rollback()
         return jsonify({'status': 'error', 'error': str(e)}), 400
 
 @app.route("/createbill.html")
@@ -521,292 +870,35 @@ def createbill_success_page():
 @app.route('/invoices')
 @login_required
 def invoices():
-    cur = mysql.connection.cursor()
+    # Recent window only (?days=N to widen) so old partitions are never scanned
+    days = max(request.args.get('days', Config.INVOICE_LIST_DAYS, type=int), 1)
+    cur = read_db().cursor()
     cur.execute("""
         SELECT b.id, b.bill_number, c.name, 
                b.total_amount, b.gst_amount, b.final_amount, 
                b.payment_method, b.created_at
         FROM bills b 
         LEFT JOIN customers c ON b.customer_id = c.id 
+        WHERE b.created_at >= DATE_SUB(CURDATE(), INTERVAL %s DAY)
         ORDER BY b.created_at DESC
-    """)
+    """, (days,))
     invoices = cur.fetchall()
     cur.close()
-    return render_template('invoices.html', invoices=invoices)
+    return render_template('invoices.html', invoices=invoices, days=days,
+                           day_choices=sorted({7, 30, Config.INVOICE_LIST_DAYS, 365, 1095, days}))
 
 @app.route('/invoices/<int:bill_id>')
 @login_required
 def invoice_detail(bill_id):
-    cur = mysql.connection.cursor()
-    cur.execute("""
-        SELECT b.*, c.name, c.phone, c.email, c.address 
-        FROM bills b 
-        LEFT JOIN customers c ON b.customer_id = c.id 
-        WHERE b.id = %s
-    """, (bill_id,))
-    bill = cur.fetchone()
-    cur.execute("""
-        SELECT bi.*, p.name 
-        FROM bill_items bi 
-        JOIN products p ON bi.product_id = p.id 
-        WHERE bi.bill_id = %s
-    """, (bill_id,))
-    items = cur.fetchall()
-    
-    cur.close()
+    # Falls back to the archive tables for bills from archived fiscal years
+    bill, items = partitions.fetch_bill(read_db(), bill_id)
     
     return render_template('invoice_detail.html', bill=bill, items=items)
 
-@app.route('/invoices/<int:bill_id>/pdf', methods=['GET', 'POST'])
-
-@login_required
-def generate_pdf(bill_id):
-    cur = mysql.connection.cursor()
-    
-
-    cur.execute("""
-        SELECT b.*, c.name, c.phone, c.email, c.address 
-        FROM bills b 
-        LEFT JOIN customers c ON b.customer_id = c.id 
-        WHERE b.id = %s
-    """, (bill_id,))
-    bill = cur.fetchone()
-    
-
-    cur.execute("""
-        SELECT bi.*, p.name 
-        FROM bill_items bi 
-        JOIN products p ON bi.product_id = p.id 
-        WHERE bi.bill_id = %s
-    """, (bill_id,))
-    items = cur.fetchall()
-    
-    cur.close()
-
-    import decimal
-
-    if not bill:
-        flash('Bill not found', 'danger')
-        return redirect(url_for('invoices'))
-
-    bill = list(bill)
-
-
-    for i, v in enumerate(bill):
-        if isinstance(v, decimal.Decimal):
-            try:
-                bill[i] = float(v)
-            except Exception:
-                pass
-        elif isinstance(v, str):
-            s = v.strip().replace(',', '')
-            if s.replace('.', '', 1).lstrip('-').isdigit():
-                try:
-                    bill[i] = float(s)
-                except Exception:
-                    pass
-
-   
-    created_at = None
-    for val in bill:
-        if isinstance(val, datetime.datetime):
-            created_at = val
-            break
-        if isinstance(val, datetime.date) and not isinstance(val, datetime.datetime):
-            created_at = datetime.datetime.combine(val, datetime.time.min)
-            break
-        if isinstance(val, str):
-            for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%Y-%m-%dT%H:%M:%S"):
-                try:
-                    created_at = datetime.datetime.strptime(val, fmt)
-                    break
-                except Exception:
-                    continue
-            if created_at:
-                break
-
-  
-    if created_at is None:
-        for val in bill:
-            try:
-                if isinstance(val, (int, float)) and float(val) > 1e9:
-                    created_at = datetime.datetime.fromtimestamp(float(val))
-                    break
-                if isinstance(val, decimal.Decimal) and float(val) > 1e9:
-                    created_at = datetime.datetime.fromtimestamp(float(val))
-                    break
-            except Exception:
-                continue
-
-    if created_at is None:
-        created_at = datetime.datetime.now()
-
- 
-    while len(bill) <= 7:
-        bill.append(None)
-    bill[7] = created_at
-
-    for idx in (3, 4, 5):
-        if idx < len(bill):
-            try:
-                bill[idx] = float(bill[idx]) if bill[idx] is not None else 0.0
-            except Exception:
-                bill[idx] = 0.0
-
-    #
-    processed_items = []
-    for it in items:
-        row = list(it)
-        for j, val in enumerate(row):
-            if isinstance(val, decimal.Decimal):
-                try:
-                    row[j] = float(val)
-                except Exception:
-                    pass
-            elif isinstance(val, str):
-                s = val.strip().replace(',', '')
-                if s.replace('.', '', 1).lstrip('-').isdigit():
-                    try:
-                        if s.isdigit() or (s.lstrip('-').isdigit()):
-                            row[j] = int(s)
-                        else:
-                            row[j] = float(s)
-                    except Exception:
-                        pass
-        processed_items.append(row)
-    
-    items = processed_items
-
-    # Create PDF using ReportLab
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-    elements = []
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name='Center', alignment=1))
-    styles.add(ParagraphStyle(name='Right', alignment=2))
-
-    elements.append(Paragraph("SHOP BILLING SYSTEM", styles['Title']))
-    elements.append(Paragraph("TAX INVOICE", styles['Heading1']))
-    elements.append(Spacer(1, 12))
-
-    company_data = [
-        [Paragraph("<b>From:</b>", styles['Normal']), 
-         Paragraph("<b>Invoice Details:</b>", styles['Normal'])],
-        [Paragraph("Shop Billing System<br/>"
-                  "123 College Street<br/>"
-                  "Academic City, AC 12345<br/>"
-                  "Phone: (555) 123-4567<br/>"
-                  "Email: shop@college.edu", styles['Normal']),
-         Paragraph(f"Bill No: {bill[2]}<br/>"
-                  f"Date: {bill[7].strftime('%B %d, %Y')}<br/>"
-                  f"Time: {bill[7].strftime('%I:%M %p')}<br/>"
-                  f"Payment Method: {bill[6]}", styles['Normal'])]
-    ]
-    
-    company_table = Table(company_data, colWidths=[3*inch, 3*inch])
-    company_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-    ]))
-    elements.append(company_table)
-    elements.append(Spacer(1, 12))
-
-    customer_name = bill[8] if bill[8] else "Walk-in Customer"
-    elements.append(Paragraph(f"<b>Bill To:</b> {customer_name}", styles['Normal']))
-    if bill[9]:
-        elements.append(Paragraph(f"Phone: {bill[9]}", styles['Normal']))
-    if bill[10]:
-        elements.append(Paragraph(f"Email: {bill[10]}", styles['Normal']))
-    if bill[11]:
-        elements.append(Paragraph(f"Address: {bill[11]}", styles['Normal']))
-    
-    elements.append(Spacer(1, 12))
-    
-    
-    data = [['Item', 'Product', 'Unit Price (₹)', 'Qty', 'Total (₹)']]
-    
-    #  Corrected indexes: product name = item[6], total price = item[5]
-    for i, item in enumerate(items, 1):
-        data.append([
-            str(i),
-            item[6],                 # product name
-            f"₹{item[4]:.2f}",       # unit price
-            str(item[3]),            # quantity
-            f"₹{item[5]:.2f}"        # total price
-        ])
-
-    data.append(['', '', '', 'Subtotal:', f"₹{bill[3]:.2f}"])
-    data.append(['', '', '', 'GST (18%):', f"₹{bill[4]:.2f}"])
-    data.append(['', '', '', '<b>Grand Total:</b>', f"<b>₹{bill[5]:.2f}</b>"])
-    
-    items_table = Table(data, colWidths=[0.5*inch, 2.5*inch, 1.2*inch, 0.8*inch, 1.2*inch])
-    items_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-        ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('TOPPADDING', (0, 1), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-        ('ALIGN', (-2, -3), (-1, -1), 'RIGHT'),
-        ('FONTNAME', (-2, -3), (-1, -1), 'Helvetica-Bold'),
-        ('LINEABOVE', (-2, -1), (-1, -1), 1, colors.black),
-    ]))
-    elements.append(items_table)
-    elements.append(Spacer(1, 24))
-    
-  
-    elements.append(Paragraph("Thank you for your business!", styles['Heading2']))
-    elements.append(Spacer(1, 6))
-    elements.append(Paragraph("Terms & Conditions: Goods once sold cannot be returned or exchanged unless defective. "
-                            "This is a computer generated invoice.", styles['Normal']))
-    elements.append(Spacer(1, 6))
-    elements.append(Paragraph(f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", 
-                            styles['Normal']))
-    
-  
-    doc.build(elements)
-    
-    buffer.seek(0)
-    return send_file(
-        buffer,
-        download_name=f"invoice_{bill[2]}.pdf",
-        as_attachment=True,
-        mimetype='application/pdf'
-    )
-
 @app.route('/invoices/<int:bill_id>/print')
 @login_required
 def print_invoice(bill_id):
-    cur = mysql.connection.cursor()
-    
-
-    cur.execute("""
-        SELECT b.*, c.name, c.phone, c.email, c.address 
-        FROM bills b 
-        LEFT JOIN customers c ON b.customer_id = c.id 
-        WHERE b.id = %s
-    """, (bill_id,))
-    bill = cur.fetchone()
-    
-
-    cur.execute("""
-        SELECT bi.*, p.name 
-        FROM bill_items bi 
-        JOIN products p ON bi.product_id = p.id 
-        WHERE bi.bill_id = %s
-    """, (bill_id,))
-    items = cur.fetchall()
-    
-    cur.close()
+    bill, items = partitions.fetch_bill(read_db(), bill_id)
     
     import decimal
  
@@ -896,29 +988,55 @@ def print_invoice(bill_id):
         processed_items.append(row)
 
     items = processed_items
-    return render_template('invoice_print.html', bill=bill, items=items)
-
+    # Printed at the till right after the bill: its PDF jumps the queue as a receipt
+    return render_template('invoice_print.html', bill=bill, items=items,
+                           pdf_url=url_for('generate_pdf', bill_id=bill_id, priority='receipt'))
 
 
 @app.route('/api/products')
 @login_required
 def api_products():
-    cur = mysql.connection.cursor()
-    cur.execute("SELECT id, name, price, stock FROM products WHERE stock > 0")
-    products = cur.fetchall()
-    cur.close()
+    products = tagged_rows('api_products', ('products',), "SELECT id, name, price, stock FROM products WHERE stock > 0")
     
-    products_list = []
-    for product in products:
-        products_list.append({
-            'id': product[0],
-            'name': product[1],
-            'price': float(product[2]),
-            'stock': product[3]
-        })
+    def render():
+        products_list = []
+        for product in products:
+            products_list.append({
+                'id': product[0],
+                'name': product[1],
+                'price': float(product[2]),
+                'stock': product[3]
+            })
+        return jsonify(products_list)
     
-    return jsonify(products_list)
+    return versions.respond(products.etag, render)
+
+
 
+@app.route('/api/products/changes')
+@login_required
+def api_product_changes():
+    """Catalog change feed for the till's local copy (see catalog.py)."""
+    since = request.args.get('since', 0, type=int)
+    limit = min(request.args.get('limit', 1000, type=int), 5000)
+    # Primary, not a replica: replicas at different lag would send a till's
+    # version backwards and force a full resync
+    return jsonify(catalog.changes(store_db(), since, limit, shards.current_store_id(),
+                                   request.args.get('catalog'), request.args.get('resume')))
+
+
+def fuzzy_products(query, limit=10):
+    """(id, name, price, stock) of the best fuzzy matches for `query`, best first."""
+    # The index follows the change feed, so it reads from the primary like the feed does
+    ids = fuzzy.search(store_db(), shards.current_store_id(), query, limit,
+                       refresh_seconds=Config.FUZZY_REFRESH_SECONDS)
+    if not ids:
+        return []
+    cur = read_db().cursor()
+    cur.execute(f"SELECT id, name, price, stock FROM products WHERE id IN ({', '.join(['%s'] * len(ids))})", ids)
+    rows = {r[0]: r for r in cur.fetchall()}
+    cur.close()
+    return [rows[i] for i in ids if i in rows]
 
 
 @app.route('/api/products/search')
@@ -926,9 +1044,13 @@ def api_products():
 def search_products():
     query = request.args.get('q', '')
 
-    cur = mysql.connection.cursor()
-    cur.execute("SELECT id, name, price, stock FROM products WHERE name LIKE %s", (f'%{query}%',))
+    cur = read_db().cursor()
+    cur.execute(catalog.NAME_PREFIX_SQL, (catalog.prefix_pattern(query), 50))
     rows = cur.fetchall()
+    if not rows and query.strip():
+        # No name starts with the text as typed: try words inside names,
+        # misspellings and transliterations
+        rows = fuzzy_products(query, limit=50)
     cur.close()
 
     products = []
@@ -952,7 +1074,7 @@ def api_product_lookup():
     if not q:
         return jsonify([])
 
-    cur = mysql.connection.cursor(MySQLdb.cursors.DictCursor)
+    cur = read_db().cursor(MySQLdb.cursors.DictCursor)
 
     rows = []
     if q.isdigit():
@@ -963,15 +1085,13 @@ def api_product_lookup():
         else:
             rows = []
     else:
-
-        cur.execute("""
-            SELECT id, name, price, stock
-            FROM products
-            WHERE name LIKE %s
-            ORDER BY name ASC
-            LIMIT 10
-        """, (f"%{q}%",))
-        rows = cur.fetchall()
+        # Typo- and transliteration-tolerant ranking from this process's
+        # index (fuzzy.py), with current price and stock from the database
+        rows = [dict(zip(('id', 'name', 'price', 'stock'), r)) for r in fuzzy_products(q, limit=10)]
+        if not rows:
+            # Fast movers first (popularity refreshed off the request path)
+            cur.execute(catalog.RANKED_PREFIX_SQL, (catalog.prefix_pattern(q), 10))
+            rows = cur.fetchall()
 
     cur.close()
 
@@ -989,16 +1109,14 @@ def api_product_lookup():
 @app.route('/api/customers')
 @login_required
 def api_customers():
-    cur = mysql.connection.cursor()
-    cur.execute("SELECT id, name, phone, email, address FROM customers ORDER BY name")
-    customers = cur.fetchall()
-    cur.close()
-    return jsonify(customers)
+    customers = tagged_rows('api_customers', ('customers',),
+                            "SELECT id, name, phone, email, address FROM customers ORDER BY name")
+    return versions.respond(customers.etag, lambda: jsonify(customers))
 
 @app.route('/api/bill/<int:bill_id>/items/count')
 @login_required
 def bill_items_count(bill_id):
-    cur = mysql.connection.cursor()
+    cur = read_db().cursor()
     cur.execute("SELECT COUNT(*) as item_count FROM bill_items WHERE bill_id = %s", (bill_id,))
     result = cur.fetchone()
     cur.close()
@@ -1007,13 +1125,8 @@ def bill_items_count(bill_id):
 @app.route('/api/customer/<int:customer_id>/stats')
 @login_required
 def customer_stats(customer_id):
-    cur = mysql.connection.cursor()
-    cur.execute("SELECT COUNT(*) as total_bills FROM bills WHERE customer_id = %s", (customer_id,))
-    bill_count = cur.fetchone()['total_bills']
-    cur.execute("SELECT COALESCE(SUM(final_amount), 0) as total_spent FROM bills WHERE customer_id = %s", (customer_id,))
-    total_spent = cur.fetchone()['total_spent']
-    
-    cur.close()
+    # Facts (all history, archived years included) plus bills not yet folded in
+    bill_count, total_spent = reports.customer_totals(read_db(), customer_id)
     
     return jsonify({
         'total_bills': bill_count,
@@ -1023,13 +1136,14 @@ def customer_stats(customer_id):
 @app.route('/api/billing/stats')
 @login_required
 def billing_stats():
-    cur = mysql.connection.cursor()
-    cur.execute("SELECT COUNT(*) as today_bills FROM bills WHERE DATE(created_at) = CURDATE()")
-    today_bills = cur.fetchone()['today_bills']
-    cur.execute("SELECT COUNT(*) as low_stock FROM products WHERE stock < 5")
-    low_stock = cur.fetchone()['low_stock']
-    
+    cur = read_db().cursor()
+    cur.execute("SELECT COUNT(*) FROM bills WHERE created_at >= CURDATE() "
+                "AND created_at < CURDATE() + INTERVAL 1 DAY")
+    today_bills = cur.fetchone()[0]
     cur.close()
+
+    # Maintained by the inventory worker; no scan of products here
+    low_stock = inventory.low_stock_count(read_db())
     
     return jsonify({
         'today_bills': today_bills,
@@ -1050,34 +1164,20 @@ def quick_add_customer():
         if not name:
             return jsonify({'success': False, 'error': 'Name is required'})
         
-        cur = mysql.connection.cursor()
-        cur.execute("INSERT INTO customers (name, phone, email, address) VALUES (%s, %s, %s, %s)",
-                   (name, phone, email, address))
-        customer_id = cur.lastrowid
-        mysql.connection.commit()
-        cur.execute("SELECT * FROM customers WHERE id = %s", (customer_id,))
-        customer = cur.fetchone()
-        cur.close()
+        customer, created = customers_db.quick_add(store_db(), shards.current_store_id(), name, phone, email, address)
+        if created:
+            invalidate('customers')
         
-        return jsonify({
-            'success': True,
-            'customer': {
-                'id': customer['id'],
-                'name': customer['name'],
-                'phone': customer['phone'],
-                'email': customer['email'],
-                'address': customer['address']
-            }
-        })
+        return jsonify({'success': True, 'customer': customer, 'existing': not created})
         
     except Exception as e:
-        mysql.connection.rollback()
+        store_db().rollback()
         return jsonify({'success': False, 'error': str(e)})
 
 @app.route("/confirm-payment/<int:bill_id>")
 @login_required
 def confirm_payment(bill_id):
-    cur = mysql.connection.cursor()
+    cur = read_db().cursor()
     cur.execute("SELECT payment_method FROM bills WHERE id=%s", (bill_id,))
     pay = cur.fetchone()
     cur.close()
@@ -1093,7 +1193,7 @@ def complete_payment(bill_id):
     card_number = request.form.get("card_number")
     card_name = request.form.get("card_name")
 
-    cursor = mysql.connection.cursor()
+    cursor = store_db().cursor()
 
     cursor.execute("""
         UPDATE bills 
@@ -1104,128 +1204,306 @@ def complete_payment(bill_id):
         WHERE id=%s
     """, (upi_id, card_number, card_name, bill_id))
 
-    mysql.connection.commit()
+    store_db().commit()
     cursor.close()
+    invalidate('bills')
 
     return redirect(f"/invoices/{bill_id}/print")
 
 
-@app.route('/savedraft', methods=['POST'])
-def save_draft():
-    data = request.get_json()
+def _draft_ops(items, current=()):
+    # Whole-bill payload -> line ops against the stored lines
+    ops = [{"op": "update", "product_id": item['product_id'], "qty": item['qty'], "price": item['price']}
+           for item in items]
+    sent = {int(item['product_id']) for item in items}
+    ops += [{"op": "remove", "product_id": line['product_id']}
+            for line in current if line['product_id'] not in sent]
+    return ops
 
-    customer_id = data.get("customer_id")
-    payment_method = data.get("payment_method")
-    discount_type = data.get("discount_type")
-    discount_value = data.get("discount_value")
-    gst_type = data.get("gst_type")
 
-    subtotal = data.get("subtotal")
-    discount_amount = data.get("discount_amount")
-    cgst = data.get("cgst")
-    sgst = data.get("sgst")
-    igst = data.get("igst")
-    final_total = data.get("final_total")
+@app.route('/drafts', methods=['POST'])
+@login_required
+def create_draft():
+    try:
+        result = drafts.create(store_db(), shards.current_store_id(), current_user.id,
+                               request.get_json() or {})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+    return jsonify(dict(result, status='success')), 201
 
-    items = data.get("items")
 
-    # DRAFT STATUS
-    status = "Payment Pending"
+@app.route('/drafts/<int:draft_id>', methods=['GET'])
+@login_required
+def get_draft(draft_id):
+    draft = drafts.get(store_db(), draft_id, shards.current_store_id())
+    if draft is None:
+        return jsonify({'status': 'error', 'error': 'Draft not found'}), 404
+    return jsonify(draft)
 
-    # Save to bills table
-    cursor = mysql.connection.cursor()
-    
-    # Generate bill number
-    bill_number = generate_bill_number()
-    
-    # Calculate GST amount
-    gst_amount = float(cgst or 0) + float(sgst or 0) + float(igst or 0)
-    
-    cursor.execute("""
-        INSERT INTO bills 
-        (customer_id, bill_number, total_amount, discount_type, discount_value, discount_amount,
-         gst_type, cgst_amount, sgst_amount, igst_amount, gst_amount, final_amount, payment_method)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-    """, (
-        customer_id, bill_number, subtotal, discount_type, discount_value, discount_amount,
-        gst_type, cgst, sgst, igst, gst_amount, final_total, payment_method
-    ))
-    bill_id = cursor.lastrowid
-
-    # Save bill items
-    for item in items:
-        cursor.execute("""
-            INSERT INTO bill_items (bill_id, product_id, quantity, unit_price, total_price)
-            VALUES (%s,%s,%s,%s,%s)
-        """, (
-            bill_id,
-            item['product_id'],
-            item['qty'],
-            item['price'],
-            item['total']
-        ))
-
-    mysql.connection.commit()
-    cursor.close()
 
-    return jsonify({"status":"success", "bill_id": bill_id})
+@app.route('/drafts/<int:draft_id>', methods=['PATCH'])
+@login_required
+def save_draft_changes(draft_id):
+    # Autosave: only the header fields and lines that changed since `revision`
+    try:
+        result = drafts.save(store_db(), draft_id, shards.current_store_id(), request.get_json() or {})
+    except ValueError as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+    except drafts.Conflict as e:
+        return jsonify({'status': 'conflict', 'error': str(e), 'draft': e.draft}), 409
+    except drafts.Finalized as e:
+        return jsonify({'status': 'error', 'error': str(e), 'bill_id': e.bill_id}), 409
+    if result is None:
+        return jsonify({'status': 'error', 'error': 'Draft not found'}), 404
+    return jsonify(dict(result, status='success'))
+
+
+@app.route('/drafts/<int:draft_id>/finalize', methods=['POST'])
+@login_required
+@idempotency.idempotent(store_db)
+def finalize_draft(draft_id):
+    conn = store_db()
+    try:
+        bill_number = generate_bill_number()
+        bill_id, draft = drafts.finalize(conn, draft_id, shards.current_store_id(), bill_number, current_user.id)
+        if bill_id is None:
+            conn.rollback()
+            return jsonify({'status': 'error', 'error': 'Draft not found'}), 404
+        created = draft['bill_id'] is None
+        result = {'status': 'success', 'bill_id': bill_id}
+        cur = conn.cursor()
+        idempotency.record(cur, result, bill_id)
+        cur.close()
+        conn.commit()
+    except ValueError as e:
+        conn.rollback()
+        return jsonify({'status': 'error', 'error': str(e)}), 400
+
+    if created:
+        invalidate('bills')
+        publish_bill_event(bill_id, bill_number, draft['customer_id'], draft['final_total'])
+    return jsonify(result)
+
 
 @app.route('/savedraft', methods=['POST'])
-def savedraft():
-    data = request.get_json()
-    
-    customerid = data.get('customer_id')
-    paymentmethod = data.get('payment_method')
-    discounttype = data.get('discount_type')
-    discountvalue = data.get('discount_value')
-    gsttype = data.get('gst_type')
-    subtotal = data.get('subtotal')
-    discountamount = data.get('discount_amount')
-    cgst = data.get('cgst')
-    sgst = data.get('sgst')
-    igst = data.get('igst')
-    finaltotal = data.get('final_total')
-    items = data.get('items')
-    
-    status = 'Draft'  # Mark as draft
-    
+@login_required
+def save_draft():
+    # Whole-bill save from older tills: kept as a draft, never as a new bill
+    data = request.get_json() or {}
+    items = data.get("items") or []
+    conn, store_id = store_db(), shards.current_store_id()
     try:
-        cursor = mysql.connection.cursor()
-        
-        # Insert into bills table with Draft status
-        cursor.execute("""
-            INSERT INTO bills (customerid, paymentmethod, discounttype, discountvalue, 
-                             gsttype, subtotal, discountamount, cgst, sgst, igst, 
-                             finaltotal, status)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        """, (customerid, paymentmethod, discounttype, discountvalue, gsttype, 
-              subtotal, discountamount, cgst, sgst, igst, finaltotal, status))
-        
-        billid = cursor.lastrowid
-        
-        # Insert bill items - Use correct column name 'productname'
-        for item in items:
-            cursor.execute("""
-                INSERT INTO billitems (billid, productid, productname, price, qty, total)
-                VALUES (%s,%s,%s,%s,%s,%s)
-            """, (billid, item['product_id'], item['product_name'], 
-                  item['price'], item['qty'], item['total']))
-        
-        mysql.connection.commit()
-        cursor.close()
-        
-        return jsonify({'status': 'success', 'bill_id': billid})
-        
-    except Exception as e:
-        mysql.connection.rollback()
+        draft = drafts.get(conn, int(data["draft_id"]), store_id) if data.get("draft_id") else None
+        if draft is None:
+            result = drafts.create(conn, store_id, current_user.id, dict(data, ops=_draft_ops(items)))
+        else:
+            result = drafts.save(conn, draft['draft_id'], store_id,
+                                 dict(data, revision=draft['revision'], ops=_draft_ops(items, draft['items'])))
+    except (ValueError, KeyError) as e:
         return jsonify({'status': 'error', 'error': str(e)}), 400
+    except (drafts.Conflict, drafts.Finalized) as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 409
+    return jsonify(dict(result, status='success'))
+
+@app.route('/api/inventory/low-stock')
+@login_required
+def api_low_stock():
+    return jsonify(inventory.low_stock_items(read_db()))
+
+@app.route('/api/inventory/alerts')
+@login_required
+def inventory_alerts():
+    return Response(broadcaster.stream(f'inventory:{shards.current_store_id()}'), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/metrics/workers')
+@login_required
+def worker_metrics():
+    return jsonify(workers.job_stats())
+
+@app.route('/api/metrics/query-cache')
+@login_required
+def query_cache_metrics():
+    return jsonify(querycache.stats())
+
+@app.route('/api/metrics/memory')
+@login_required
+def memory_metrics():
+    return jsonify(memprofile.stats())
+
+@app.route('/api/metrics/admission')
+@login_required
+def admission_metrics():
+    return jsonify(admission.stats())
+
+@app.route('/api/metrics/db-routing')
+@login_required
+def db_routing_metrics():
+    return jsonify(replicas.routing_metrics())
+
+
+REPORTS = {
+    'products': reports.sales_by_product,
+    'categories': reports.sales_by_category,
+    'hourly': reports.hourly_heatmap,
+    'payments': reports.payment_mix,
+    'customers': reports.top_customers,
+    'daily': reports.daily_totals,
+}
+
+@app.route('/api/reports/<name>')
+@login_required
+def api_report(name):
+    report = REPORTS.get(name)
+    if report is None:
+        return jsonify({'error': 'Unknown report'}), 404
+    try:
+        start, end = reports.parse_range(request.args.get('start'), request.args.get('end'))
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+
+    if request.args.get('scope') == 'all':
+        # Cross-store: run on every shard in parallel and merge
+        per_store = shards.scatter_gather(lambda conn, store_id: report(conn, start, end))
+        return jsonify({'start': str(start), 'end': str(end), 'scope': 'all',
+                        'data': reports.combine(name, per_store),
+                        'stores': {str(k): v for k, v in per_store.items()}})
+
+    data = report(read_db(), start, end)
+    return jsonify({'start': str(start), 'end': str(end), 'data': data})
+
+
+@app.route('/close', methods=['GET', 'POST'])
+@login_required
+def day_close():
+    """End-of-day close: live preview with a cash count form, or the frozen report."""
+    import zreport
+
+    try:
+        day = zreport.parse_date(request.values.get('date') or datetime.date.today().isoformat())
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('day_close'))
+    store_id = shards.current_store_id()
+
+    if request.method == 'POST':
+        counted = {}
+        for key, value in request.form.items():
+            if key.startswith('counted_') and value.strip():
+                try:
+                    counted[key[len('counted_'):]] = float(value)
+                except ValueError:
+                    flash(f'Counted cash must be a number: {value}', 'danger')
+                    return redirect(url_for('day_close', date=day.isoformat()))
+        report, created = zreport.close_day(store_db(), store_id, day, current_user.id, counted)
+        flash(f'{day} closed' if created else f'{day} was already closed', 'success' if created else 'warning')
+        return redirect(url_for('day_close', date=day.isoformat()))
+
+    # Closed days come from the snapshot on the primary; only an open day is computed
+    report = zreport.get(store_db(), store_id, day)
+    closed = report is not None
+    if not closed:
+        report = zreport.compute(read_db(), store_id, day)
+    return render_template('day_close.html', report=report, closed=closed, day=day,
+                           history=zreport.history(store_db(), store_id))
+
+@app.route('/close/<day>/pdf')
+@login_required
+def day_close_pdf(day):
+    import zreport
+
+    try:
+        day = zreport.parse_date(day)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    pdf = zreport.get_pdf(store_db(), shards.current_store_id(), day)
+    if pdf is None:
+        return jsonify({'error': 'Day not closed'}), 404
+    return Response(pdf, mimetype='application/pdf',
+                    headers={'Content-Disposition': f'inline; filename=z-report_{day}.pdf'})
+
+@app.route('/api/close/<day>')
+@login_required
+def api_day_close(day):
+    """The frozen Z-report; ?preview=1 computes an open day as it stands."""
+    import zreport
+
+    try:
+        day = zreport.parse_date(day)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    report = zreport.get(store_db(), shards.current_store_id(), day)
+    if report is None:
+        if not request.args.get('preview'):
+            return jsonify({'error': 'Day not closed'}), 404
+        return jsonify(dict(zreport.compute(read_db(), shards.current_store_id(), day), closed=False))
+    return jsonify(dict(report, closed=True, pdf_url=url_for('day_close_pdf', day=day.isoformat())))
+
+
+GSTR1_FILES = ('gstr1.json', 'b2b.csv', 'b2cl.csv', 'b2cs.csv', 'hsn.csv', 'summary.json')
+
+@app.route('/api/returns/gstr1', methods=['POST'])
+@login_required
+def api_gstr1_generate():
+    """Start building a GSTR-1 return in the background; poll status_url."""
+    import gstr1
+
+    data = request.get_json(silent=True) or request.form
+    period = data.get('period') or gstr1.previous_month()
+    try:
+        gstr1.parse_period(period)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    store_id = shards.current_store_id()
+    status_url = url_for('api_gstr1_status', period=period)
+    started = workers.run_once(app, f'gstr1:{store_id}',
+                               lambda: _generate_gstr1(shards.connection(store_id), store_id, period)['counts'])
+    if not started:
+        return jsonify({'error': 'A return is already being generated', 'status_url': status_url}), 409
+    return jsonify({'status': 'running', 'period': period, 'status_url': status_url}), 202
+
+@app.route('/api/returns/gstr1/<period>')
+@login_required
+def api_gstr1_status(period):
+    import gstr1
+
+    try:
+        gstr1.parse_period(period)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    store_id = shards.current_store_id()
+    summary = gstr1.read_summary(gstr1.output_dir(Config.GSTR1_OUTPUT_DIR, store_id, period))
+    body = {'period': period, 'running': workers.is_running(f'gstr1:{store_id}')}
+    if summary is None:
+        body['status'] = 'running' if body['running'] else 'missing'
+        return jsonify(body), 200 if body['running'] else 404
+    body.update(status='done', summary=summary,
+                files={name: url_for('gstr1_file', period=period, name=name) for name in GSTR1_FILES})
+    return jsonify(body)
+
+@app.route('/returns/gstr1/<period>/<name>')
+@login_required
+def gstr1_file(period, name):
+    import gstr1
+
+    try:
+        gstr1.parse_period(period)
+    except ValueError:
+        return jsonify({'error': 'Unknown period'}), 404
+    if name not in GSTR1_FILES:
+        return jsonify({'error': 'Unknown file'}), 404
+    path = os.path.join(gstr1.output_dir(Config.GSTR1_OUTPUT_DIR, shards.current_store_id(), period), name)
+    if not os.path.isfile(path):
+        return jsonify({'error': 'Return not generated'}), 404
+    return send_file(path, as_attachment=True, download_name=f"{period.replace(':', '_')}_{name}")
 
 
 # Search products by barcode
 @app.route('/api/products/barcode/<barcode>')
 @login_required
 def search_product_by_barcode(barcode):
-    cur = mysql.connection.cursor()
+    cur = read_db().cursor()
     cur.execute("SELECT * FROM products WHERE barcode = %s AND stock > 0", (barcode,))
     product = cur.fetchone()
     cur.close()
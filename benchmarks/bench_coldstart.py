@@ -0,0 +1,98 @@
+"""Cold start of a worker that serves only the billing API.
+
+Each run starts a fresh interpreter that imports the app and serves one
+request through the test client (/login by default: the full middleware
+stack, no database, with MIGRATIONS_CHECK=off and BACKGROUND_WORKERS=0).
+Reports the median wall time against --target-ms, checks that the PDF and
+export subsystems were not loaded, and prints the `-X importtime`
+breakdown: the app's direct imports and the slowest modules overall.
+
+    python benchmarks/bench_coldstart.py --runs 10 --target-ms 400
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must stay unloaded until a PDF, receipt or export request needs them
+LAZY_MODULES = ('reportlab', 'invoice_pdf', 'receipt', 'pdfqueue', 'multiprocessing', 'sqlite3')
+
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+status = app.app.test_client().get(sys.argv[1]).status_code
+served = time.perf_counter()
+lazy = [m for m in sys.argv[2].split(',') if m in sys.modules]
+print(json.dumps({"import_ms": (imported - started) * 1000, "first_request_ms": (served - imported) * 1000,
+                  "status": status, "loaded_lazy": lazy}))
+"""
+
+
+def env():
+    return dict(os.environ, MIGRATIONS_CHECK='off', BACKGROUND_WORKERS='0')
+
+
+def probe(path):
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', PROBE, path, ','.join(LAZY_MODULES)],
+                         cwd=ROOT, env=env(), capture_output=True, text=True, check=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result["wall_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def importtime():
+    """[(self us, cumulative us, depth, module)] from -X importtime."""
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                         cwd=ROOT, env=env(), capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', default='/login')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--target-ms', type=float, default=400)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    rows = importtime()
+    app_depth = next(depth for _, _, depth, name in rows if name == 'app')
+    print("app's direct imports (cumulative ms):")
+    direct = [r for r in rows if r[2] == app_depth + 1]
+    for _, cumulative, _, name in sorted(direct, reverse=True, key=lambda r: r[1])[:args.top]:
+        print(f"  {cumulative / 1000:8.1f}  {name}")
+    print("slowest modules (self ms):")
+    for self_us, _, _, name in sorted(rows, reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f}  {name}")
+
+    results = [probe(args.path) for _ in range(args.runs)]
+    wall = statistics.median(r["wall_ms"] for r in results)
+    imported = statistics.median(r["import_ms"] for r in results)
+    first = statistics.median(r["first_request_ms"] for r in results)
+    loaded = sorted({m for r in results for m in r["loaded_lazy"]})
+    print(f"\ncold start (median of {args.runs}): {wall:.0f} ms wall, "
+          f"import app {imported:.0f} ms, first request {first:.0f} ms (status {results[0]['status']})")
+    print(f"lazy subsystems loaded: {', '.join(loaded) or 'none'}")
+
+    ok = wall <= args.target_ms and not loaded
+    print(f"target {args.target_ms:.0f} ms: {'ok' if ok else 'FAILED'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""Fuzzy product lookup (fuzzy.py) on a synthetic catalog.
+
+Builds an index over --products synthetic names (brands, product words,
+pack sizes, some Tamil-script names), then times queries of four kinds:
+
+  exact      a word pair from a real name
+  prefix     the first letters of a name, as typed so far
+  typo       one random edit per word, two in long words ("keybord")
+  translit   a Latin spelling of a Tamil-script name, or the reverse
+
+Reports build time, the time to apply a batch of catalog changes, and per
+kind the median and p99 latency and how often the intended product is in
+the top 10. No database needed.
+
+    python benchmarks/bench_fuzzy.py --products 100000 --queries 2000 --target-ms 5
+"""
+import argparse
+import os
+import random
+import statistics
+import string
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import fuzzy  # noqa: E402
+
+BRANDS = ["aavin", "amul", "britannia", "parle", "nestle", "tata", "aashirvaad", "logitech", "dell",
+          "philips", "bajaj", "prestige", "milton", "cello", "classmate", "colgate", "dabur", "himalaya",
+          "sakthi", "aachi", "everest", "mdh", "haldiram", "lays", "bingo", "sunfeast", "maggi", "surf"]
+ITEMS = ["keyboard", "mouse", "monitor", "charger", "cable", "biscuit", "cookies", "noodles", "masala",
+         "turmeric", "chilli", "coriander", "jeera", "atta", "rice", "sugar", "jaggery", "ghee", "butter",
+         "paneer", "curd", "milk", "toothpaste", "shampoo", "soap", "detergent", "bottle", "tumbler",
+         "notebook", "pencil", "eraser", "kettle", "mixer", "grinder", "iron", "bulb", "torch", "battery"]
+VARIANTS = ["classic", "gold", "premium", "lite", "fresh", "family", "value", "mini", "jumbo", "organic",
+            "spicy", "plain", "roasted", "instant", "wireless", "steel", "glass", "herbal", "red", "green"]
+SIZES = ["50g", "100g", "200g", "500g", "1kg", "5kg", "250ml", "500ml", "1l", "pack", "combo", "set"]
+# Tamil-script names and how a cashier might type them
+TAMIL = [("பால்", "paal"), ("தயிர்", "thayir"), ("முறுக்கு", "murukku"), ("சர்க்கரை", "sakkarai"),
+         ("அரிசி", "arisi"), ("மிளகாய்", "milagai"), ("நெய்", "nei"), ("வெல்லம்", "vellam"),
+         ("கடலை", "kadalai"), ("உளுந்து", "ulundhu"), ("மஞ்சள்", "manjal"), ("இட்லி", "idli")]
+
+
+def catalog(n, rng):
+    names = []
+    for i in range(n):
+        if i % 10 == 0:
+            word = rng.choice(TAMIL)[0] if rng.random() < 0.5 else rng.choice(TAMIL)[1]
+        else:
+            word = rng.choice(ITEMS)
+        names.append(f"{rng.choice(BRANDS).title()} {word} {rng.choice(VARIANTS)} {rng.choice(SIZES)}")
+    # Unique model numbers, as real catalogs have, so the vocabulary grows with n
+    return [f"{name} {rng.choice(string.ascii_uppercase)}{i}" if i % 3 == 0 else name
+            for i, name in enumerate(names)]
+
+
+def typo(word, rng):
+    edits = 1 if len(word) < 9 else 2
+    for _ in range(edits):
+        i = rng.randrange(len(word))
+        kind = rng.choice("sdit")
+        if kind == "s":
+            word = word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+        elif kind == "d" and len(word) > 3:
+            word = word[:i] + word[i + 1:]
+        elif kind == "i":
+            word = word[:i] + rng.choice(string.ascii_lowercase) + word[i:]
+        elif i + 1 < len(word):
+            word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word
+
+
+def queries(names, n, rng):
+    by_tamil = {latin: script for script, latin in TAMIL}
+    by_tamil.update({script: latin for script, latin in TAMIL})
+    out = []
+    for _ in range(n):
+        product_id = rng.randrange(len(names))
+        brand, item = names[product_id].split()[:2]
+        kind = rng.choice(["exact", "prefix", "typo", "translit"])
+        if kind == "exact":
+            q = f"{brand} {item}"
+        elif kind == "prefix":
+            q = f"{brand} {item[:3]}"
+        elif kind == "typo":
+            q = f"{typo(brand.lower(), rng)} {typo(item, rng) if item.isascii() else item}"
+        else:
+            q = f"{brand} {by_tamil.get(item, item)}"
+        out.append((kind, q, product_id))
+    return out
+
+
+def brand_and_item(name):
+    brand, item = name.split()[:2]
+    return brand, dict(TAMIL).get(item, item)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--target-ms", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    names = catalog(args.products, rng)
+    upserts = [{"id": i, "name": name, "score": rng.random()} for i, name in enumerate(names)]
+    index = fuzzy.ProductIndex()
+    started = time.perf_counter()
+    index.apply({"reset": True, "version": 1, "more": False, "upserts": upserts, "deletes": []})
+    build = time.perf_counter() - started
+    print(f"{len(index)} products, {len(index.vocabulary)} distinct words, built in {build:.2f} s")
+
+    changed = rng.sample(upserts, 200)
+    started = time.perf_counter()
+    index.apply({"reset": False, "version": 2, "more": False, "deletes": [p["id"] for p in changed[:20]],
+                 "upserts": [dict(p, name=p["name"] + " new") for p in changed[20:]]})
+    print(f"applied 180 changes + 20 deletes in {(time.perf_counter() - started) * 1000:.1f} ms")
+    for p in changed:
+        index.add(p["id"], p["name"], p["score"])
+
+    results = {}
+    for kind, q, product_id in queries(names, args.queries, rng):
+        started = time.perf_counter()
+        found = index.search(q, 10)
+        elapsed = (time.perf_counter() - started) * 1000
+        # Any product with the same brand and word counts, in either script:
+        # they are interchangeable here
+        wanted = brand_and_item(names[product_id])
+        hit = any(brand_and_item(names[i]) == wanted for i in found)
+        results.setdefault(kind, []).append((elapsed, hit))
+
+    worst_p99 = 0.0
+    for kind, rows in results.items():
+        times = [t for t, _ in rows]
+        p99 = percentile(times, 0.99)
+        worst_p99 = max(worst_p99, p99)
+        print(f"{kind:<9} {len(rows):5d} queries  p50 {statistics.median(times):6.2f} ms  "
+              f"p99 {p99:6.2f} ms  found {sum(h for _, h in rows) / len(rows):6.1%}")
+
+    ok = worst_p99 <= args.target_ms
+    print(f"target p99 {args.target_ms:.1f} ms: {'ok' if ok else 'FAILED'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
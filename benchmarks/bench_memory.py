@@ -0,0 +1,86 @@
+"""Peak memory per route, against a budget.
+
+Imports the app with MEMORY_PROFILE=1 (memprofile.py), signs in through the
+test client and requests each route --repeat times, then reads the
+per-endpoint tracemalloc figures: the highest peak over the requests, the
+average left allocated afterwards, and the top allocation sites of the
+worst request. Exits non-zero when any route's peak is over its budget
+(--budget-mb for all, --route-budget /path=MB for one).
+
+Needs the database from config.py and a user account; --bill-id should
+name a bill with items.
+
+    python benchmarks/bench_memory.py --user admin --password secret --bill-id 42 --budget-mb 16
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ROUTES = (
+    '/invoices',
+    '/invoices?days=365',
+    '/api/customers',
+    '/api/products',
+    '/billing',
+    '/products',
+    '/invoices/{bill_id}/print',
+    '/invoices/{bill_id}/pdf?format=json',
+    '/invoices/{bill_id}/receipt?format=text',
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--user', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--bill-id', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--budget-mb', type=float, default=16)
+    parser.add_argument('--route-budget', action='append', default=[], metavar='PATH=MB',
+                        help='Budget for one route, e.g. /invoices?days=365=48')
+    parser.add_argument('--sites', type=int, default=3, help='Allocation sites to print per route.')
+    args = parser.parse_args()
+    budgets = {}
+    for item in args.route_budget:
+        path, _, mb = item.rpartition('=')
+        budgets[path] = float(mb)
+
+    # Profile every request; no background jobs or query cache to muddy the figures
+    os.environ.update(MEMORY_PROFILE='1', MEMORY_PROFILE_LOG='', BACKGROUND_WORKERS='0', QUERY_CACHE='0')
+    import app
+    import memprofile
+
+    client = app.app.test_client()
+    response = client.post('/login', data={'username': args.user, 'password': args.password})
+    if response.status_code != 302:
+        sys.exit("login failed")
+
+    failures = 0
+    print(f"{'route':<42} {'status':>6} {'peak MB':>8} {'avg MB':>7} {'net KB':>8} {'budget':>7}")
+    for template in ROUTES:
+        path = template.format(bill_id=args.bill_id)
+        memprofile.reset()
+        for _ in range(args.repeat):
+            status = client.get(path).status_code
+        endpoint, stats = next(iter(memprofile.stats()["endpoints"].items()), (None, None))
+        if stats is None:
+            print(f"{path:<42} {status:>6}  (not measured)")
+            continue
+        budget = budgets.get(path, args.budget_mb)
+        peak_mb = stats["peak_max_kb"] / 1024
+        over = peak_mb > budget
+        failures += over
+        print(f"{path:<42} {status:>6} {peak_mb:8.2f} {stats['peak_avg_kb'] / 1024:7.2f} "
+              f"{stats['net_avg_kb']:8.1f} {budget:7.1f}{'  OVER' if over else ''}")
+        for site in stats["top_sites"][:args.sites]:
+            print(f"    {site['kb']:9.1f} KB  {site['site']}")
+
+    print(f"budget: {'ok' if not failures else f'{failures} route(s) FAILED'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Receipt renderers against the existing print paths.
+
+Renders one synthetic bill with each path and reports the median time and
+peak Python allocation per render:
+
+  receipt-text    receipt.render_text
+  receipt-escpos  receipt.render_escpos
+  receipt-pdf     receipt.render_pdf (80 mm canvas, no platypus)
+  a4-pdf          invoice_pdf.render_invoice (what /invoices/<id>/pdf queues)
+  html-print      templates/invoice_print.html (what /invoices/<id>/print renders)
+
+No database needed.
+
+    python benchmarks/bench_receipt.py --items 5 20 --runs 200
+"""
+import argparse
+import datetime
+import decimal
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import jinja2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+import invoice_pdf  # noqa: E402
+import receipt  # noqa: E402
+
+
+def sample(n_items):
+    now = datetime.datetime(2024, 6, 1, 18, 30)
+    prices = [decimal.Decimal(f"{10 + i * 3}.50") for i in range(n_items)]
+    subtotal = sum(p * 2 for p in prices)
+    gst = (subtotal * decimal.Decimal('0.18')).quantize(decimal.Decimal('0.01'))
+
+    receipt_bill = ('BILL20240601183000', now, 'Cash', subtotal, decimal.Decimal('0'),
+                    gst / 2, gst / 2, decimal.Decimal('0'), gst, subtotal + gst,
+                    'Walk-in Customer', '9876543210')
+    receipt_items = [(f"Product {i}", 2, p, p * 2) for i, p in enumerate(prices)]
+
+    # b.* + customer columns, as partitions.fetch_bill returns them
+    full_bill = [1, 1, 'BILL20240601183000', subtotal, 'none', 0, decimal.Decimal('0'), 'cgst_sgst',
+                 gst / 2, gst / 2, 0, gst, subtotal + gst, 'Cash', None, None, None, 'Paid', now, 1,
+                 'Walk-in Customer', '9876543210', None, None]
+    full_items = [(i, 1, i, 2, p, p * 2, f"Product {i}") for i, p in enumerate(prices)]
+    # laid out the way templates/invoice_print.html indexes the bill
+    print_bill = [1, 1, 'BILL20240601183000', float(subtotal), 'none', 0.0, 0.0, 0.0, 'cgst_sgst',
+                  float(gst / 2), float(gst / 2), 0.0, float(gst), float(subtotal + gst), 'Cash', now,
+                  'Walk-in Customer', '9876543210', None, None]
+    print_items = [[float(v) if isinstance(v, decimal.Decimal) else v for v in row] for row in full_items]
+    return receipt_bill, receipt_items, full_bill, full_items, print_bill, print_items
+
+
+def measure(fn, runs):
+    fn()
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, nargs='+', default=[5, 20])
+    parser.add_argument('--runs', type=int, default=200)
+    args = parser.parse_args()
+
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(os.path.join(ROOT, 'templates')))
+    print_template = env.get_template('invoice_print.html')
+
+    print(f"{'items':>5}  {'path':<15}{'median ms':>10}{'peak KiB':>10}{'bytes':>9}")
+    for n_items in args.items:
+        rb, ri, fb, fi, pb, pi = sample(n_items)
+        paths = [
+            ('receipt-text', lambda: receipt.render_text(rb, ri)),
+            ('receipt-escpos', lambda: receipt.render_escpos(rb, ri)),
+            ('receipt-pdf', lambda: receipt.render_pdf(rb, ri)),
+            ('a4-pdf', lambda: invoice_pdf.render_invoice(fb, fi)),
+            ('html-print', lambda: print_template.render(bill=pb, items=pi)),
+        ]
+        for name, fn in paths:
+            median, peak = measure(fn, args.runs)
+            print(f"{n_items:>5}  {name:<15}{median * 1000:>10.3f}{peak / 1024:>10.1f}{len(fn()):>9}")
+
+
+if __name__ == '__main__':
+    main()
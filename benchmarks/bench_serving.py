@@ -0,0 +1,115 @@
+"""Startup time and throughput: Flask dev server vs the gunicorn setup.
+
+Starts each server in turn, measures the time until the first 200 on
+--path, then runs --clients concurrent clients (a new connection per
+request) for --seconds and reports requests/second and latency percentiles.
+
+  dev       python app.py  (app.run(debug=True), what we used to deploy)
+  gunicorn  gunicorn -c gunicorn.conf.py wsgi:app
+
+Needs the database from config.py (the app checks migrations on start).
+
+    python benchmarks/bench_serving.py --path /login --clients 32 --seconds 15
+"""
+import argparse
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVERS = {
+    "dev": ([sys.executable, "app.py"], "http://127.0.0.1:3000"),
+    "gunicorn": ([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+                 "http://127.0.0.1:3000"),
+}
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=10) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def wait_ready(url, timeout=120):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if get(url) == 200:
+            return time.perf_counter() - started
+        time.sleep(0.05)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def load(url, clients, seconds):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        mine, failed = [], 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            if get(url) == 200:
+                mine.append(time.perf_counter() - started)
+            else:
+                failed += 1
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0]
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] * 1000
+
+
+def run(name, path, clients, seconds):
+    command, base = SERVERS[name]
+    env = dict(os.environ, WEB_BIND="127.0.0.1:3000")
+    process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL, start_new_session=True)
+    try:
+        startup = wait_ready(base + path)
+        latencies, errors = load(base + path, clients, seconds)
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=60)
+
+    print(f"{name:<9} startup {startup * 1000:7.0f} ms  {len(latencies) / seconds:8.1f} req/s  "
+          f"p50 {percentile(latencies, 0.5):6.1f} ms  p99 {percentile(latencies, 0.99):6.1f} ms  "
+          f"mean {statistics.mean(latencies or [0]) * 1000:6.1f} ms  errors {errors}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--path", default="/login")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=15)
+    parser.add_argument("--servers", nargs="+", default=list(SERVERS), choices=list(SERVERS))
+    args = parser.parse_args()
+    for name in args.servers:
+        run(name, args.path, args.clients, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
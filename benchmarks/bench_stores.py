@@ -0,0 +1,122 @@
+"""Bill-insert throughput as stores are added.
+
+For each store count N, runs N concurrent tills (one thread per store), each
+inserting bills with items and stock decrements, in two layouts:
+
+  shared   all stores write to one database (single bills/products tables)
+  sharded  each store writes to its own database, as shards.py routes them
+
+Needs a MySQL server and an account allowed to create databases; uses the
+connection settings from config.py. Creates and drops `bench_store_*`
+databases.
+
+    python benchmarks/bench_stores.py --stores 1 2 4 8 --seconds 10
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import MySQLdb
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config  # noqa: E402
+
+
+TABLES = """
+CREATE TABLE products (id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(100),
+                       price DECIMAL(10,2), stock INT DEFAULT 0);
+CREATE TABLE bills (id INT AUTO_INCREMENT PRIMARY KEY, store_id INT NOT NULL DEFAULT 1,
+                    bill_number VARCHAR(50), total_amount DECIMAL(10,2),
+                    final_amount DECIMAL(10,2), created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+CREATE TABLE bill_items (id INT AUTO_INCREMENT PRIMARY KEY, bill_id INT, product_id INT,
+                         quantity INT, unit_price DECIMAL(10,2), total_price DECIMAL(10,2),
+                         INDEX (bill_id));
+"""
+
+
+def connect(db=None):
+    kwargs = dict(host=Config.MYSQL_HOST, port=Config.MYSQL_PORT,
+                  user=Config.MYSQL_USER, passwd=Config.MYSQL_PASSWORD)
+    if db:
+        kwargs['db'] = db
+    return MySQLdb.connect(**kwargs)
+
+
+def create_db(name, products=200):
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute(f"DROP DATABASE IF EXISTS {name}")
+    cur.execute(f"CREATE DATABASE {name}")
+    cur.execute(f"USE {name}")
+    for statement in TABLES.split(';'):
+        if statement.strip():
+            cur.execute(statement)
+    cur.executemany("INSERT INTO products (name, price, stock) VALUES (%s, %s, %s)",
+                    [(f"Product {i}", 10 + i, 10 ** 9) for i in range(products)])
+    conn.commit()
+    conn.close()
+
+
+def drop_db(name):
+    conn = connect()
+    conn.cursor().execute(f"DROP DATABASE IF EXISTS {name}")
+    conn.close()
+
+
+def till(db, store_id, deadline, counts, index):
+    conn = connect(db)
+    cur = conn.cursor()
+    done = 0
+    while time.time() < deadline:
+        cur.execute("INSERT INTO bills (store_id, bill_number, total_amount, final_amount) "
+                    "VALUES (%s, %s, 100, 118)", (store_id, f"B{store_id}-{done}"))
+        bill_id = cur.lastrowid
+        for n in range(5):
+            product_id = (done * 5 + n) % 200 + 1
+            cur.execute("INSERT INTO bill_items (bill_id, product_id, quantity, unit_price, total_price) "
+                        "VALUES (%s, %s, 1, 20, 20)", (bill_id, product_id))
+            cur.execute("UPDATE products SET stock = stock - 1 WHERE id = %s", (product_id,))
+        conn.commit()
+        done += 1
+    conn.close()
+    counts[index] = done
+
+
+def run(stores, seconds, layout):
+    names = [f"bench_store_{i}" for i in range(stores)] if layout == 'sharded' else ["bench_store_shared"]
+    for name in names:
+        create_db(name)
+    try:
+        counts = [0] * stores
+        deadline = time.time() + seconds
+        threads = [
+            threading.Thread(target=till, args=(names[i % len(names)], i + 1, deadline, counts, i))
+            for i in range(stores)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return sum(counts) / seconds
+    finally:
+        for name in names:
+            drop_db(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--stores', type=int, nargs='+', default=[1, 2, 4, 8, 16, 30])
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{'stores':>6} {'shared bills/s':>15} {'sharded bills/s':>16}")
+    for stores in args.stores:
+        shared = run(stores, args.seconds, 'shared')
+        sharded = run(stores, args.seconds, 'sharded')
+        print(f"{stores:>6} {shared:>15.1f} {sharded:>16.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""Worker start during a rollout, with and without a warm-start snapshot.
+
+Simulates --workers gunicorn workers starting together over a synthetic
+catalog of --products (as in bench_fuzzy.py), --changes of which changed
+after the snapshot was written:
+
+  cold  each forked worker builds its lookup index from the whole catalog,
+        as warm_worker() does without a snapshot
+  warm  the master loads the snapshot (snapshots.py) once and freezes the
+        collector before forking, as wsgi.py does; each worker applies only
+        the changed products
+
+Reports the time from fork until each worker has answered a lookup (wall
+time, which includes waiting for a core while the others start, and the
+worker's own CPU time), the master's load time and snapshot size, and the
+catalog rows the workers would read from MySQL in each case. Exits non-zero
+if a warm worker's median CPU time exceeds --target-ms. No database
+needed. Linux (fork) only.
+
+    python benchmarks/bench_warmstart.py --products 100000 --workers 9 --changes 500 --target-ms 50
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import fuzzy  # noqa: E402
+import snapshots  # noqa: E402
+from bench_fuzzy import catalog  # noqa: E402
+
+STORE_ID = 1
+
+
+def start_workers(n, work):
+    """Fork n workers running work(); {"ms", "cpu_ms", "rows"} per worker, timed from the fork."""
+    pipes = []
+    for _ in range(n):
+        read_end, write_end = os.pipe()
+        forked = time.perf_counter()
+        if os.fork() == 0:
+            os.close(read_end)
+            cpu = time.process_time()
+            rows = work()
+            result = {"ms": (time.perf_counter() - forked) * 1000, "cpu_ms": (time.process_time() - cpu) * 1000,
+                      "rows": rows}
+            os.write(write_end, json.dumps(result).encode())
+            os._exit(0)
+        os.close(write_end)
+        pipes.append(read_end)
+    results = []
+    for read_end in pipes:
+        with os.fdopen(read_end) as f:
+            results.append(json.loads(f.read()))
+    for _ in pipes:
+        os.wait()
+    return results
+
+
+def report(label, results):
+    times = [r["ms"] for r in results]
+    cpu = statistics.median(r["cpu_ms"] for r in results)
+    rows = sum(r["rows"] for r in results)
+    print(f"{label:<5} median {statistics.median(times):8.1f} ms  slowest {max(times):8.1f} ms  "
+          f"cpu {cpu:8.1f} ms  catalog rows read {rows:>10,}")
+    return cpu, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=9)
+    parser.add_argument('--changes', type=int, default=500)
+    parser.add_argument('--target-ms', type=float, default=50)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    names = catalog(args.products, rng)
+    upserts = [{"id": i, "name": name, "score": rng.random()} for i, name in enumerate(names)]
+    changed = [dict(p, name=p["name"] + " new") for p in rng.sample(upserts, min(args.changes, len(upserts)))]
+    full = {"reset": True, "version": 1, "more": False, "upserts": upserts, "deletes": []}
+    delta = {"reset": False, "version": 2, "more": False, "upserts": changed, "deletes": []}
+    query = names[0].split()[0] + " " + names[0].split()[1][:3]
+
+    def cold():
+        index = fuzzy.ProductIndex()
+        index.apply(full)
+        index.search(query)
+        return len(full["upserts"])
+
+    def warm():
+        index = fuzzy._indexes[STORE_ID]
+        with index.lock:
+            index.apply(delta)
+            index.search(query)
+        return len(delta["upserts"])
+
+    cold_ms, cold_rows = report("cold", start_workers(args.workers, cold))
+
+    # What the job leader does: build the index and save it
+    snapshots.register('fuzzy', fuzzy.versions, fuzzy.dump, fuzzy.restore)
+    fuzzy._indexes[STORE_ID] = fuzzy.ProductIndex()
+    fuzzy._indexes[STORE_ID].apply(full)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'warm.snapshot')
+        written = snapshots.write(path)
+        # What the master does before forking
+        fuzzy._indexes.clear()
+        loaded = snapshots.load(path)
+    gc.freeze()
+    print(f"snapshot {written['bytes'] / 2**20:.1f} MB, written in {written['ms']:.0f} ms, "
+          f"loaded by the master in {loaded['ms']:.0f} ms")
+    warm_ms, warm_rows = report("warm", start_workers(args.workers, warm))
+
+    print(f"rollout of {args.workers} workers: {cold_rows / max(warm_rows, 1):.0f}x fewer catalog rows, "
+          f"median worker start {cold_ms / warm_ms:.0f}x less CPU")
+    ok = warm_ms <= args.target_ms
+    print(f"target {args.target_ms:.0f} ms: {'ok' if ok else 'FAILED'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Concurrency check: parallel retries of one bill must create exactly one bill.
+
+Fires N simultaneous POST /createbill requests that share an Idempotency-Key
+at a running server, then checks that every response names the same bill_id
+and that exactly one of them was not a replay. Repeats for several keys.
+
+    python app.py &                      # or the production server
+    python benchmarks/check_idempotency.py --url http://127.0.0.1:3000 --retries 16
+
+Exits non-zero on any duplicate.
+"""
+import argparse
+import json
+import sys
+import threading
+import urllib.request
+import uuid
+
+
+PAYLOAD = {
+    "customer_id": None,
+    "payment_method": "Cash",
+    "discount_type": "none",
+    "discount_value": 0,
+    "gst_type": "cgst_sgst",
+    "subtotal": 100,
+    "discount_amount": 0,
+    "cgst": 9,
+    "sgst": 9,
+    "igst": 0,
+    "final_total": 118,
+    "items": [{"product_id": 1, "product_name": "Test", "price": 100, "qty": 1, "total": 100}],
+}
+
+
+def post(url, key, results, index, barrier):
+    request = urllib.request.Request(
+        url + "/createbill",
+        data=json.dumps(PAYLOAD).encode(),
+        headers={"Content-Type": "application/json", "Idempotency-Key": key},
+        method="POST",
+    )
+    barrier.wait()
+    with urllib.request.urlopen(request, timeout=30) as response:
+        body = json.loads(response.read())
+        results[index] = (body.get("bill_id"), response.headers.get("Idempotent-Replayed") == "true")
+
+
+def run_once(url, retries):
+    key = uuid.uuid4().hex
+    results = [None] * retries
+    barrier = threading.Barrier(retries)
+    threads = [threading.Thread(target=post, args=(url, key, results, i, barrier)) for i in range(retries)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    bill_ids = {r[0] for r in results if r}
+    originals = sum(1 for r in results if r and not r[1])
+    return bill_ids, originals, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:3000")
+    parser.add_argument("--retries", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+
+    failed = False
+    for round_ in range(args.rounds):
+        bill_ids, originals, results = run_once(args.url, args.retries)
+        ok = len(bill_ids) == 1 and originals == 1 and all(results)
+        failed |= not ok
+        print(f"round {round_ + 1}: bill_ids={sorted(bill_ids)} originals={originals} "
+              f"{'ok' if ok else 'DUPLICATE'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Where A4 invoice rendering time goes, and invoices/second on one core.
+
+Renders a synthetic bill repeatedly with invoice_pdf.render_invoice:
+
+  shared  the normal path, with the process-wide layout (styles, table
+          styles, wrapped header/footer) built once
+  cold    the layout rebuilt for every render, as before it was shared
+
+then profiles the shared path and prints the top functions. Exits non-zero
+when shared throughput is below --target invoices/second (single process,
+so per core).
+
+    python benchmarks/profile_invoice_pdf.py --items 10 --renders 300 --target 100
+"""
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import invoice_pdf  # noqa: E402
+from bench_receipt import sample  # noqa: E402
+
+
+def throughput(render, renders):
+    render()
+    start = time.perf_counter()
+    for _ in range(renders):
+        render()
+    return renders / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--items', type=int, default=10)
+    parser.add_argument('--renders', type=int, default=300)
+    parser.add_argument('--target', type=float, default=100.0, help='invoices/second/core')
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    _, _, bill, items, _, _ = sample(args.items)
+
+    def shared():
+        invoice_pdf.render_invoice(bill, items)
+
+    def cold():
+        invoice_pdf.layout.cache_clear()
+        invoice_pdf.render_invoice(bill, items)
+
+    cold_rate = throughput(cold, max(args.renders // 3, 10))
+    shared_rate = throughput(shared, args.renders)
+    print(f"cold layout   {cold_rate:8.1f} invoices/s  ({1000 / cold_rate:.2f} ms each)")
+    print(f"shared layout {shared_rate:8.1f} invoices/s  ({1000 / shared_rate:.2f} ms each)")
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    for _ in range(args.renders):
+        shared()
+    profiler.disable()
+    print()
+    pstats.Stats(profiler).sort_stats('tottime').print_stats(args.top)
+
+    ok = shared_rate >= args.target
+    print(f"target {args.target:.0f} invoices/s/core: {'ok' if ok else 'BELOW TARGET'}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
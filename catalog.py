@@ -0,0 +1,168 @@
+"""Product change feed, for tills that keep a local copy of the catalog.
+
+Every write to `products` takes the next number from the single-row
+`catalog_version` counter and stamps it on the rows it touched
+(`products.change_version`); deletes leave a row in `product_tombstones`.
+Because the counter row stays locked until the writer commits, versions
+become visible in order, and "everything with version > X" never skips a
+change that commits late.
+
+Call `bump` as the last statement before commit, so the counter lock is held
+for as short a time as possible.
+"""
+
+
+PRODUCT_COLUMNS = "p.id, p.name, p.price, p.stock, p.barcode, p.category, COALESCE(pp.score, 0), p.change_version"
+
+# Name lookups on the billing path. Both match a prefix, so they range-scan
+# idx_products_name; a word inside a name, or a misspelt one, is the fuzzy
+# index's job. migrations.HOT_QUERIES explains these same strings.
+NAME_PREFIX_SQL = "SELECT id, name, price, stock FROM products WHERE name LIKE %s ORDER BY name LIMIT %s"
+RANKED_PREFIX_SQL = """
+    SELECT p.id, p.name, p.price, p.stock
+    FROM products p
+    LEFT JOIN product_popularity pp ON pp.product_id = p.id
+    WHERE p.name LIKE %s
+    ORDER BY COALESCE(pp.score, 0) DESC, p.name ASC
+    LIMIT %s
+"""
+
+
+def prefix_pattern(text):
+    """LIKE pattern for names starting with `text`, wildcards in it taken literally."""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def bump(cur, product_ids=(), deleted_ids=()):
+    """Assign the next catalog version to changed and deleted products. Returns it."""
+    cur.execute("UPDATE catalog_version SET version = LAST_INSERT_ID(version + 1) WHERE id = 1")
+    cur.execute("SELECT LAST_INSERT_ID()")
+    version = cur.fetchone()[0]
+    product_ids = sorted(set(int(i) for i in product_ids))
+    if product_ids:
+        placeholders = ', '.join(['%s'] * len(product_ids))
+        cur.execute(f"UPDATE products SET change_version = %s WHERE id IN ({placeholders})",
+                    [version] + product_ids)
+    for product_id in deleted_ids:
+        cur.execute("""
+            INSERT INTO product_tombstones (product_id, change_version) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE change_version = VALUES(change_version), deleted_at = CURRENT_TIMESTAMP
+        """, (product_id, version))
+    return version
+
+
+def _product(row):
+    return {
+        "id": int(row[0]),
+        "name": row[1],
+        "price": float(row[2] or 0),
+        "stock": int(row[3] or 0),
+        "barcode": row[4],
+        "category": row[5],
+        "score": float(row[6] or 0),
+        "version": int(row[7]),
+    }
+
+
+def identity(store_id, epoch):
+    """What a client's versions are numbered in: the store, and its database's epoch (migration 0013)."""
+    return f"{store_id}:{epoch}"
+
+
+def changes(conn, since=0, limit=1000, store_id=None, client_catalog=None, resume=None):
+    """Products changed and deleted after version `since`.
+
+    Returns {"catalog", "version", "reset", "more", "resume", "upserts", "deletes"}.
+    With `reset` the client must drop its copy first (first sync, its version
+    predates the oldest tombstone kept, or `client_catalog`, the identity its
+    copy was built from, is not this one). With `more` it should call again
+    with the returned version and `resume`.
+
+    Each page is read in one snapshot. A reset is paged by product id: its
+    pages report version 0, so a copy left half-built starts over, and the
+    last one reports the version the reset started at; what changed while it
+    ran then arrives as ordinary pages.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT version, purged_before, epoch FROM catalog_version WHERE id = 1")
+        current, purged_before, epoch = cur.fetchone()
+        catalog = identity(store_id, epoch)
+        foreign = client_catalog is not None and client_catalog != catalog
+
+        started, after_id = _parse_resume(resume)
+        if started is not None and not foreign and purged_before <= started <= current:
+            # Tombstones after `started` are all still kept
+            return _reset_page(cur, catalog, started, after_id, limit, first=False)
+        if since <= 0 or since < purged_before or since > current or foreign:
+            return _reset_page(cur, catalog, current, 0, limit, first=True)
+
+        # Page on version boundaries so one bill's products never straddle two pages
+        upto, more = current, False
+        cur.execute("""
+            SELECT change_version FROM products WHERE change_version > %s
+            ORDER BY change_version LIMIT 1 OFFSET %s
+        """, (since, limit))
+        row = cur.fetchone()
+        if row and row[0] < current:
+            upto, more = row[0], True
+
+        cur.execute(f"""
+            SELECT {PRODUCT_COLUMNS}
+            FROM products p
+            LEFT JOIN product_popularity pp ON pp.product_id = p.id
+            WHERE p.change_version > %s AND p.change_version <= %s
+            ORDER BY p.change_version, p.id
+        """, (since, upto))
+        upserts = [_product(r) for r in cur.fetchall()]
+        cur.execute("SELECT product_id FROM product_tombstones WHERE change_version > %s AND change_version <= %s",
+                    (since, upto))
+        deletes = [int(r[0]) for r in cur.fetchall()]
+    finally:
+        cur.close()
+    return {"catalog": catalog, "version": int(upto), "reset": False, "more": more, "resume": None,
+            "upserts": upserts, "deletes": deletes}
+
+
+def _parse_resume(resume):
+    """(version the reset started at, last product id sent), or (None, None)."""
+    try:
+        started, after_id = (int(part) for part in str(resume).split('.'))
+    except ValueError:
+        return None, None
+    return started, after_id
+
+
+def _reset_page(cur, catalog, started, after_id, limit, first):
+    # Products from before the change feed all share version 0, so a full
+    # copy cannot page on versions; it pages on the primary key instead
+    cur.execute(f"""
+        SELECT {PRODUCT_COLUMNS}
+        FROM products p
+        LEFT JOIN product_popularity pp ON pp.product_id = p.id
+        WHERE p.id > %s
+        ORDER BY p.id
+        LIMIT %s
+    """, (after_id, limit + 1))
+    rows = cur.fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return {"catalog": catalog, "version": 0 if more else int(started), "reset": first, "more": more,
+            "resume": f"{started}.{int(rows[-1][0])}" if more else None,
+            "upserts": [_product(r) for r in rows], "deletes": []}
+
+
+def purge_tombstones(conn, older_than_days=30):
+    """Drop old tombstones; clients older than the newest dropped one resync."""
+    cur = conn.cursor()
+    cur.execute("SELECT MAX(change_version) FROM product_tombstones WHERE deleted_at < NOW() - INTERVAL %s DAY",
+                (older_than_days,))
+    newest = cur.fetchone()[0]
+    if newest is None:
+        cur.close()
+        return 0
+    cur.execute("UPDATE catalog_version SET purged_before = GREATEST(purged_before, %s) WHERE id = 1", (newest,))
+    deleted = cur.execute("DELETE FROM product_tombstones WHERE change_version <= %s", (newest,))
+    conn.commit()
+    cur.close()
+    return deleted
@@ -0,0 +1,139 @@
+"""Response compression and content-hashed, precompressed static assets.
+
+`init_app` adds an after-request hook that gzips (or brotli-compresses, when
+the optional `brotli` package is installed and the client accepts `br`)
+text-like responses of at least COMPRESS_MIN_SIZE bytes. Streamed responses
+(server-sent events) and files sent with `send_file` are left alone.
+
+Static files are hashed and compressed once, at first use, and served from
+memory under /assets/<name>.<hash>.<ext> with a one-year immutable cache
+header. Templates link them with `asset_url('css/style.css')`, so a changed
+file gets a new URL and tills never need to revalidate the old one.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import abort, current_app, make_response, request, url_for
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+
+COMPRESSIBLE = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+_state = {"min_size": 1024, "level": 6}
+_assets = {}
+_names = {}
+_lock = threading.Lock()
+
+
+def init_app(app):
+    _state["min_size"] = app.config.get('COMPRESS_MIN_SIZE', 1024)
+    _state["level"] = app.config.get('COMPRESS_LEVEL', 6)
+    app.after_request(_compress_response)
+    app.add_url_rule('/assets/<path:filename>', 'asset', _serve_asset)
+    app.jinja_env.globals['asset_url'] = asset_url
+
+
+def _compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE)
+
+
+def choose_encoding(accept_encodings):
+    """Best supported encoding from a parsed Accept-Encoding header, or None."""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding, level=6):
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _compress_response(response):
+    response.vary.add('Accept-Encoding')
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code >= 300
+            or 'Content-Encoding' in response.headers
+            or not _compressible(response.mimetype)):
+        return response
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < _state["min_size"]:
+        return response
+
+    response.set_data(compress(data, encoding, _state["level"]))
+    response.headers['Content-Encoding'] = encoding
+    # A strong validator must change with the bytes; weak ones may stay
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+    return response
+
+
+def _load_assets(static_folder):
+    """Hash and compress every file under static/, once per process."""
+    with _lock:
+        if _names:
+            return
+        for root, _, files in os.walk(static_folder):
+            for name in files:
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, static_folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    data = f.read()
+                digest = hashlib.sha256(data).hexdigest()[:12]
+                stem, ext = os.path.splitext(relative)
+                hashed = f"{stem}.{digest}{ext}"
+                mimetype = mimetypes.guess_type(relative)[0] or 'application/octet-stream'
+                encoded = {}
+                if _compressible(mimetype) and len(data) >= _state["min_size"]:
+                    encoded['gzip'] = compress(data, 'gzip', 9)
+                    if brotli is not None:
+                        encoded['br'] = compress(data, 'br', 11)
+                _assets[hashed] = {"data": data, "mimetype": mimetype, "digest": digest, "encoded": encoded}
+                _names[relative] = hashed
+
+
+def asset_url(filename):
+    _load_assets(current_app.static_folder)
+    hashed = _names.get(filename)
+    if hashed is None:
+        return url_for('static', filename=filename)
+    return url_for('asset', filename=hashed)
+
+
+def _serve_asset(filename):
+    _load_assets(current_app.static_folder)
+    entry = _assets.get(filename)
+    if entry is None:
+        abort(404)
+
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding not in entry["encoded"]:
+        encoding = None
+    etag = f"{entry['digest']}-{encoding}" if encoding else entry["digest"]
+
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(entry["encoded"][encoding] if encoding else entry["data"])
+        response.mimetype = entry["mimetype"]
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = IMMUTABLE
+    response.vary.add('Accept-Encoding')
+    return response
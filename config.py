@@ -9,4 +9,119 @@ class Config:
     MYSQL_USER = os.getenv('MYSQL_USER', 'root')
     MYSQL_PASSWORD = os.getenv('MYSQL_PASSWORD', 'bala1234')
     MYSQL_DB = os.getenv('MYSQL_DB', 'shop_billing')
-    MYSQL_PORT = int(os.getenv('MYSQL_PORT', 3306))
\ No newline at end of file
+    MYSQL_PORT = int(os.getenv('MYSQL_PORT', 3306))
+
+    # Background jobs (report fact refresh, etc.)
+    BACKGROUND_WORKERS = os.getenv('BACKGROUND_WORKERS', '1') == '1'
+    REPORT_REFRESH_SECONDS = int(os.getenv('REPORT_REFRESH_SECONDS', 60))
+
+    # Read replicas, e.g. "10.0.0.12:3306,10.0.0.13". Empty means primary only.
+    MYSQL_REPLICAS = os.getenv('MYSQL_REPLICAS', '')
+    REPLICA_MAX_LAG_SECONDS = int(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))
+    REPLICA_LAG_CHECK_SECONDS = int(os.getenv('REPLICA_LAG_CHECK_SECONDS', 10))
+    READ_AFTER_WRITE_SECONDS = int(os.getenv('READ_AFTER_WRITE_SECONDS', 5))
+
+    # Inventory worker: velocity window and reorder policy
+    INVENTORY_REFRESH_SECONDS = int(os.getenv('INVENTORY_REFRESH_SECONDS', 120))
+    VELOCITY_WINDOW_DAYS = int(os.getenv('VELOCITY_WINDOW_DAYS', 28))
+    REORDER_LEAD_TIME_DAYS = int(os.getenv('REORDER_LEAD_TIME_DAYS', 3))
+    REORDER_SAFETY_DAYS = int(os.getenv('REORDER_SAFETY_DAYS', 2))
+    LOW_STOCK_MIN = int(os.getenv('LOW_STOCK_MIN', 5))
+
+    # Lookup ranking: time-decayed product popularity
+    POPULARITY_REFRESH_SECONDS = int(os.getenv('POPULARITY_REFRESH_SECONDS', 300))
+    POPULARITY_HALF_LIFE_DAYS = float(os.getenv('POPULARITY_HALF_LIFE_DAYS', 14))
+
+    # Multi-store: how long the stores -> shard map is cached
+    STORE_CACHE_SECONDS = int(os.getenv('STORE_CACHE_SECONDS', 60))
+
+    # Partitioning / archive tiering
+    INVOICE_LIST_DAYS = int(os.getenv('INVOICE_LIST_DAYS', 90))
+    PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', 3))
+    FISCAL_YEAR_START_MONTH = int(os.getenv('FISCAL_YEAR_START_MONTH', 4))
+
+    # Schema migrations: 'warn' logs pending ones, 'fail' answers 503 until applied
+    MIGRATIONS_CHECK = os.getenv('MIGRATIONS_CHECK', 'warn')
+
+    # Idempotency keys for bill creation are kept this long
+    IDEMPOTENCY_KEY_HOURS = int(os.getenv('IDEMPOTENCY_KEY_HOURS', 48))
+
+    # PDF rendering queue (SQLite file + output dir) and its worker processes
+    PDF_QUEUE_PATH = os.getenv('PDF_QUEUE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'var', 'pdfqueue.sqlite'))
+    PDF_OUTPUT_DIR = os.getenv('PDF_OUTPUT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'var', 'pdf'))
+    PDF_WORKERS = int(os.getenv('PDF_WORKERS', 2))
+    # Have the job leader start `python pdfqueue.py` as its own process; set to 0 when running it separately
+    PDF_WORKERS_EMBEDDED = os.getenv('PDF_WORKERS_EMBEDDED', '1') == '1'
+
+    # Response compression: bodies smaller than this are sent as is
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+
+    # Product change feed: deleted-product tombstones are kept this long;
+    # tills that have not synced since then download the catalog again
+    CATALOG_TOMBSTONE_DAYS = int(os.getenv('CATALOG_TOMBSTONE_DAYS', 30))
+
+    # Autosaved bill drafts untouched for this long are deleted
+    DRAFT_ABANDON_HOURS = int(os.getenv('DRAFT_ABANDON_HOURS', 24))
+
+    # Production server (gunicorn.conf.py). 0 workers means 2 x cores + 1.
+    WEB_BIND = os.getenv('WEB_BIND', '0.0.0.0:3000')
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', 0))
+    WEB_THREADS = int(os.getenv('WEB_THREADS', 8))
+    # Held by the one process that runs background jobs and the PDF pool
+    LEADER_LOCK_PATH = os.getenv('LEADER_LOCK_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'var', 'leader.lock'))
+    # Server-sent events reach streams in every worker through Unix sockets in
+    # this directory (events.py); empty keeps them inside the publishing process
+    EVENTS_SOCKET_DIR = os.getenv('EVENTS_SOCKET_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'var', 'events'))
+
+    # Admission control (admission.py): of the WEB_THREADS threads in each
+    # worker, ADMISSION_RESERVED are kept for billing and product lookup.
+    # PDFs, invoice lists and reports run at most ADMISSION_HEAVY_LIMIT at a
+    # time with a short queue, event streams at most ADMISSION_STREAM_LIMIT;
+    # requests that find no room get 503 Retry-After
+    ADMISSION = os.getenv('ADMISSION', '1') == '1'
+    ADMISSION_RESERVED = int(os.getenv('ADMISSION_RESERVED', 2))
+    ADMISSION_HEAVY_LIMIT = int(os.getenv('ADMISSION_HEAVY_LIMIT', 2))
+    ADMISSION_HEAVY_QUEUE = int(os.getenv('ADMISSION_HEAVY_QUEUE', 2))
+    ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 5))
+    ADMISSION_STREAM_LIMIT = int(os.getenv('ADMISSION_STREAM_LIMIT', 2))
+    ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 5))
+
+    # Fuzzy product lookup: each process checks the catalog change feed for
+    # renamed/new/deleted products at most this often
+    FUZZY_REFRESH_SECONDS = float(os.getenv('FUZZY_REFRESH_SECONDS', 2))
+    # Warm-start snapshot (snapshots.py): the job leader saves in-process
+    # caches here when they change, and the gunicorn master loads them before
+    # forking workers. Empty to turn it off.
+    WARM_SNAPSHOT_PATH = os.getenv('WARM_SNAPSHOT_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'var', 'warm.snapshot'))
+    WARM_SNAPSHOT_SECONDS = int(os.getenv('WARM_SNAPSHOT_SECONDS', 300))
+
+    # GSTR-1 return data: the store's GSTIN and state code (first two digits
+    # of the GSTIN), the B2C large invoice limit, and where returns are written.
+    # Last month's return is generated daily until it exists, if GSTIN is set.
+    GSTIN = os.getenv('GSTIN', '')
+    GST_STATE_CODE = os.getenv('GST_STATE_CODE', os.getenv('GSTIN', '')[:2] or '33')
+    GSTR1_B2CL_LIMIT = float(os.getenv('GSTR1_B2CL_LIMIT', 100000))
+    GSTR1_OUTPUT_DIR = os.getenv('GSTR1_OUTPUT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'var', 'returns'))
+
+    # Read query result cache (querycache.py), invalidated per table by write
+    # routes through a counter file shared by the workers on this host.
+    # QUERY_CACHE=0 bypasses it (debugging); TTL bounds staleness from writes
+    # made elsewhere and replica lag.
+    QUERY_CACHE = os.getenv('QUERY_CACHE', '1') == '1'
+    QUERY_CACHE_MAX_BYTES = int(os.getenv('QUERY_CACHE_MAX_MB', 64)) * 1024 * 1024
+    QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', 30))
+    QUERY_CACHE_VERSIONS_PATH = os.getenv('QUERY_CACHE_VERSIONS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'var', 'querycache.versions'))
+
+    # End-of-day close: days with bills that nobody closed are closed
+    # automatically (without a cash count) for this many days back
+    DAY_CLOSE_CATCHUP_DAYS = int(os.getenv('DAY_CLOSE_CATCHUP_DAYS', 7))
+
+    # Memory instrumentation (memprofile.py), off by default: per-request
+    # tracemalloc peaks and allocation sites, with a periodic heap summary
+    # per worker appended to MEMORY_PROFILE_LOG
+    MEMORY_PROFILE = os.getenv('MEMORY_PROFILE', '0') == '1'
+    MEMORY_BUDGET_MB = float(os.getenv('MEMORY_BUDGET_MB', 32))
+    MEMORY_PROFILE_FRAMES = int(os.getenv('MEMORY_PROFILE_FRAMES', 1))
+    MEMORY_PROFILE_INTERVAL = int(os.getenv('MEMORY_PROFILE_INTERVAL', 300))
+    MEMORY_PROFILE_LOG = os.getenv('MEMORY_PROFILE_LOG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'var', 'memory.jsonl'))
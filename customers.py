@@ -0,0 +1,177 @@
+"""Customers keyed by phone number.
+
+Cashiers quick-add regulars at every visit, so quick-add looks the phone up
+first and only inserts when it is new. `phone_key` is the phone reduced to
+its last ten digits (country code, trunk zero, spaces and dashes dropped),
+unique per store. Phones too short to identify anyone get no key and never
+collide.
+
+`merge_duplicates` folds customers that share a key into the oldest one,
+repointing bills, archived bills, drafts and the customer sales facts in
+batches, then deletes the rest. Migration 0011 runs it once before adding
+the unique index; `flask merge-customers` runs it on demand.
+"""
+import re
+
+import versions
+
+
+MIN_DIGITS = 6
+KEY_DIGITS = 10
+MERGE_BATCH = 1000
+
+# What quick-add hands back for a customer; migrations.HOT_QUERIES explains BY_PHONE_SQL
+QUICK_ADD_COLUMNS = "id, name, phone, email, address"
+BY_PHONE_SQL = f"SELECT {QUICK_ADD_COLUMNS} FROM customers WHERE store_id = %s AND phone_key = %s"
+# Tables whose customer_id is repointed to the surviving customer
+REFERENCES = ("bills", "bills_archive", "bill_drafts")
+# Copied from a duplicate onto the survivor where the survivor has none
+FILL_COLUMNS = ("email", "address", "gstin")
+
+
+def phone_key(phone):
+    """'+91 98400-12345', '098400 12345' and '9840012345' -> '9840012345'."""
+    digits = re.sub(r'\D', '', phone or '')
+    if len(digits) < MIN_DIGITS:
+        return None
+    return digits[-KEY_DIGITS:]
+
+
+def _customer(row):
+    return dict(zip(QUICK_ADD_COLUMNS.split(", "), row))
+
+
+def quick_add(conn, store_id, name, phone='', email='', address=''):
+    """Return (customer, created): the store's customer with this phone, or a new one."""
+    key = phone_key(phone)
+    cur = conn.cursor()
+    if key:
+        cur.execute(BY_PHONE_SQL, (store_id, key))
+        row = cur.fetchone()
+        if row:
+            cur.close()
+            return _customer(row), False
+    # Another till may add the same phone between the lookup and here; the
+    # unique key turns that into a no-op that hands back the existing id
+    # (0 rows affected), and only then is the stored row read back
+    cur.execute("""
+        INSERT INTO customers (store_id, name, phone, phone_key, email, address) VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+    """, (store_id, name, phone, key, email, address))
+    customer_id, created = cur.lastrowid, cur.rowcount == 1
+    if created:
+        versions.bump(cur, 'customers')
+        customer = {"id": customer_id, "name": name, "phone": phone, "email": email, "address": address}
+    else:
+        cur.execute(f"SELECT {QUICK_ADD_COLUMNS} FROM customers WHERE id = %s", (customer_id,))
+        customer = _customer(cur.fetchone())
+    conn.commit()
+    cur.close()
+    return customer, created
+
+
+def backfill_keys(conn, batch=5000):
+    """Set phone_key on rows that have none, in id ranges. Returns the rows keyed."""
+    cur = conn.cursor()
+    cur.execute("SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM customers WHERE phone_key IS NULL")
+    low, high = cur.fetchone()
+    keyed = 0
+    while low and low <= high:
+        cur.execute("SELECT id, phone FROM customers WHERE id >= %s AND id < %s AND phone_key IS NULL",
+                    (low, low + batch))
+        updates = [(phone_key(phone), customer_id) for customer_id, phone in cur.fetchall() if phone_key(phone)]
+        if updates:
+            cur.executemany("UPDATE customers SET phone_key = %s WHERE id = %s", updates)
+            keyed += len(updates)
+        conn.commit()
+        low += batch
+    cur.close()
+    return keyed
+
+
+def duplicate_groups(conn, store_id=None):
+    """[(store_id, phone_key, [ids oldest first])] for keys held by more than one customer."""
+    where, params = ("AND store_id = %s", (store_id,)) if store_id is not None else ("", ())
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT c.store_id, c.phone_key, c.id
+        FROM customers c
+        JOIN (SELECT store_id, phone_key FROM customers
+              WHERE phone_key IS NOT NULL {where}
+              GROUP BY store_id, phone_key HAVING COUNT(*) > 1) d
+          ON d.store_id = c.store_id AND d.phone_key = c.phone_key
+        ORDER BY c.store_id, c.phone_key, c.id
+    """, params)
+    groups = []
+    for group_store, key, customer_id in cur.fetchall():
+        if not groups or groups[-1][:2] != (group_store, key):
+            groups.append((group_store, key, []))
+        groups[-1][2].append(customer_id)
+    cur.close()
+    return groups
+
+
+def _repoint(cur, conn, table, keep, dupes, batch):
+    placeholders = ", ".join(["%s"] * len(dupes))
+    moved = 0
+    while True:
+        cur.execute(f"UPDATE {table} SET customer_id = %s WHERE customer_id IN ({placeholders}) LIMIT %s",
+                    (keep, *dupes, batch))
+        moved += cur.rowcount
+        conn.commit()
+        if cur.rowcount < batch:
+            return moved
+
+
+def merge_group(conn, keep, dupes, batch=MERGE_BATCH):
+    """Fold customers `dupes` into `keep`. Returns the number of bills repointed."""
+    cur = conn.cursor()
+    placeholders = ", ".join(["%s"] * len(dupes))
+    columns = ", ".join(FILL_COLUMNS)
+    cur.execute(f"SELECT id, {columns} FROM customers WHERE id IN (%s, {placeholders}) ORDER BY id DESC",
+                (keep, *dupes))
+    rows = {row[0]: row[1:] for row in cur.fetchall()}
+    filled = list(rows[keep])
+    for customer_id, values in rows.items():
+        for i, value in enumerate(values):
+            if not filled[i] and value:
+                filled[i] = value
+    cur.execute(f"UPDATE customers SET {', '.join(c + ' = %s' for c in FILL_COLUMNS)} WHERE id = %s",
+                (*filled, keep))
+
+    moved = 0
+    for table in REFERENCES:
+        count = _repoint(cur, conn, table, keep, dupes, batch)
+        if table == "bills":
+            moved = count
+    # One row per (day, customer): add the duplicates' rows onto the survivor's
+    cur.execute(f"""
+        INSERT INTO sales_fact_customer (sale_date, customer_id, bill_count, revenue)
+        SELECT sale_date, %s, SUM(bill_count), SUM(revenue)
+        FROM sales_fact_customer WHERE customer_id IN ({placeholders})
+        GROUP BY sale_date
+        ON DUPLICATE KEY UPDATE bill_count = bill_count + VALUES(bill_count), revenue = revenue + VALUES(revenue)
+    """, (keep, *dupes))
+    cur.execute(f"DELETE FROM sales_fact_customer WHERE customer_id IN ({placeholders})", dupes)
+    cur.execute(f"DELETE FROM customers WHERE id IN ({placeholders})", dupes)
+    conn.commit()
+    cur.close()
+    return moved
+
+
+def merge_duplicates(conn, store_id=None, batch=MERGE_BATCH, dry_run=False, log=None):
+    """Merge every group of customers sharing a phone key. Returns (groups, removed, bills repointed).
+
+    Phones without a key are keyed first, even on a dry run.
+    """
+    backfill_keys(conn)
+    groups = duplicate_groups(conn, store_id)
+    removed = moved = 0
+    for group_store, key, ids in groups:
+        keep, dupes = ids[0], ids[1:]
+        if log:
+            log(f"store {group_store} phone {key}: keep {keep}, merge {', '.join(map(str, dupes))}")
+        removed += len(dupes)
+        if not dry_run:
+            moved += merge_group(conn, keep, dupes, batch)
+    return len(groups), removed, moved
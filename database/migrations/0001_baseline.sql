@@ -1,12 +1,13 @@
-CREATE DATABASE shop_billing;
-USE shop_billing;
-CREATE TABLE users (
+-- Original schema. IF NOT EXISTS so databases created before migrations
+-- existed can adopt this history without changes.
+
+CREATE TABLE IF NOT EXISTS users (
     id INT AUTO_INCREMENT PRIMARY KEY,
     username VARCHAR(50) UNIQUE NOT NULL,
     password_hash VARCHAR(255) NOT NULL
 );
 
-CREATE TABLE customers (
+CREATE TABLE IF NOT EXISTS customers (
     id INT AUTO_INCREMENT PRIMARY KEY,
     name VARCHAR(100),
     phone VARCHAR(20),
@@ -15,7 +16,7 @@ CREATE TABLE customers (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
-CREATE TABLE products (
+CREATE TABLE IF NOT EXISTS products (
     id INT AUTO_INCREMENT PRIMARY KEY,
     name VARCHAR(100),
     price DECIMAL(10,2),
@@ -23,7 +24,7 @@ CREATE TABLE products (
     barcode VARCHAR(100)
 );
 
-CREATE TABLE bills (
+CREATE TABLE IF NOT EXISTS bills (
     id INT AUTO_INCREMENT PRIMARY KEY,
     customer_id INT,
     bill_number VARCHAR(50),
@@ -46,7 +47,7 @@ CREATE TABLE bills (
     FOREIGN KEY (customer_id) REFERENCES customers(id)
 );
 
-CREATE TABLE bill_items (
+CREATE TABLE IF NOT EXISTS bill_items (
     id INT AUTO_INCREMENT PRIMARY KEY,
     bill_id INT,
     product_id INT,
@@ -55,4 +56,4 @@ CREATE TABLE bill_items (
     total_price DECIMAL(10,2),
     FOREIGN KEY (bill_id) REFERENCES bills(id),
     FOREIGN KEY (product_id) REFERENCES products(id)
-);
\ No newline at end of file
+);
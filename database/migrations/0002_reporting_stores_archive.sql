@@ -0,0 +1,84 @@
+-- migrate: online
+-- Columns and tables for reporting, inventory, lookup ranking, multi-store
+-- and archiving. New columns are appended so positional SELECT * readers are
+-- unaffected.
+
+ALTER TABLE products ADD COLUMN category VARCHAR(50);
+ALTER TABLE customers ADD COLUMN store_id INT NOT NULL DEFAULT 1;
+ALTER TABLE bills ADD COLUMN store_id INT NOT NULL DEFAULT 1;
+ALTER TABLE bill_items ADD COLUMN created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE users ADD COLUMN store_id INT NOT NULL DEFAULT 1;
+
+-- Each store's products, customers and bills live in its own shard database
+-- (db_host/db_port/db_name). db_name NULL means this database.
+CREATE TABLE stores (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    db_host VARCHAR(100),
+    db_port INT,
+    db_name VARCHAR(64)
+);
+
+INSERT INTO stores (id, name) VALUES (1, 'Main Store');
+
+-- Reporting fact tables, filled incrementally from bills by reports.refresh_facts
+CREATE TABLE report_watermark (
+    name VARCHAR(50) PRIMARY KEY,
+    last_bill_id INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE sales_fact_product (
+    sale_date DATE NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (sale_date, product_id)
+);
+
+CREATE TABLE sales_fact_hourly (
+    sale_date DATE NOT NULL,
+    sale_hour TINYINT NOT NULL,
+    payment_method VARCHAR(50) NOT NULL,
+    bill_count INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (sale_date, sale_hour, payment_method)
+);
+
+CREATE TABLE sales_fact_customer (
+    sale_date DATE NOT NULL,
+    customer_id INT NOT NULL,
+    bill_count INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (sale_date, customer_id)
+);
+
+-- Inventory worker output (inventory.refresh_low_stock)
+CREATE TABLE product_velocity (
+    product_id INT PRIMARY KEY,
+    units_sold INT NOT NULL DEFAULT 0,
+    daily_velocity DECIMAL(12,4) NOT NULL DEFAULT 0
+);
+
+CREATE TABLE low_stock (
+    product_id INT PRIMARY KEY,
+    name VARCHAR(100),
+    stock INT NOT NULL,
+    daily_velocity DECIMAL(12,4) NOT NULL DEFAULT 0,
+    reorder_point INT NOT NULL DEFAULT 0,
+    days_of_cover DECIMAL(12,2) NULL
+);
+
+-- Time-decayed popularity for lookup ranking (popularity.refresh_popularity)
+CREATE TABLE product_popularity (
+    product_id INT PRIMARY KEY,
+    score DOUBLE NOT NULL DEFAULT 0,
+    scored_at DATETIME NOT NULL
+);
+
+-- Closed fiscal years (partitions.archive_fiscal_year). Same columns as the
+-- hot tables so SELECT * copies straight across.
+CREATE TABLE bills_archive LIKE bills;
+ALTER TABLE bills_archive ROW_FORMAT=COMPRESSED;
+
+CREATE TABLE bill_items_archive LIKE bill_items;
+ALTER TABLE bill_items_archive ROW_FORMAT=COMPRESSED, ADD INDEX idx_archive_bill (bill_id);
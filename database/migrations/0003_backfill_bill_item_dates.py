@@ -0,0 +1,22 @@
+"""Copy each bill's created_at onto its items (column added in 0002).
+
+Runs in small id ranges with a commit per batch so it never holds long locks
+on a large bill_items table.
+"""
+
+BATCH = 5000
+
+
+def upgrade(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM bill_items")
+    low, high = cur.fetchone()
+    while low and low <= high:
+        cur.execute("""
+            UPDATE bill_items bi JOIN bills b ON b.id = bi.bill_id
+            SET bi.created_at = b.created_at
+            WHERE bi.id >= %s AND bi.id < %s
+        """, (low, low + BATCH))
+        conn.commit()
+        low += BATCH
+    cur.close()
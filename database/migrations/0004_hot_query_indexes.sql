@@ -0,0 +1,11 @@
+-- migrate: online
+-- Indexes behind the hot queries (checked by `flask db-explain-check`):
+-- dashboard/stats date ranges, customer stats, invoice items, lookup by
+-- name prefix and barcode, customer search by phone.
+
+ALTER TABLE bills ADD INDEX idx_bills_created_at (created_at);
+ALTER TABLE bills ADD INDEX idx_bills_customer (customer_id, created_at);
+ALTER TABLE bill_items ADD INDEX idx_bill_items_bill (bill_id);
+ALTER TABLE products ADD INDEX idx_products_name (name);
+ALTER TABLE products ADD INDEX idx_products_barcode (barcode);
+ALTER TABLE customers ADD INDEX idx_customers_phone (phone);
@@ -0,0 +1,14 @@
+-- Dedupe table for retried bill submissions (idempotency.py)
+-- Keys are scoped to the store and user that sent them (user 0: not logged in)
+
+CREATE TABLE idempotency_keys (
+    store_id INT NOT NULL,
+    user_id INT NOT NULL,
+    idem_key VARCHAR(64) NOT NULL,
+    endpoint VARCHAR(50) NOT NULL,
+    bill_id INT NULL,
+    response TEXT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (store_id, user_id, idem_key),
+    INDEX idx_idempotency_created (created_at)
+);
@@ -0,0 +1,22 @@
+-- migrate: online
+-- Product change feed for till-side catalog copies (catalog.py).
+-- Existing products start at change_version 0 and arrive with a client's
+-- first (full) sync.
+
+ALTER TABLE products ADD COLUMN change_version BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE products ADD INDEX idx_products_change_version (change_version);
+
+CREATE TABLE catalog_version (
+    id TINYINT PRIMARY KEY,
+    version BIGINT NOT NULL,
+    purged_before BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO catalog_version (id, version, purged_before) VALUES (1, 0, 0);
+
+CREATE TABLE product_tombstones (
+    product_id INT PRIMARY KEY,
+    change_version BIGINT NOT NULL,
+    deleted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_tombstones_version (change_version),
+    INDEX idx_tombstones_deleted (deleted_at)
+);
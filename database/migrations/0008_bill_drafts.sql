@@ -0,0 +1,34 @@
+-- Autosaved bills in progress (drafts.py). A draft has one row per product
+-- and becomes a real bill only when it is finalized.
+
+CREATE TABLE bill_drafts (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    store_id INT NOT NULL DEFAULT 1,
+    user_id INT NULL,
+    customer_id INT NULL,
+    payment_method VARCHAR(50),
+    discount_type VARCHAR(50),
+    discount_value DECIMAL(10,2),
+    discount_amount DECIMAL(10,2),
+    gst_type VARCHAR(50),
+    cgst_amount DECIMAL(10,2),
+    sgst_amount DECIMAL(10,2),
+    igst_amount DECIMAL(10,2),
+    total_amount DECIMAL(10,2),
+    final_amount DECIMAL(10,2),
+    revision INT NOT NULL DEFAULT 0,
+    bill_id INT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_drafts_updated (updated_at)
+);
+
+CREATE TABLE bill_draft_items (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    draft_id INT NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL,
+    unit_price DECIMAL(10,2) NOT NULL,
+    UNIQUE KEY uq_draft_product (draft_id, product_id),
+    FOREIGN KEY (draft_id) REFERENCES bill_drafts(id) ON DELETE CASCADE
+);
@@ -0,0 +1,6 @@
+-- migrate: online
+-- Fields the GSTR-1 return needs (gstr1.py): the customer's GSTIN makes a
+-- bill B2B and gives its place of supply; HSN codes group the item summary.
+
+ALTER TABLE customers ADD COLUMN gstin VARCHAR(15) NULL;
+ALTER TABLE products ADD COLUMN hsn_code VARCHAR(8) NULL;
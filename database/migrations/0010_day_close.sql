@@ -0,0 +1,24 @@
+-- migrate: online
+-- End-of-day close (zreport.py). Bills now record the signed-in user, which
+-- is the till in the Z-report. The column goes on the archive too, so the
+-- SELECT * copy in partitions.archive_fiscal_year still lines up.
+
+ALTER TABLE bills ADD COLUMN user_id INT NULL;
+ALTER TABLE bills_archive ADD COLUMN user_id INT NULL;
+
+-- One frozen row per store and business day: the Z-report as JSON, the
+-- headline figures as columns, and the PDF rendered at close
+CREATE TABLE day_close (
+    store_id INT NOT NULL,
+    business_date DATE NOT NULL,
+    closed_at DATETIME NOT NULL,
+    closed_by INT NULL,
+    bill_count INT NOT NULL DEFAULT 0,
+    net_sales DECIMAL(14,2) NOT NULL DEFAULT 0,
+    tax_total DECIMAL(14,2) NOT NULL DEFAULT 0,
+    cash_expected DECIMAL(14,2) NOT NULL DEFAULT 0,
+    cash_counted DECIMAL(14,2) NULL,
+    report JSON NOT NULL,
+    pdf LONGBLOB NULL,
+    PRIMARY KEY (store_id, business_date)
+);
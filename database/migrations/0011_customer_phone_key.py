@@ -0,0 +1,32 @@
+"""Key customers by normalised phone number, unique per store (customers.py).
+
+Adds the column, keys existing phones in id ranges, merges customers that
+already share a number (their bills move to the oldest), then adds the
+unique index quick-add relies on. Every step can run again after an
+interruption: the ALTERs are skipped once applied, and keying and merging
+only touch what is left. Tills still on the old code may add a duplicate
+while the index builds; then the merge runs again.
+"""
+import MySQLdb
+
+import customers
+import migrations
+
+
+ATTEMPTS = 3
+
+
+def upgrade(conn):
+    cur = conn.cursor()
+    migrations.execute_ddl(cur, "ALTER TABLE customers ADD COLUMN phone_key VARCHAR(10) NULL, "
+                                "ALGORITHM=INPLACE, LOCK=NONE")
+    for attempt in range(ATTEMPTS):
+        customers.merge_duplicates(conn)
+        try:
+            migrations.execute_ddl(cur, "ALTER TABLE customers ADD UNIQUE INDEX uq_customers_phone_key "
+                                        "(store_id, phone_key), ALGORITHM=INPLACE, LOCK=NONE")
+            break
+        except MySQLdb.IntegrityError:
+            if attempt == ATTEMPTS - 1:
+                raise
+    cur.close()
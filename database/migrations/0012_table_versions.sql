@@ -0,0 +1,9 @@
+-- Change counters for tables served with ETags (versions.py). products
+-- already have catalog_version; customer writers bump the 'customers' row
+-- in the same transaction as the change.
+
+CREATE TABLE table_versions (
+    name VARCHAR(32) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+INSERT INTO table_versions (name, version) VALUES ('customers', 0);
@@ -0,0 +1,7 @@
+-- Identity of a store's catalog history (catalog.py). Tills keep their
+-- local copy only while the epoch matches; a database rebuilt from scratch
+-- gets a new one. Give it a new epoch by hand after restoring a backup:
+--   UPDATE catalog_version SET epoch = REPLACE(UUID(), '-', '') WHERE id = 1;
+
+ALTER TABLE catalog_version ADD COLUMN epoch CHAR(32) NOT NULL DEFAULT '';
+UPDATE catalog_version SET epoch = REPLACE(UUID(), '-', '') WHERE id = 1 AND epoch = '';
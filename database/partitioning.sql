@@ -0,0 +1,22 @@
+-- Prepare bills / bill_items for monthly RANGE partitioning on created_at.
+-- Apply all migrations first (flask --app app db-upgrade); bill_items.created_at
+-- comes from migrations 0002/0003.
+-- MySQL requires the partition column in every unique key and does not allow
+-- foreign keys on partitioned tables, so the FKs are dropped and the primary
+-- keys widened. Then run:  flask --app app partition-bills
+--
+-- FK names below are the MySQL defaults; check SHOW CREATE TABLE first.
+
+ALTER TABLE bill_items
+    DROP FOREIGN KEY bill_items_ibfk_1,
+    DROP FOREIGN KEY bill_items_ibfk_2;
+ALTER TABLE bills DROP FOREIGN KEY bills_ibfk_1;
+
+ALTER TABLE bills
+    MODIFY created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, created_at);
+
+ALTER TABLE bill_items
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, created_at);
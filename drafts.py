@@ -0,0 +1,230 @@
+"""Autosaved bills in progress.
+
+A draft has a stable id for as long as the cashier is building the bill.
+The till sends only what changed since its last save: header fields
+(customer, discount, totals) and line operations
+
+    {"op": "add" | "update", "product_id": 7, "qty": 3, "price": 45.0}
+    {"op": "remove", "product_id": 7}
+
+Quantities are absolute, not deltas, so replaying a save is harmless. Each
+save carries the revision it was based on; a save based on an old revision
+is refused with the current draft, and the till diffs against that instead.
+
+`finalize` turns the draft into a bill in one transaction and `purge` drops
+drafts nobody has touched for a while.
+"""
+
+
+# Payload key -> bill_drafts column (same names the bill endpoints use)
+HEADER_FIELDS = {
+    "customer_id": "customer_id",
+    "payment_method": "payment_method",
+    "discount_type": "discount_type",
+    "discount_value": "discount_value",
+    "discount_amount": "discount_amount",
+    "gst_type": "gst_type",
+    "cgst": "cgst_amount",
+    "sgst": "sgst_amount",
+    "igst": "igst_amount",
+    "subtotal": "total_amount",
+    "final_total": "final_amount",
+}
+MONEY_FIELDS = {"discount_value", "discount_amount", "cgst", "sgst", "igst", "subtotal", "final_total"}
+DRAFT_COLUMNS = "id, revision, bill_id, " + ", ".join(HEADER_FIELDS.values())
+
+
+class Conflict(Exception):
+    """The save was based on an older revision; `draft` is the current one."""
+
+    def __init__(self, draft):
+        super().__init__("Draft has changed since revision was read")
+        self.draft = draft
+
+
+class Finalized(Exception):
+    """The draft has already become bill `bill_id`."""
+
+    def __init__(self, bill_id):
+        super().__init__(f"Draft is already bill {bill_id}")
+        self.bill_id = bill_id
+
+
+def _header(data):
+    values = {}
+    for key, column in HEADER_FIELDS.items():
+        if key in data:
+            value = data[key]
+            values[column] = None if value == "" else value
+    return values
+
+
+def _operations(ops):
+    """Validate line operations into (upserts, removed product ids), last op per product wins."""
+    lines = {}
+    for op in ops or []:
+        try:
+            kind = op["op"]
+            product_id = int(op["product_id"])
+            if kind == "remove":
+                lines[product_id] = None
+                continue
+            if kind not in ("add", "update"):
+                raise ValueError(f"Unknown line operation {kind!r}")
+            qty, price = int(op["qty"]), float(op["price"])
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"Bad line operation: {op!r}") from e
+        if qty <= 0:
+            lines[product_id] = None
+        elif price < 0:
+            raise ValueError(f"Negative price for product {product_id}")
+        else:
+            lines[product_id] = (qty, price)
+    upserts = [(pid,) + line for pid, line in lines.items() if line is not None]
+    removed = [pid for pid, line in lines.items() if line is None]
+    return upserts, removed
+
+
+def _draft(row, items):
+    draft = {"draft_id": int(row[0]), "revision": int(row[1]), "bill_id": row[2]}
+    for key, value in zip(HEADER_FIELDS, row[3:]):
+        draft[key] = float(value) if key in MONEY_FIELDS and value is not None else value
+    draft["items"] = [
+        {"product_id": int(pid), "qty": int(qty), "price": float(price)}
+        for pid, qty, price in items
+    ]
+    return draft
+
+
+def get(conn, draft_id, store_id, for_update=False):
+    """The draft with its lines, or None."""
+    cur = conn.cursor()
+    cur.execute(f"SELECT {DRAFT_COLUMNS} FROM bill_drafts WHERE id = %s AND store_id = %s"
+                + (" FOR UPDATE" if for_update else ""), (draft_id, store_id))
+    row = cur.fetchone()
+    if row is None:
+        cur.close()
+        return None
+    cur.execute("SELECT product_id, quantity, unit_price FROM bill_draft_items WHERE draft_id = %s ORDER BY id",
+                (draft_id,))
+    draft = _draft(row, cur.fetchall())
+    cur.close()
+    return draft
+
+
+def _write_lines(cur, draft_id, upserts, removed):
+    # One multi-row statement each, however many lines changed
+    if upserts:
+        cur.executemany("""
+            INSERT INTO bill_draft_items (draft_id, product_id, quantity, unit_price)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE quantity = VALUES(quantity), unit_price = VALUES(unit_price)
+        """, [(draft_id, pid, qty, price) for pid, qty, price in upserts])
+    if removed:
+        placeholders = ", ".join(["%s"] * len(removed))
+        cur.execute(f"DELETE FROM bill_draft_items WHERE draft_id = %s AND product_id IN ({placeholders})",
+                    [draft_id] + removed)
+
+
+def create(conn, store_id, user_id, data):
+    """Start a draft from a header and optional initial ops. Returns {"draft_id", "revision"}."""
+    upserts, removed = _operations(data.get("ops"))
+    header = _header(data)
+    columns = ["store_id", "user_id"] + list(header)
+    cur = conn.cursor()
+    cur.execute(f"INSERT INTO bill_drafts ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+                [store_id, user_id] + list(header.values()))
+    draft_id = cur.lastrowid
+    _write_lines(cur, draft_id, upserts, [])
+    conn.commit()
+    cur.close()
+    return {"draft_id": draft_id, "revision": 0}
+
+
+def save(conn, draft_id, store_id, data):
+    """Apply one autosave: header fields and line ops, based on data["revision"].
+
+    Returns {"draft_id", "revision"}, or None if there is no such draft.
+    Raises Conflict, Finalized or ValueError.
+    """
+    upserts, removed = _operations(data.get("ops"))
+    header = _header(data)
+    try:
+        revision = int(data.get("revision"))
+    except (TypeError, ValueError) as e:
+        raise ValueError("revision is required") from e
+    assignments = "".join(f", {column} = %s" for column in header)
+    cur = conn.cursor()
+    # The revision check and bump is the only read-modify-write; the lines
+    # are written under that row lock, in the same short transaction
+    changed = cur.execute(f"""
+        UPDATE bill_drafts SET revision = revision + 1{assignments}
+        WHERE id = %s AND store_id = %s AND revision = %s AND bill_id IS NULL
+    """, list(header.values()) + [draft_id, store_id, revision])
+    if not changed:
+        conn.rollback()
+        cur.close()
+        current = get(conn, draft_id, store_id)
+        if current is None:
+            return None
+        if current["bill_id"] is not None:
+            raise Finalized(current["bill_id"])
+        raise Conflict(current)
+    _write_lines(cur, draft_id, upserts, removed)
+    conn.commit()
+    cur.close()
+    return {"draft_id": draft_id, "revision": revision + 1}
+
+
+def finalize(conn, draft_id, store_id, bill_number, user_id=None):
+    """Turn the draft into a bill. Returns (bill_id, draft), leaving the commit to the caller.
+
+    Finalizing twice returns the same bill; returns (None, None) if there is
+    no such draft. Raises ValueError if the draft has no lines. The bill is
+    rung up on `user_id`'s till.
+    """
+    draft = get(conn, draft_id, store_id, for_update=True)
+    if draft is None:
+        return None, None
+    if draft["bill_id"] is not None:
+        return draft["bill_id"], draft
+    if not draft["items"]:
+        raise ValueError("Draft has no items")
+
+    cgst, sgst, igst = (float(draft[k] or 0) for k in ("cgst", "sgst", "igst"))
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO bills (store_id, customer_id, bill_number, total_amount, discount_type,
+                           discount_value, discount_amount, gst_type, cgst_amount,
+                           sgst_amount, igst_amount, gst_amount, final_amount, payment_method, user_id)
+        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+    """, (store_id, draft["customer_id"], bill_number, draft["subtotal"], draft["discount_type"],
+          draft["discount_value"], draft["discount_amount"], draft["gst_type"], cgst, sgst, igst,
+          cgst + sgst + igst, draft["final_total"], draft["payment_method"], user_id))
+    bill_id = cur.lastrowid
+    cur.execute("""
+        INSERT INTO bill_items (bill_id, product_id, quantity, unit_price, total_price)
+        SELECT %s, product_id, quantity, unit_price, quantity * unit_price
+        FROM bill_draft_items WHERE draft_id = %s ORDER BY id
+    """, (bill_id, draft_id))
+    # Keep the draft row (now pointing at its bill) so a retried finalize
+    # finds the same bill; purge removes it later
+    cur.execute("DELETE FROM bill_draft_items WHERE draft_id = %s", (draft_id,))
+    cur.execute("UPDATE bill_drafts SET bill_id = %s WHERE id = %s", (bill_id, draft_id))
+    cur.close()
+    return bill_id, draft
+
+
+def purge(conn, abandoned_hours=24, batch=500):
+    """Delete drafts (finalized or not) untouched for `abandoned_hours`, in small batches."""
+    cur = conn.cursor()
+    total = 0
+    while True:
+        deleted = cur.execute("DELETE FROM bill_drafts WHERE updated_at < NOW() - INTERVAL %s HOUR LIMIT %s",
+                              (abandoned_hours, batch))
+        conn.commit()
+        total += deleted
+        if deleted < batch:
+            break
+    cur.close()
+    return total
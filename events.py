@@ -0,0 +1,215 @@
+"""Event broadcaster for server-sent events, shared by the workers on a host.
+
+Producers call `publish(channel, data)`; every connected client subscribed to
+that channel gets the event from its own bounded queue. A slow client that
+falls behind loses its oldest events rather than holding memory.
+
+Clients are spread over several gunicorn workers, and inventory alerts are
+published by whichever worker holds the job lock, so events cross process
+boundaries. With EVENTS_SOCKET_DIR set (the default), a worker that has
+stream clients binds a Unix datagram socket `<pid>.sock` in that directory,
+and `publish` sends each event to every socket there, its own included. A
+receiving thread hands events to the local queues. Sockets of workers that
+died are removed by the next publish that finds them refusing. The latest
+event per channel is also written to `<channel>.last`, so a worker whose
+first client arrives later can still replay it.
+
+Without the directory, or without Unix sockets (Windows), events stay in
+the publishing process.
+"""
+import atexit
+import json
+import os
+import queue
+import socket
+import threading
+
+
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 100
+# Largest event a datagram carries; a bill event is a few hundred bytes
+MAX_EVENT_BYTES = 64 * 1024
+
+
+class Broadcaster:
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._last = {}
+        self._dir = None
+        # pid -> (receiving socket, sending socket), opened after fork on first use
+        self._sockets = {}
+
+    def configure(self, socket_dir):
+        if socket_dir and hasattr(socket, 'AF_UNIX'):
+            os.makedirs(socket_dir, exist_ok=True)
+            self._dir = socket_dir
+
+    def subscribe(self, channel):
+        q = queue.Queue(maxsize=QUEUE_SIZE)
+        if self._dir:
+            self._receiving()
+        with self._lock:
+            self._subscribers.setdefault(channel, set()).add(q)
+        return q
+
+    def unsubscribe(self, channel, q):
+        with self._lock:
+            self._subscribers.get(channel, set()).discard(q)
+
+    def publish(self, channel, data, event=None):
+        if not self._dir:
+            self._deliver(channel, (event, data))
+            return
+        payload = json.dumps([channel, event, data], default=str).encode()
+        if len(payload) > MAX_EVENT_BYTES:
+            return
+        self._retain(channel, payload)
+        self._send(payload)
+
+    def _deliver(self, channel, message):
+        with self._lock:
+            self._last[channel] = message
+            subscribers = list(self._subscribers.get(channel, ()))
+        for q in subscribers:
+            _offer(q, message)
+
+    def last(self, channel):
+        message = self._last.get(channel)
+        if message is None and self._dir:
+            try:
+                with open(self._retained_path(channel), 'rb') as f:
+                    _, event, data = json.loads(f.read())
+                message = (event, data)
+            except (OSError, ValueError):
+                pass
+        return message
+
+    def client_count(self, channel=None):
+        with self._lock:
+            if channel is not None:
+                return len(self._subscribers.get(channel, ()))
+            return sum(len(s) for s in self._subscribers.values())
+
+    def stream(self, channel, replay_last=True):
+        """Generator of SSE-formatted strings for one client."""
+        q = self.subscribe(channel)
+        try:
+            last = self.last(channel) if replay_last else None
+            if last is not None:
+                event, data = last
+                yield format_sse(data, event)
+            while True:
+                try:
+                    event, data = q.get(timeout=HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(data, event)
+        finally:
+            self.unsubscribe(channel, q)
+
+    def _retained_path(self, channel):
+        return os.path.join(self._dir, f"{channel.replace(os.sep, '_')}.last")
+
+    def _retain(self, channel, payload):
+        path = self._retained_path(channel)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def _process_sockets(self):
+        pid = os.getpid()
+        sockets = self._sockets.get(pid)
+        if sockets is None:
+            with self._lock:
+                sockets = self._sockets.get(pid)
+                if sockets is None:
+                    sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                    sender.setblocking(False)
+                    sockets = self._sockets[pid] = [None, sender]
+        return sockets
+
+    def _receiving(self):
+        """Bind this process's socket and start its receiving thread, once."""
+        sockets = self._process_sockets()
+        if sockets[0] is not None:
+            return
+        with self._lock:
+            if sockets[0] is not None:
+                return
+            path = os.path.join(self._dir, f"{os.getpid()}.sock")
+            if os.path.exists(path):
+                os.unlink(path)
+            receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            receiver.bind(path)
+            sockets[0] = receiver
+        atexit.register(_unlink, path)
+        threading.Thread(target=self._receive, args=(receiver,), name='events-receiver', daemon=True).start()
+
+    def _receive(self, receiver):
+        while True:
+            try:
+                channel, event, data = json.loads(receiver.recv(MAX_EVENT_BYTES))
+            except (OSError, ValueError):
+                continue
+            self._deliver(channel, (event, data))
+
+    def _send(self, payload):
+        sender = self._process_sockets()[1]
+        try:
+            names = os.listdir(self._dir)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith('.sock'):
+                continue
+            path = os.path.join(self._dir, name)
+            try:
+                sender.sendto(payload, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Its worker is gone
+                _unlink(path)
+            except OSError:
+                # Receiver's buffer is full: like a full client queue, it loses this event
+                pass
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _offer(q, message, attempts=3):
+    """Queue `message`, dropping the oldest to make room. Never raises: publishers
+    run after their write has committed, and a full queue is the client's problem."""
+    for _ in range(attempts):
+        try:
+            q.put_nowait(message)
+            return True
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+    return False
+
+
+def format_sse(data, event=None):
+    payload = json.dumps(data, default=str)
+    if event:
+        return f"event: {event}\ndata: {payload}\n\n"
+    return f"data: {payload}\n\n"
+
+
+def init_app(app):
+    broadcaster.configure(app.config.get('EVENTS_SOCKET_DIR'))
+
+
+broadcaster = Broadcaster()
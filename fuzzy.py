@@ -0,0 +1,340 @@
+"""Typo- and transliteration-tolerant product lookup.
+
+Each process keeps an in-memory index of product names per store, kept
+current from the catalog change feed (catalog.changes), so it is rebuilt
+only for products that changed. Names are split into words; the index maps
+words to products, and the vocabulary of distinct words is indexed by
+trigram, by prefix and by a phonetic key.
+
+A query word matches vocabulary words that are equal, start with it, sound
+the same (Tamil script is transliterated first, and common Latin spelling
+variants such as th/t, aa/a, zh/l are folded) or are within a small edit
+distance ("keybord" -> "keyboard"). Products are ranked by how well all
+query words match, then by popularity as of their last catalog change.
+
+Work per query depends on the vocabulary and the matched words' postings,
+not on the catalog size; see benchmarks/bench_fuzzy.py.
+"""
+import bisect
+import heapq
+import string
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+from itertools import chain
+
+import catalog
+
+
+# Tamil script -> Latin, enough to compare with how cashiers type names
+TAMIL_VOWELS = {
+    'அ': 'a', 'ஆ': 'aa', 'இ': 'i', 'ஈ': 'ii', 'உ': 'u', 'ஊ': 'uu', 'எ': 'e',
+    'ஏ': 'ee', 'ஐ': 'ai', 'ஒ': 'o', 'ஓ': 'oo', 'ஔ': 'au',
+}
+TAMIL_CONSONANTS = {
+    'க': 'k', 'ங': 'ng', 'ச': 's', 'ஞ': 'ny', 'ட': 't', 'ண': 'n', 'த': 'th',
+    'ந': 'n', 'ப': 'p', 'ம': 'm', 'ய': 'y', 'ர': 'r', 'ல': 'l', 'வ': 'v',
+    'ழ': 'zh', 'ள': 'l', 'ற': 'r', 'ன': 'n', 'ஜ': 'j', 'ஷ': 'sh', 'ஸ': 's',
+    'ஹ': 'h',
+}
+TAMIL_SIGNS = {
+    'ா': 'aa', 'ி': 'i', 'ீ': 'ii', 'ு': 'u', 'ூ': 'uu', 'ெ': 'e', 'ே': 'ee',
+    'ை': 'ai', 'ொ': 'o', 'ோ': 'oo', 'ௌ': 'au',
+}
+TAMIL_VIRAMA = '்'
+
+# Spelling variants folded by the phonetic key, longest first
+PHONETIC_FOLDS = (
+    ('zh', 'l'), ('th', 't'), ('dh', 'd'), ('bh', 'b'), ('kh', 'k'), ('gh', 'g'),
+    ('ph', 'f'), ('sh', 's'), ('ch', 's'), ('ck', 'k'), ('ng', 'n'), ('ny', 'n'),
+    ('q', 'k'), ('c', 'k'), ('x', 'ks'), ('z', 's'), ('w', 'v'),
+    # Tamil script does not tell these apart (த is "t" or "d", ச "s" or "j")
+    ('d', 't'), ('g', 'k'), ('b', 'p'), ('j', 's'),
+)
+VOWELS = set('aeiouy')
+LETTERS = string.ascii_lowercase + string.digits
+
+MAX_PREFIX_MATCHES = 50
+MAX_EDIT_CANDIDATES = 40
+MIN_SCORE = 0.5
+
+
+def transliterate(text):
+    """Tamil script to Latin letters; other characters pass through."""
+    out = []
+    for ch in text:
+        if ch in TAMIL_CONSONANTS:
+            out.append(TAMIL_CONSONANTS[ch] + 'a')
+        elif ch in TAMIL_SIGNS and out:
+            out[-1] = out[-1][:-1] + TAMIL_SIGNS[ch]
+        elif ch == TAMIL_VIRAMA and out:
+            out[-1] = out[-1][:-1]
+        else:
+            out.append(TAMIL_VOWELS.get(ch, ch))
+    return ''.join(out)
+
+
+def words(text):
+    """Lowercase ASCII words of a name or query."""
+    text = unicodedata.normalize('NFKD', transliterate(text or '')).lower()
+    text = ''.join(ch if ch.isalnum() and ch.isascii() else ' ' for ch in text
+                   if not unicodedata.combining(ch))
+    return text.split()
+
+
+def phonetic(word):
+    """Consonant skeleton: folds spelling variants, vowel length and doubled letters."""
+    if word.isdigit():
+        return word
+    for src, dst in PHONETIC_FOLDS:
+        word = word.replace(src, dst)
+    key = word[0]
+    for ch in word[1:]:
+        if ch not in VOWELS and ch != key[-1]:
+            key += ch
+    return key
+
+
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edits1(word):
+    """Every string one deletion, transposition, substitution or insertion away."""
+    splits = [(word[:i], word[i:]) for i in range(len(word) + 1)]
+    return set(
+        [a + b[1:] for a, b in splits if b]
+        + [a + b[1] + b[0] + b[2:] for a, b in splits if len(b) > 1]
+        + [a + c + b[1:] for a, b in splits if b for c in LETTERS]
+        + [a + c + b for a, b in splits for c in LETTERS])
+
+
+def max_edits(word):
+    return 1 if len(word) <= 4 else 2 if len(word) <= 8 else 3
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance with adjacent transpositions, or limit + 1 once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2, prev = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        row = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            row[j] = min(prev[j] + 1, row[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                row[j] = min(row[j], prev2[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+        prev2, prev = prev, row
+    return prev[-1]
+
+
+class ProductIndex:
+    """Word and vocabulary indexes over one store's product names."""
+
+    STATE_FIELDS = ("product_words", "popularity", "postings", "vocabulary", "by_trigram", "by_phonetic")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._clear()
+
+    def _clear(self):
+        self.version = 0
+        self.checked = None
+        self.product_words = {}
+        self.popularity = {}
+        self.postings = defaultdict(set)
+        self.vocabulary = []
+        self.by_trigram = defaultdict(set)
+        self.by_phonetic = defaultdict(set)
+
+    def __len__(self):
+        return len(self.product_words)
+
+    def state(self):
+        """The index as plain dicts, lists and sets (marshal-able), for snapshots.py."""
+        return {name: dict(value) if isinstance(value, defaultdict) else value
+                for name, value in ((name, getattr(self, name)) for name in self.STATE_FIELDS)}
+
+    @classmethod
+    def from_state(cls, version, state):
+        index = cls()
+        for name in cls.STATE_FIELDS:
+            value = state[name]
+            setattr(index, name, defaultdict(set, value) if isinstance(getattr(index, name), defaultdict) else value)
+        index.version = version
+        return index
+
+    def _add_word(self, word):
+        bisect.insort(self.vocabulary, word)
+        for gram in trigrams(word):
+            self.by_trigram[gram].add(word)
+        self.by_phonetic[phonetic(word)].add(word)
+
+    def _drop_word(self, word):
+        del self.postings[word]
+        del self.vocabulary[bisect.bisect_left(self.vocabulary, word)]
+        for gram in trigrams(word):
+            self.by_trigram[gram].discard(word)
+        self.by_phonetic[phonetic(word)].discard(word)
+
+    def remove(self, product_id):
+        for word in self.product_words.pop(product_id, ()):
+            self.postings[word].discard(product_id)
+            if not self.postings[word]:
+                self._drop_word(word)
+        self.popularity.pop(product_id, None)
+
+    def add(self, product_id, name, score=0.0):
+        self.remove(product_id)
+        product_words = tuple(dict.fromkeys(words(name)))
+        self.product_words[product_id] = product_words
+        self.popularity[product_id] = score
+        for word in product_words:
+            if word not in self.postings:
+                self._add_word(word)
+            self.postings[word].add(product_id)
+
+    def apply(self, changes):
+        """Apply one page of catalog.changes()."""
+        if changes["reset"]:
+            self._clear()
+        for product in changes["upserts"]:
+            self.add(product["id"], product["name"], product["score"])
+        for product_id in changes["deletes"]:
+            self.remove(product_id)
+        self.version = changes["version"]
+
+    def refresh(self, conn, every_seconds=2):
+        """Pull catalog changes, at most once per `every_seconds`."""
+        now = time.monotonic()
+        if self.checked is not None and now - self.checked < every_seconds:
+            return
+        resume = None
+        while True:
+            changes = catalog.changes(conn, self.version, limit=5000, resume=resume)
+            self.apply(changes)
+            if not changes["more"]:
+                break
+            resume = changes["resume"]
+        self.checked = now
+
+    def expand(self, word):
+        """Vocabulary words matching one query word: {word: score}."""
+        matches = {}
+        if word in self.postings:
+            matches[word] = 1.0
+
+        start = bisect.bisect_left(self.vocabulary, word)
+        for candidate in self.vocabulary[start:start + MAX_PREFIX_MATCHES]:
+            if not candidate.startswith(word):
+                break
+            matches.setdefault(candidate, 0.9)
+
+        # Spelled right, or still being typed: no need to look for typos
+        if not matches:
+            # Every word one edit away; failing that, for longer words that may
+            # hold two or three typos, the words sharing the most trigrams
+            for candidate in edits1(word) & self.postings.keys():
+                matches[candidate] = 0.8
+            limit = max_edits(word)
+            if not matches and limit > 1:
+                shared = Counter(chain.from_iterable(self.by_trigram.get(gram, ()) for gram in trigrams(word)))
+                for candidate, _ in shared.most_common(MAX_EDIT_CANDIDATES):
+                    if candidate not in matches:
+                        distance = edit_distance(word, candidate, limit)
+                        if distance <= limit:
+                            matches[candidate] = 0.8 - 0.1 * (distance - 1)
+
+        # Other spellings of the same sound, if not too different on paper
+        if len(word) >= 3:
+            limit = max(2, len(word) // 2)
+            for candidate in self.by_phonetic.get(phonetic(word), ()):
+                if candidate not in matches and edit_distance(word, candidate, limit) <= limit:
+                    matches[candidate] = 0.75
+        return matches
+
+    def search(self, query, limit=10):
+        """Best matching product ids for `query`, best first."""
+        query_words = list(dict.fromkeys(words(query)))
+        if not query_words:
+            return []
+        # Per query word: its matching products grouped by match score, best first
+        tiers = []
+        for word in query_words:
+            by_score = defaultdict(list)
+            for candidate, score in self.expand(word).items():
+                by_score[score].append(self.postings[candidate])
+            tiers.append([(score, set().union(*ids)) for score, ids in sorted(by_score.items(), reverse=True)])
+
+        matched = [set().union(*(ids for _, ids in word_tiers)) for word_tiers in tiers if word_tiers]
+        if not matched:
+            return []
+        # Only products matching every word, if there are any (set operations
+        # keep this cheap when each word alone matches thousands)
+        candidates = set.intersection(*matched) or set().union(*matched)
+        totals = dict.fromkeys(candidates, 0.0)
+        for word_tiers in tiers:
+            left = candidates
+            for score, ids in word_tiers:
+                hits = left & ids
+                for product_id in hits:
+                    totals[product_id] += score
+                left = left - hits
+                if not left:
+                    break
+
+        threshold = MIN_SCORE * len(query_words)
+        ranked = heapq.nlargest(
+            limit, (item for item in totals.items() if item[1] >= threshold),
+            key=lambda item: (item[1], self.popularity.get(item[0], 0)))
+        return [product_id for product_id, _ in ranked]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def index_for(conn, store_id, refresh_seconds=2):
+    """This process's index for the store, brought up to date from the change feed."""
+    with _indexes_lock:
+        index = _indexes.setdefault(store_id, ProductIndex())
+    with index.lock:
+        index.refresh(conn, refresh_seconds)
+    return index
+
+
+def versions():
+    """{store_id: catalog version} of the indexes in this process."""
+    with _indexes_lock:
+        return {store_id: index.version for store_id, index in _indexes.items()}
+
+
+def dump(store_id, encode):
+    """(version, encode(state)) of the store's index, encoded while no search can change it."""
+    index = _indexes[store_id]
+    with index.lock:
+        return index.version, encode(index.state())
+
+
+def restore(store_id, version, state):
+    """Install a snapshot's index for the store unless this process has a newer one.
+
+    The next refresh pulls only the catalog changes made after `version`.
+    """
+    index = ProductIndex.from_state(version, state)
+    with _indexes_lock:
+        current = _indexes.get(store_id)
+        if current is not None and current.version >= version:
+            return False
+        _indexes[store_id] = index
+    return True
+
+
+def search(conn, store_id, query, limit=10, refresh_seconds=2):
+    index = index_for(conn, store_id, refresh_seconds)
+    with index.lock:
+        return index.search(query, limit)
@@ -0,0 +1,378 @@
+"""GSTR-1 return data for a tax period, in one streaming pass over the bills.
+
+`generate` reads every bill and item of the period through a server-side
+cursor (rows arrive as MySQL sends them; nothing is buffered client-side)
+and sorts each bill into the return's tables:
+
+  b2b    invoices to customers with a GSTIN
+  b2cl   inter-state invoices to unregistered customers above `b2cl_limit`
+  b2cs   all other sales, summed by supply type, place of supply and rate
+  hsn    quantities and tax by HSN code and rate, from the items
+
+b2cs and hsn are running totals. b2b and b2cl list every invoice, so those
+are spilled to a temporary SQLite file and read back grouped, which keeps
+memory flat however many bills the period has. The output directory gets
+the offline tool's JSON (gstr1.json) and CSV layouts (b2b.csv, b2cl.csv,
+b2cs.csv, hsn.csv) plus summary.json.
+
+Bills carry one GST rate for the whole bill, so each invoice has a single
+rate line; items share the bill's taxable value and tax pro rata.
+"""
+import csv
+import datetime
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+import MySQLdb.cursors
+
+import partitions
+
+
+RATES = (Decimal('0'), Decimal('0.1'), Decimal('0.25'), Decimal('1.5'), Decimal('3'), Decimal('5'),
+         Decimal('12'), Decimal('18'), Decimal('28'))
+GSTIN_RE = re.compile(r'^[0-9]{2}[0-9A-Z]{10}[0-9A-Z]Z[0-9A-Z]$')
+FETCH_ROWS = 2000
+
+STATES = {
+    '01': 'Jammu and Kashmir', '02': 'Himachal Pradesh', '03': 'Punjab', '04': 'Chandigarh',
+    '05': 'Uttarakhand', '06': 'Haryana', '07': 'Delhi', '08': 'Rajasthan', '09': 'Uttar Pradesh',
+    '10': 'Bihar', '11': 'Sikkim', '12': 'Arunachal Pradesh', '13': 'Nagaland', '14': 'Manipur',
+    '15': 'Mizoram', '16': 'Tripura', '17': 'Meghalaya', '18': 'Assam', '19': 'West Bengal',
+    '20': 'Jharkhand', '21': 'Odisha', '22': 'Chhattisgarh', '23': 'Madhya Pradesh', '24': 'Gujarat',
+    '26': 'Dadra and Nagar Haveli and Daman and Diu', '27': 'Maharashtra', '29': 'Karnataka', '30': 'Goa',
+    '31': 'Lakshadweep', '32': 'Kerala', '33': 'Tamil Nadu', '34': 'Puducherry',
+    '35': 'Andaman and Nicobar Islands', '36': 'Telangana', '37': 'Andhra Pradesh', '38': 'Ladakh',
+    '97': 'Other Territory',
+}
+
+# Offline tool CSV headers
+B2B_HEADER = ["GSTIN/UIN of Recipient", "Receiver Name", "Invoice Number", "Invoice date", "Invoice Value",
+              "Place Of Supply", "Reverse Charge", "Applicable % of Tax Rate", "Invoice Type",
+              "E-Commerce GSTIN", "Rate", "Taxable Value", "Cess Amount"]
+B2CL_HEADER = ["Invoice Number", "Invoice date", "Invoice Value", "Place Of Supply", "Applicable % of Tax Rate",
+               "Rate", "Taxable Value", "Cess Amount", "E-Commerce GSTIN"]
+B2CS_HEADER = ["Type", "Place Of Supply", "Applicable % of Tax Rate", "Rate", "Taxable Value", "Cess Amount",
+               "E-Commerce GSTIN"]
+HSN_HEADER = ["HSN", "Description", "UQC", "Total Quantity", "Total Value", "Rate", "Taxable Value",
+              "Integrated Tax Amount", "Central Tax Amount", "State/UT Tax Amount", "Cess Amount"]
+
+LINES_SQL = """
+    SELECT b.id, b.bill_number, b.created_at, b.gst_type, b.total_amount, b.discount_amount,
+           b.cgst_amount, b.sgst_amount, b.igst_amount, b.gst_amount, b.final_amount,
+           c.name, c.gstin, bi.quantity, bi.total_price, p.hsn_code, p.name
+    FROM {bills} b
+    LEFT JOIN customers c ON c.id = b.customer_id
+    LEFT JOIN {items} bi ON bi.bill_id = b.id AND bi.created_at >= %s AND bi.created_at < %s
+    LEFT JOIN products p ON p.id = bi.product_id
+    WHERE b.store_id = %s AND b.created_at >= %s AND b.created_at < %s
+    ORDER BY b.id, bi.id
+"""
+
+
+def parse_period(period):
+    """'2024-06' or '2024-04:2024-06' -> (first day, day after the last, return period 'MMYYYY')."""
+    try:
+        first, _, last = period.partition(':')
+        start = datetime.datetime.strptime(first, '%Y-%m').date()
+        end = datetime.datetime.strptime(last or first, '%Y-%m').date()
+    except ValueError:
+        raise ValueError("Period must be YYYY-MM or YYYY-MM:YYYY-MM") from None
+    if end < start:
+        raise ValueError("Period ends before it starts")
+    fp = end.strftime('%m%Y')
+    end = (end.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return start, end, fp
+
+
+def previous_month(today=None):
+    first = (today or datetime.date.today()).replace(day=1)
+    return (first - datetime.timedelta(days=1)).strftime('%Y-%m')
+
+
+def money(value):
+    return float(Decimal(value).quantize(Decimal('0.01'), ROUND_HALF_UP))
+
+
+def place_name(code):
+    return f"{code}-{STATES[code]}" if code in STATES else code or ''
+
+
+def _rate(tax, taxable):
+    if not taxable:
+        return Decimal('0')
+    exact = tax * 100 / taxable
+    return min(RATES, key=lambda r: abs(r - exact))
+
+
+def _bill(row, state_code):
+    """Tax figures of one bill from its first row."""
+    (_, number, created_at, gst_type, total, discount, cgst, sgst, igst, gst, value,
+     customer, gstin) = row[:13]
+    taxable = (total or 0) - (discount or 0)
+    cgst, sgst, igst = cgst or 0, sgst or 0, igst or 0
+    gstin = (gstin or '').strip().upper()
+    gstin = gstin if GSTIN_RE.match(gstin) else ''
+    if cgst or sgst or igst:
+        inter = igst > 0
+    else:
+        inter = gst_type == 'igst' or bool(gstin and gstin[:2] != state_code)
+    if gst and not (cgst or sgst or igst):
+        # Bills from /billing/create only record the total tax
+        if inter:
+            igst = gst
+        else:
+            cgst = sgst = gst / 2
+    return {
+        "inum": number,
+        "date": created_at.date(),
+        "val": value or 0,
+        "customer": customer,
+        "gstin": gstin,
+        "pos": gstin[:2] if gstin else ('' if inter else state_code),
+        "inter": inter,
+        "rt": _rate(cgst + sgst + igst, taxable),
+        "txval": taxable,
+        "iamt": igst,
+        "camt": cgst,
+        "samt": sgst,
+    }
+
+
+AMOUNTS = ("val", "txval", "iamt", "camt", "samt")
+
+
+def _add(totals, key, bill, share=None, qty=0):
+    """Add a bill (or its `share` of it) to totals[key]: [qty, val, txval, iamt, camt, samt]."""
+    entry = totals.get(key)
+    if entry is None:
+        entry = totals[key] = [0] + [Decimal('0')] * len(AMOUNTS)
+    entry[0] += qty
+    for i, field in enumerate(AMOUNTS, 1):
+        entry[i] += bill[field] if share is None else bill[field] * share
+
+
+def _sorted(totals):
+    for key, entry in sorted(totals.items()):
+        yield key, dict(zip(("qty",) + AMOUNTS, entry))
+
+
+class _Spill:
+    """b2b/b2cl invoices on disk, read back grouped by recipient / place of supply."""
+
+    def __init__(self, directory):
+        self.conn = sqlite3.connect(os.path.join(directory, 'spill.sqlite'))
+        # Scratch file: no journal, no fsync
+        self.conn.execute("PRAGMA journal_mode = OFF")
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute("CREATE TABLE invoices (section TEXT, grp TEXT, doc TEXT)")
+
+    def add(self, section, group, bill):
+        doc = {key: (money(v) if isinstance(v, Decimal) else v) for key, v in bill.items()}
+        doc["date"] = bill["date"].isoformat()
+        self.conn.execute("INSERT INTO invoices VALUES (?, ?, ?)", (section, group, json.dumps(doc)))
+
+    def read(self, section):
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_spill ON invoices (section, grp)")
+        for group, doc in self.conn.execute(
+                "SELECT grp, doc FROM invoices WHERE section = ? ORDER BY grp, rowid", (section,)):
+            yield group, json.loads(doc)
+
+    def close(self):
+        self.conn.close()
+
+
+def _stream(conn, store_id, start, end):
+    """Every (bill row, [item rows]) of the period, bills in id order, archive included."""
+    cur = conn.cursor(MySQLdb.cursors.SSCursor)
+    # The client may pause between fetches while it writes the spill file
+    cur.execute("SET SESSION net_write_timeout = 600")
+    try:
+        for bills_table, items_table in partitions.SOURCES:
+            cur.execute(LINES_SQL.format(bills=bills_table, items=items_table), (start, end, store_id, start, end))
+            bill_id, rows = None, []
+            while True:
+                batch = cur.fetchmany(FETCH_ROWS)
+                if not batch:
+                    break
+                for row in batch:
+                    if row[0] != bill_id and rows:
+                        yield rows[0], rows
+                        rows = []
+                    bill_id = row[0]
+                    rows.append(row)
+            if rows:
+                yield rows[0], rows
+    finally:
+        cur.close()
+
+
+def _itm(bill, inter):
+    rt = bill["rt"]
+    det = {"rt": float(rt), "txval": money(bill["txval"]), "iamt": money(bill["iamt"])}
+    if not inter:
+        det.update(camt=money(bill["camt"]), samt=money(bill["samt"]))
+    det["csamt"] = 0
+    return [{"num": int(rt * 100) + 1, "itm_det": det}]
+
+
+def _write_json(path, gstin, fp, spill, b2cs, hsn, descriptions):
+    with open(path, 'w') as f:
+        f.write('{"gstin": %s, "fp": %s' % (json.dumps(gstin), json.dumps(fp)))
+        for section, key in (("b2b", "ctin"), ("b2cl", "pos")):
+            f.write(f', "{section}": [')
+            current = None
+            for group, doc in spill.read(section):
+                if group != current:
+                    f.write(']}, ' if current is not None else '')
+                    f.write('{%s: %s, "inv": [' % (json.dumps(key), json.dumps(group)))
+                    current = group
+                else:
+                    f.write(', ')
+                inv = {"inum": doc["inum"], "idt": datetime.date.fromisoformat(doc["date"]).strftime('%d-%m-%Y'),
+                       "val": doc["val"]}
+                if section == "b2b":
+                    inv.update(pos=doc["pos"], rchrg="N", inv_typ="R")
+                inv["itms"] = _itm({k: Decimal(str(doc[k])) for k in ("rt", "txval", "iamt", "camt", "samt")},
+                                   doc["inter"])
+                f.write(json.dumps(inv))
+            f.write(']}]' if current is not None else ']')
+        f.write(', "b2cs": ')
+        json.dump([dict({"sply_ty": "INTER" if inter else "INTRA", "pos": pos, "typ": "OE", "rt": float(rt),
+                         "txval": money(t["txval"]), "iamt": money(t["iamt"])},
+                        **({} if inter else {"camt": money(t["camt"]), "samt": money(t["samt"])}), csamt=0)
+                   for (inter, pos, rt), t in _sorted(b2cs)], f)
+        f.write(', "hsn": ')
+        json.dump({"data": [
+            {"num": num, "hsn_sc": code, "desc": descriptions[code], "uqc": "NOS", "qty": t["qty"], "rt": float(rt),
+             "val": money(t["val"]), "txval": money(t["txval"]), "iamt": money(t["iamt"]),
+             "camt": money(t["camt"]), "samt": money(t["samt"]), "csamt": 0}
+            for num, ((code, rt), t) in enumerate(_sorted(hsn), 1)]}, f)
+        f.write('}')
+
+
+def _write_csv(directory, spill, b2cs, hsn, descriptions):
+    def writer(name, header):
+        f = open(os.path.join(directory, name), 'w', newline='')
+        w = csv.writer(f)
+        w.writerow(header)
+        return f, w
+
+    f, w = writer('b2b.csv', B2B_HEADER)
+    for gstin, doc in spill.read('b2b'):
+        w.writerow([gstin, doc["customer"] or '', doc["inum"],
+                    datetime.date.fromisoformat(doc["date"]).strftime('%d-%b-%Y'), doc["val"],
+                    place_name(doc["pos"]), 'N', '', 'Regular B2B', '', doc["rt"], doc["txval"], 0])
+    f.close()
+
+    f, w = writer('b2cl.csv', B2CL_HEADER)
+    for pos, doc in spill.read('b2cl'):
+        w.writerow([doc["inum"], datetime.date.fromisoformat(doc["date"]).strftime('%d-%b-%Y'), doc["val"],
+                    place_name(pos), '', doc["rt"], doc["txval"], 0, ''])
+    f.close()
+
+    f, w = writer('b2cs.csv', B2CS_HEADER)
+    for (inter, pos, rt), t in _sorted(b2cs):
+        w.writerow(['OE', place_name(pos), '', float(rt), money(t["txval"]), 0, ''])
+    f.close()
+
+    f, w = writer('hsn.csv', HSN_HEADER)
+    for (code, rt), t in _sorted(hsn):
+        w.writerow([code, descriptions[code], 'NOS', t["qty"], money(t["val"]), float(rt), money(t["txval"]),
+                    money(t["iamt"]), money(t["camt"]), money(t["samt"]), 0])
+    f.close()
+
+
+def generate(conn, store_id, period, output_dir, gstin, state_code, b2cl_limit=100000):
+    """Build the store's return for `period` into `output_dir` (replaced atomically). Returns the summary."""
+    started = time.perf_counter()
+    start, end, fp = parse_period(period)
+    parent = os.path.dirname(os.path.abspath(output_dir))
+    os.makedirs(parent, exist_ok=True)
+    work = tempfile.mkdtemp(prefix='.gstr1-', dir=parent)
+    spill = _Spill(work)
+    b2cs, hsn, descriptions = {}, {}, {}
+    counts = {"bills": 0, "items": 0, "b2b": 0, "b2cl": 0, "b2cs": 0}
+    totals = {"value": Decimal('0'), "taxable": Decimal('0'), "igst": Decimal('0'), "cgst": Decimal('0'),
+              "sgst": Decimal('0')}
+    warnings, unplaced = [], 0
+    try:
+        for first, rows in _stream(conn, store_id, start, end):
+            bill = _bill(first, state_code)
+            counts["bills"] += 1
+            for key, field in (("value", "val"), ("taxable", "txval"), ("igst", "iamt"), ("cgst", "camt"),
+                               ("sgst", "samt")):
+                totals[key] += bill[field]
+
+            if bill["gstin"]:
+                section = "b2b"
+                spill.add(section, bill["gstin"], bill)
+            elif bill["inter"] and bill["val"] > b2cl_limit:
+                section = "b2cl"
+                spill.add(section, bill["pos"], bill)
+            else:
+                section = "b2cs"
+                _add(b2cs, (bill["inter"], bill["pos"], bill["rt"]), bill)
+            counts[section] += 1
+            if bill["inter"] and not bill["pos"]:
+                unplaced += 1
+                if len(warnings) < 100:
+                    warnings.append(f"{bill['inum']}: inter-state sale without a place of supply")
+
+            # HSN summary: items share the bill's value and tax pro rata
+            items = [r for r in rows if r[13] is not None]
+            gross = sum((r[14] or 0) for r in items)
+            for r in items:
+                counts["items"] += 1
+                share = (r[14] or 0) / gross if gross else Decimal(1) / len(items)
+                code = (r[15] or '').strip()
+                _add(hsn, (code, bill["rt"]), bill, share, qty=r[13] or 0)
+                if code not in descriptions:
+                    descriptions[code] = (r[16] or '')[:30] if code else 'HSN not set'
+
+        _write_json(os.path.join(work, 'gstr1.json'), gstin, fp, spill, b2cs, hsn, descriptions)
+        _write_csv(work, spill, b2cs, hsn, descriptions)
+        spill.close()
+        os.remove(os.path.join(work, 'spill.sqlite'))
+
+        summary = {
+            "gstin": gstin,
+            "fp": fp,
+            "period": period,
+            "from": start.isoformat(),
+            "to": (end - datetime.timedelta(days=1)).isoformat(),
+            "counts": counts,
+            "totals": {key: money(value) for key, value in totals.items()},
+            "unplaced_inter_state": unplaced,
+            "warnings": warnings,
+            "seconds": round(time.perf_counter() - started, 2),
+            "generated_at": datetime.datetime.now().isoformat(timespec='seconds'),
+        }
+        with open(os.path.join(work, 'summary.json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+
+        if os.path.isdir(output_dir):
+            shutil.rmtree(output_dir)
+        os.rename(work, output_dir)
+        return summary
+    except BaseException:
+        spill.close()
+        shutil.rmtree(work, ignore_errors=True)
+        raise
+
+
+def output_dir(base, store_id, period):
+    return os.path.join(base, f"store{store_id}", period.replace(':', '_'))
+
+
+def read_summary(directory):
+    try:
+        with open(os.path.join(directory, 'summary.json')) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
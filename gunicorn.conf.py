@@ -0,0 +1,53 @@
+"""gunicorn settings: gunicorn -c gunicorn.conf.py wsgi:app
+
+Preforking workers, each with a small thread pool (the dashboard and alert
+streams hold a connection open for as long as the page is open, which would
+pin a whole sync worker). The app is loaded once in the master and forked.
+
+Graceful reload:
+  kill -HUP  $(cat var/gunicorn.pid)   restart workers (same code, new config)
+  kill -USR2 $(cat var/gunicorn.pid)   start a new master on new code, then
+  kill -QUIT <old master pid>          once it is serving; no request is dropped
+"""
+import multiprocessing
+import os
+import time
+
+from config import Config
+
+
+bind = Config.WEB_BIND
+# Stream events reach every worker through EVENTS_SOCKET_DIR (events.py)
+workers = Config.WEB_WORKERS or multiprocessing.cpu_count() * 2 + 1
+worker_class = 'gthread'
+threads = Config.WEB_THREADS
+preload_app = True
+# In-flight bills get this long to finish on reload/shutdown
+graceful_timeout = 30
+timeout = 60
+keepalive = 5
+# Recycle workers now and then; jitter so they do not all restart together
+max_requests = 5000
+max_requests_jitter = 500
+
+pidfile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'var', 'gunicorn.pid')
+os.makedirs(os.path.dirname(pidfile), exist_ok=True)
+accesslog = '-'
+
+_boot = {"started": time.perf_counter()}
+
+
+def when_ready(server):
+    server.log.info("Master ready in %.0f ms, starting %d workers x %d threads",
+                    (time.perf_counter() - _boot["started"]) * 1000, workers, threads)
+
+
+def post_worker_init(worker):
+    # Runs in the worker before it accepts connections
+    from wsgi import warm_worker
+
+    try:
+        worker.log.info("Worker %s warmed up in %.0f ms", worker.pid, warm_worker())
+    except Exception:
+        # Serve anyway; the first requests will pay the cost instead
+        worker.log.exception("Worker %s warmup failed", worker.pid)
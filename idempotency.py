@@ -0,0 +1,104 @@
+"""Idempotency keys for bill-creation endpoints.
+
+The till sends an `Idempotency-Key` header (one key per bill attempt, reused
+on retry). The key row is inserted in the same transaction as the bill, so:
+
+* a retry that arrives while the first attempt is still running blocks on
+  the key row's lock, then sees the committed response and replays it;
+* if the first attempt rolls back, its key row goes with it and the retry
+  creates the bill normally.
+
+Keys are scoped to the store and the user that sent them, so two tills that
+happen to pick the same key never see each other's bills.
+
+Replayed responses carry an `Idempotent-Replayed: true` header.
+"""
+import json
+import re
+from functools import wraps
+
+import MySQLdb
+from flask import g, jsonify, request
+from flask_login import current_user
+
+import shards
+
+
+KEY_RE = re.compile(r'^[A-Za-z0-9_\-]{8,64}$')
+DUPLICATE_ENTRY = 1062
+
+
+def request_key():
+    key = request.headers.get('Idempotency-Key')
+    if key is None:
+        key = (request.get_json(silent=True) or {}).get('idempotency_key')
+    if key and KEY_RE.match(key):
+        return key
+    return None
+
+
+def request_scope(key):
+    """(store_id, user_id, key) for this request; user 0 when nobody is logged in."""
+    return shards.current_store_id(), getattr(current_user, 'id', None) or 0, key
+
+
+def claim(conn, scope, endpoint):
+    """Insert the key row (uncommitted). Returns the stored response on a replay, else None."""
+    cur = conn.cursor()
+    try:
+        cur.execute("INSERT INTO idempotency_keys (store_id, user_id, idem_key, endpoint) VALUES (%s, %s, %s, %s)",
+                    scope + (endpoint,))
+        return None
+    except MySQLdb.IntegrityError as e:
+        if e.args[0] != DUPLICATE_ENTRY:
+            raise
+        conn.rollback()
+        cur.execute("SELECT response FROM idempotency_keys WHERE store_id = %s AND user_id = %s AND idem_key = %s",
+                    scope)
+        row = cur.fetchone()
+        return json.loads(row[0]) if row and row[0] else {}
+    finally:
+        cur.close()
+
+
+def record(cur, response, bill_id=None):
+    """Store the response for this request's key. Call before the view commits."""
+    scope = g.get('idempotency_key')
+    if scope is None:
+        return
+    cur.execute("UPDATE idempotency_keys SET bill_id = %s, response = %s"
+                " WHERE store_id = %s AND user_id = %s AND idem_key = %s",
+                (bill_id, json.dumps(response)) + scope)
+
+
+def idempotent(get_conn):
+    """Decorator for JSON views that create bills.
+
+    Requests without a key behave exactly as before.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request_key()
+            if key is None:
+                return view(*args, **kwargs)
+            scope = request_scope(key)
+            replay = claim(get_conn(), scope, request.endpoint)
+            if replay is not None:
+                response = jsonify(replay)
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            g.idempotency_key = scope
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def purge(conn, older_than_hours=48):
+    """Drop keys older than any plausible retry window."""
+    cur = conn.cursor()
+    deleted = cur.execute("DELETE FROM idempotency_keys WHERE created_at < NOW() - INTERVAL %s HOUR",
+                          (older_than_hours,))
+    conn.commit()
+    cur.close()
+    return deleted
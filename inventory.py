@@ -0,0 +1,90 @@
+"""Low-stock detection and reorder computation.
+
+Sales velocity comes from the `sales_fact_product` daily facts maintained by
+the reports job (`reports.refresh_facts`); this job only reads them, so the
+two never fold the same bills. The result is written to the small `low_stock` table, which the UI
+and `/api/billing/stats` read instead of scanning `products`.
+"""
+from events import broadcaster
+
+
+def refresh_low_stock(conn, window_days=28, lead_time_days=3, safety_days=2, min_stock=5,
+                      channel='inventory'):
+    """Recompute velocity, reorder points and the low-stock list.
+
+    A product is low when its stock is below `min_stock` or at or below its
+    reorder point (daily velocity x (lead time + safety days)). Newly low
+    products are published on the `channel` event channel. Returns the
+    number of low-stock products.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT product_id FROM low_stock")
+    before = {row[0] for row in cur.fetchall()}
+
+    cur.execute("DELETE FROM product_velocity")
+    cur.execute("""
+        INSERT INTO product_velocity (product_id, units_sold, daily_velocity)
+        SELECT product_id, SUM(quantity), SUM(quantity) / %s
+        FROM sales_fact_product
+        WHERE sale_date > DATE_SUB(CURDATE(), INTERVAL %s DAY)
+        GROUP BY product_id
+    """, (window_days, window_days))
+
+    cur.execute("DELETE FROM low_stock")
+    cur.execute("""
+        INSERT INTO low_stock (product_id, name, stock, daily_velocity, reorder_point, days_of_cover)
+        SELECT p.id, p.name, p.stock,
+               COALESCE(v.daily_velocity, 0),
+               CEIL(COALESCE(v.daily_velocity, 0) * %s),
+               CASE WHEN COALESCE(v.daily_velocity, 0) > 0
+                    THEN p.stock / v.daily_velocity END
+        FROM products p
+        LEFT JOIN product_velocity v ON v.product_id = p.id
+        WHERE p.stock < %s
+           OR p.stock <= CEIL(COALESCE(v.daily_velocity, 0) * %s)
+    """, (lead_time_days + safety_days, min_stock, lead_time_days + safety_days))
+    conn.commit()
+
+    cur.execute("""
+        SELECT product_id, name, stock, daily_velocity, reorder_point, days_of_cover
+        FROM low_stock
+    """)
+    rows = [_row_dict(r) for r in cur.fetchall()]
+    cur.close()
+
+    for row in rows:
+        if row["product_id"] not in before:
+            broadcaster.publish(channel, row, event='low_stock')
+    broadcaster.publish(channel, {"low_stock": len(rows)}, event='summary')
+    return len(rows)
+
+
+def low_stock_items(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT product_id, name, stock, daily_velocity, reorder_point, days_of_cover
+        FROM low_stock
+        ORDER BY days_of_cover IS NULL, days_of_cover, stock
+    """)
+    rows = [_row_dict(r) for r in cur.fetchall()]
+    cur.close()
+    return rows
+
+
+def low_stock_count(conn):
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM low_stock")
+    count = cur.fetchone()[0]
+    cur.close()
+    return count
+
+
+def _row_dict(r):
+    return {
+        "product_id": r[0],
+        "name": r[1],
+        "stock": int(r[2]),
+        "daily_velocity": float(r[3]),
+        "reorder_point": int(r[4]),
+        "days_of_cover": float(r[5]) if r[5] is not None else None,
+    }
@@ -0,0 +1,276 @@
+"""A4 tax invoice rendering with ReportLab.
+
+Pure function of the bill and item rows (as returned by
+`partitions.fetch_bill`), so it can run in the PDF worker processes without
+Flask or a database connection.
+"""
+import datetime
+import decimal
+import io
+
+import functools
+
+from reportlab import rl_config
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import BaseDocTemplate, Frame, PageTemplate, Table, TableStyle, Paragraph, Spacer
+
+
+# PDFs are only ever served as binary files, so skip the ASCII85 text
+# encoding of every compressed stream (a large share of render time)
+rl_config.useA85 = 0
+
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 72
+BOTTOM_MARGIN = 18
+BODY_WIDTH = PAGE_WIDTH - 2 * MARGIN
+
+SHOP_ADDRESS = ("Shop Billing System<br/>"
+                "123 College Street<br/>"
+                "Academic City, AC 12345<br/>"
+                "Phone: (555) 123-4567<br/>"
+                "Email: shop@college.edu")
+TERMS = ("Terms & Conditions: Goods once sold cannot be returned or exchanged unless defective. "
+         "This is a computer generated invoice.")
+
+
+class Layout:
+    """Everything about the invoice that does not depend on the bill.
+
+    Built once per process by `layout()`. Header and footer paragraphs are
+    wrapped here and only drawn per page, so a render lays out just the
+    per-bill flowables. Drawing a wrapped paragraph does not change it, but
+    the worker processes render one invoice at a time anyway.
+    """
+
+    def __init__(self):
+        self.styles = getSampleStyleSheet()
+        self.styles.add(ParagraphStyle(name='Center', alignment=1))
+        self.styles.add(ParagraphStyle(name='Right', alignment=2))
+        normal = self.styles['Normal']
+
+        self.header = self._wrapped([
+            (Paragraph("SHOP BILLING SYSTEM", self.styles['Title']), BODY_WIDTH),
+            (Paragraph("TAX INVOICE", self.styles['Heading1']), BODY_WIDTH),
+        ])
+        self.shop = self._wrapped([
+            (Paragraph("<b>From:</b>", normal), 3 * inch),
+            (Paragraph(SHOP_ADDRESS, normal), 3 * inch),
+        ])
+        self.footer = self._wrapped([
+            (Paragraph("Thank you for your business!", self.styles['Heading2']), BODY_WIDTH),
+            (Paragraph(TERMS, normal), BODY_WIDTH),
+        ])
+        header_height = sum(h for _, h in self.header) + 12
+        footer_height = sum(h for _, h in self.footer) + 12
+        self.frame_top = PAGE_HEIGHT - MARGIN - header_height
+        self.frame_bottom = BOTTOM_MARGIN + footer_height
+
+        self.details_style = TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ])
+        self.items_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+            ('ALIGN', (0, 1), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 1), (-1, -1), 10),
+            ('TOPPADDING', (0, 1), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+            ('ALIGN', (-2, -3), (-1, -1), 'RIGHT'),
+            ('FONTNAME', (-2, -3), (-1, -1), 'Helvetica-Bold'),
+            ('LINEABOVE', (-2, -1), (-1, -1), 1, colors.black),
+        ])
+        self.items_widths = [0.5 * inch, 2.5 * inch, 1.2 * inch, 0.8 * inch, 1.2 * inch]
+        self.items_header = ['Item', 'Product', 'Unit Price (₹)', 'Qty', 'Total (₹)']
+
+    @staticmethod
+    def _wrapped(paragraphs):
+        return [(p, p.wrap(width, PAGE_HEIGHT)[1]) for p, width in paragraphs]
+
+    def draw_page(self, canv, doc):
+        """Frozen header and footer, on every page."""
+        y = PAGE_HEIGHT - MARGIN
+        for paragraph, height in self.header:
+            y -= height
+            paragraph.drawOn(canv, MARGIN, y)
+        y = BOTTOM_MARGIN + sum(h for _, h in self.footer)
+        for paragraph, height in self.footer:
+            y -= height
+            paragraph.drawOn(canv, MARGIN, y)
+
+    def draw_first_page(self, canv, doc):
+        self.draw_page(canv, doc)
+        # The address sits in the empty left column of the details table
+        y = self.frame_top - 3
+        for paragraph, height in self.shop:
+            y -= height
+            paragraph.drawOn(canv, MARGIN + 6, y)
+
+    def document(self, buffer):
+        def frame():
+            return Frame(MARGIN, self.frame_bottom, BODY_WIDTH, self.frame_top - self.frame_bottom,
+                         leftPadding=0, rightPadding=0, topPadding=0, bottomPadding=0)
+
+        doc = BaseDocTemplate(buffer, pagesize=A4, leftMargin=MARGIN, rightMargin=MARGIN,
+                              topMargin=MARGIN, bottomMargin=BOTTOM_MARGIN)
+        doc.addPageTemplates([
+            PageTemplate(id='first', frames=[frame()], onPage=self.draw_first_page,
+                         autoNextPageTemplate='later'),
+            PageTemplate(id='later', frames=[frame()], onPage=self.draw_page),
+        ])
+        return doc
+
+
+@functools.lru_cache(maxsize=None)
+def layout():
+    return Layout()
+
+
+def render_invoice(bill, items):
+    """PDF bytes for one invoice."""
+    bill = list(bill)
+
+
+    for i, v in enumerate(bill):
+        if isinstance(v, decimal.Decimal):
+            try:
+                bill[i] = float(v)
+            except Exception:
+                pass
+        elif isinstance(v, str):
+            s = v.strip().replace(',', '')
+            if s.replace('.', '', 1).lstrip('-').isdigit():
+                try:
+                    bill[i] = float(s)
+                except Exception:
+                    pass
+
+   
+    created_at = None
+    for val in bill:
+        if isinstance(val, datetime.datetime):
+            created_at = val
+            break
+        if isinstance(val, datetime.date) and not isinstance(val, datetime.datetime):
+            created_at = datetime.datetime.combine(val, datetime.time.min)
+            break
+        if isinstance(val, str):
+            for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%Y-%m-%dT%H:%M:%S"):
+                try:
+                    created_at = datetime.datetime.strptime(val, fmt)
+                    break
+                except Exception:
+                    continue
+            if created_at:
+                break
+
+  
+    if created_at is None:
+        for val in bill:
+            try:
+                if isinstance(val, (int, float)) and float(val) > 1e9:
+                    created_at = datetime.datetime.fromtimestamp(float(val))
+                    break
+                if isinstance(val, decimal.Decimal) and float(val) > 1e9:
+                    created_at = datetime.datetime.fromtimestamp(float(val))
+                    break
+            except Exception:
+                continue
+
+    if created_at is None:
+        created_at = datetime.datetime.now()
+
+ 
+    while len(bill) <= 7:
+        bill.append(None)
+    bill[7] = created_at
+
+    for idx in (3, 4, 5):
+        if idx < len(bill):
+            try:
+                bill[idx] = float(bill[idx]) if bill[idx] is not None else 0.0
+            except Exception:
+                bill[idx] = 0.0
+
+    #
+    processed_items = []
+    for it in items:
+        row = list(it)
+        for j, val in enumerate(row):
+            if isinstance(val, decimal.Decimal):
+                try:
+                    row[j] = float(val)
+                except Exception:
+                    pass
+            elif isinstance(val, str):
+                s = val.strip().replace(',', '')
+                if s.replace('.', '', 1).lstrip('-').isdigit():
+                    try:
+                        if s.isdigit() or (s.lstrip('-').isdigit()):
+                            row[j] = int(s)
+                        else:
+                            row[j] = float(s)
+                    except Exception:
+                        pass
+        processed_items.append(row)
+    
+    items = processed_items
+
+    return _build(bill, items)
+
+
+def _build(bill, items):
+    """Lay out the per-bill flowables inside the shared page template."""
+    shared = layout()
+    normal = shared.styles['Normal']
+    elements = []
+
+    details = Paragraph(f"<b>Invoice Details:</b><br/>"
+                        f"Bill No: {bill[2]}<br/>"
+                        f"Date: {bill[7].strftime('%B %d, %Y')}<br/>"
+                        f"Time: {bill[7].strftime('%I:%M %p')}<br/>"
+                        f"Payment Method: {bill[6]}", normal)
+    details_table = Table([['', details]], colWidths=[3 * inch, 3 * inch])
+    details_table.setStyle(shared.details_style)
+    elements.append(details_table)
+    elements.append(Spacer(1, 12))
+
+    customer_name = bill[8] if bill[8] else "Walk-in Customer"
+    elements.append(Paragraph(f"<b>Bill To:</b> {customer_name}", normal))
+    if bill[9]:
+        elements.append(Paragraph(f"Phone: {bill[9]}", normal))
+    if bill[10]:
+        elements.append(Paragraph(f"Email: {bill[10]}", normal))
+    if bill[11]:
+        elements.append(Paragraph(f"Address: {bill[11]}", normal))
+    elements.append(Spacer(1, 12))
+
+    data = [shared.items_header]
+    # product name = item[6], total price = item[5]
+    for i, item in enumerate(items, 1):
+        data.append([str(i), item[6], f"₹{item[4]:.2f}", str(item[3]), f"₹{item[5]:.2f}"])
+    data.append(['', '', '', 'Subtotal:', f"₹{bill[3]:.2f}"])
+    data.append(['', '', '', 'GST (18%):', f"₹{bill[4]:.2f}"])
+    data.append(['', '', '', 'Grand Total:', f"₹{bill[5]:.2f}"])
+
+    items_table = Table(data, colWidths=shared.items_widths, repeatRows=1)
+    items_table.setStyle(shared.items_style)
+    elements.append(items_table)
+    elements.append(Spacer(1, 6))
+    elements.append(Paragraph(f"Generated on: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", normal))
+
+    buffer = io.BytesIO()
+    shared.document(buffer).build(elements)
+    return buffer.getvalue()
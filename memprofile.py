@@ -0,0 +1,163 @@
+"""Opt-in memory instrumentation for request handlers (MEMORY_PROFILE=1).
+
+`init_app` starts tracemalloc and wraps the app's view dispatch. While
+profiling, views run one at a time in each process, so tracemalloc's
+process-wide peak belongs to a single request. For every request it records
+
+  peak   the most the view had allocated at once, over what was allocated
+         when it started
+  net    what was still allocated when it returned (the response included)
+
+per endpoint. For the worst request seen so far it also records the top
+allocation sites: a snapshot diff, grouped by source line. A request whose
+peak exceeds MEMORY_BUDGET_MB is logged with those sites. Streamed responses
+produce their body after the view returns, so only their setup is measured.
+
+Every MEMORY_PROFILE_INTERVAL seconds each worker appends a heap summary
+line (RSS, traced memory, top sites) to MEMORY_PROFILE_LOG. Stats are at
+/api/metrics/memory; benchmarks/bench_memory.py turns them into a budget
+gate. Profiling slows every request and serializes views: do not leave it
+on in production.
+"""
+import datetime
+import json
+import os
+import threading
+import tracemalloc
+from functools import wraps
+
+from flask import request
+
+import workers
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+_state = {"enabled": False, "budget": 32 * 1024 * 1024, "top": 10, "log": None, "interval": 300}
+_endpoints = {}
+_lock = threading.RLock()  # stats() is called from a profiled view
+
+
+def init_app(app):
+    if not app.config.get('MEMORY_PROFILE'):
+        return
+    _state.update(
+        enabled=True,
+        budget=int(app.config.get('MEMORY_BUDGET_MB', 32) * 1024 * 1024),
+        top=app.config.get('MEMORY_PROFILE_TOP', 10),
+        log=app.config.get('MEMORY_PROFILE_LOG'),
+        interval=app.config.get('MEMORY_PROFILE_INTERVAL', 300),
+    )
+    tracemalloc.start(app.config.get('MEMORY_PROFILE_FRAMES', 1))
+
+    dispatch = app.dispatch_request
+
+    @wraps(dispatch)
+    def profiled_dispatch():
+        with _lock:
+            return _measure(app, request.endpoint or request.path, dispatch)
+
+    app.dispatch_request = profiled_dispatch
+    if _state["log"]:
+        app.before_request(lambda: _start_summaries(app))
+
+
+def _start_summaries(app):
+    # Once per process: every worker writes its own summaries
+    workers.start_periodic(app, 'memory', _state["interval"], write_summary)
+
+
+def _snapshot():
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+    ))
+
+
+def _sites(stats):
+    out = []
+    for stat in stats[:_state["top"]]:
+        frame = stat.traceback[0]
+        size = getattr(stat, 'size_diff', stat.size)
+        count = getattr(stat, 'count_diff', stat.count)
+        if size <= 0:
+            continue
+        filename = os.path.relpath(frame.filename, ROOT) if frame.filename.startswith(ROOT) else frame.filename
+        out.append({"site": f"{filename}:{frame.lineno}", "kb": round(size / 1024, 1),
+                    "blocks": count})
+    return out
+
+
+def _measure(app, endpoint, dispatch):
+    before = _snapshot()
+    start = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    try:
+        return dispatch()
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        peak, net = max(peak - start, 0), current - start
+        stats = _endpoints.setdefault(endpoint, {
+            "requests": 0, "peak_max": 0, "peak_total": 0, "net_total": 0, "last_peak": 0,
+            "over_budget": 0, "worst_path": None, "top_sites": []})
+        stats["requests"] += 1
+        stats["peak_total"] += peak
+        stats["net_total"] += net
+        stats["last_peak"] = peak
+        if peak > stats["peak_max"]:
+            stats.update(peak_max=peak, worst_path=request.full_path.rstrip('?'),
+                         top_sites=_sites(_snapshot().compare_to(before, 'lineno')))
+        if peak > _state["budget"]:
+            stats["over_budget"] += 1
+            app.logger.warning("%s peaked at %.1f MB (budget %.1f MB): %s", request.path, peak / 2**20,
+                               _state["budget"] / 2**20, stats["top_sites"][:3])
+        del before
+
+
+def rss_bytes():
+    """Resident set size of this process, or None where it cannot be read."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def stats():
+    if not _state["enabled"]:
+        return {"enabled": False}
+    with _lock:
+        endpoints = {
+            name: {
+                "requests": s["requests"],
+                "peak_max_kb": round(s["peak_max"] / 1024, 1),
+                "peak_avg_kb": round(s["peak_total"] / s["requests"] / 1024, 1),
+                "net_avg_kb": round(s["net_total"] / s["requests"] / 1024, 1),
+                "last_peak_kb": round(s["last_peak"] / 1024, 1),
+                "over_budget": s["over_budget"],
+                "worst_path": s["worst_path"],
+                "top_sites": s["top_sites"],
+            }
+            for name, s in _endpoints.items()
+        }
+    return {"enabled": True, "pid": os.getpid(), "rss_kb": (rss_bytes() or 0) // 1024,
+            "traced_kb": tracemalloc.get_traced_memory()[0] // 1024,
+            "budget_kb": _state["budget"] // 1024, "endpoints": endpoints}
+
+
+def reset():
+    with _lock:
+        _endpoints.clear()
+
+
+def write_summary():
+    """Append one heap summary line for this process to MEMORY_PROFILE_LOG."""
+    with _lock:
+        top = _sites(_snapshot().statistics('lineno'))
+        traced = tracemalloc.get_traced_memory()[0]
+    line = {"time": datetime.datetime.now().isoformat(timespec='seconds'), "pid": os.getpid(),
+            "rss_kb": (rss_bytes() or 0) // 1024, "traced_kb": traced // 1024, "top_sites": top}
+    os.makedirs(os.path.dirname(_state["log"]) or '.', exist_ok=True)
+    with open(_state["log"], 'a') as f:
+        f.write(json.dumps(line) + '\n')
+    return line["traced_kb"]
@@ -0,0 +1,187 @@
+"""Versioned schema migrations and the hot-query EXPLAIN check.
+
+Migrations live in database/migrations as NNNN_name.sql or NNNN_name.py
+(a module with `upgrade(conn)`), applied in version order and recorded in
+`schema_migrations`. A .sql file whose first line is `-- migrate: online` has
+every ALTER TABLE run with ALGORITHM=INPLACE, LOCK=NONE, so MySQL refuses
+a change that would block writes instead of silently locking a big table.
+
+MySQL commits each DDL statement on its own, so a migration that fails
+partway is left half-applied. Running it again is safe: statements whose
+effect is already there are skipped (`execute_ddl`).
+"""
+import hashlib
+import importlib.util
+import os
+import re
+
+import MySQLdb.cursors
+
+import catalog
+import customers
+
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'migrations')
+FILE_RE = re.compile(r'^(\d{4})_(\w+)\.(sql|py)$')
+ONLINE_HEADER = '-- migrate: online'
+
+
+def discover(directory=MIGRATIONS_DIR):
+    found = []
+    for filename in sorted(os.listdir(directory)):
+        match = FILE_RE.match(filename)
+        if match:
+            found.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    return found
+
+
+def _checksum(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _ensure_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            checksum CHAR(64) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def applied(conn):
+    cur = conn.cursor()
+    _ensure_table(cur)
+    cur.execute("SELECT version, checksum FROM schema_migrations")
+    rows = dict(cur.fetchall())
+    cur.close()
+    return rows
+
+
+def status(conn):
+    """(pending migrations, applied migrations whose file has changed since)."""
+    done = applied(conn)
+    pending, changed = [], []
+    for version, name, path in discover():
+        if version not in done:
+            pending.append((version, name))
+        elif done[version] != _checksum(path):
+            changed.append((version, name))
+    return pending, changed
+
+
+def sql_statements(sql):
+    """Split a migration file into statements, applying the online directive."""
+    online = sql.lstrip().startswith(ONLINE_HEADER)
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    statements = []
+    for chunk in '\n'.join(lines).split(';'):
+        statement = chunk.strip()
+        if not statement:
+            continue
+        if online and statement.upper().startswith('ALTER TABLE') and 'ALGORITHM' not in statement.upper():
+            statement += ', ALGORITHM=INPLACE, LOCK=NONE'
+        statements.append(statement)
+    return statements
+
+
+def _run(conn, path):
+    if path.endswith('.py'):
+        spec = importlib.util.spec_from_file_location(os.path.basename(path)[:-3], path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.upgrade(conn)
+        return
+    with open(path) as f:
+        statements = sql_statements(f.read())
+    cur = conn.cursor()
+    for statement in statements:
+        execute_ddl(cur, statement)
+    cur.close()
+
+
+# MySQL errors meaning a DDL statement's effect is already in place. DDL
+# commits as it goes, so a migration that failed halfway is re-run from the
+# top; these let the statements that did succeed pass the second time.
+ALREADY_APPLIED = {
+    1050: "table exists",
+    1060: "column exists",
+    1061: "index exists",
+    1091: "already dropped",
+    1826: "foreign key exists",
+}
+# Seed rows a previous attempt inserted
+DUPLICATE_ENTRY = 1062
+
+
+def execute_ddl(cur, statement):
+    """Run one migration statement; False if a previous run already applied it."""
+    try:
+        cur.execute(statement)
+    except (MySQLdb.OperationalError, MySQLdb.IntegrityError) as e:
+        code = e.args[0] if e.args else None
+        seed = code == DUPLICATE_ENTRY and statement.lstrip().upper().startswith('INSERT')
+        if code not in ALREADY_APPLIED and not seed:
+            raise
+        return False
+    return True
+
+
+def upgrade(conn, target=None, log=print):
+    """Apply pending migrations up to `target` (default: all). Returns the count."""
+    done = applied(conn)
+    count = 0
+    for version, name, path in discover():
+        if version in done or (target is not None and version > target):
+            continue
+        log(f"Applying {version:04d}_{name}")
+        _run(conn, path)
+        cur = conn.cursor()
+        cur.execute("INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                    (version, name, _checksum(path)))
+        conn.commit()
+        cur.close()
+        count += 1
+    return count
+
+
+# Queries on the billing hot path that must stay on an index. Parameters are
+# representative values; only the plan matters.
+HOT_QUERIES = [
+    ("today's bills",
+     "SELECT SUM(final_amount) FROM bills WHERE created_at >= CURDATE() "
+     "AND created_at < CURDATE() + INTERVAL 1 DAY", ()),
+    ("customer stats",
+     "SELECT COUNT(*), SUM(final_amount) FROM bills WHERE customer_id = %s", (1,)),
+    ("invoice items",
+     "SELECT bi.id, p.name FROM bill_items bi JOIN products p ON bi.product_id = p.id "
+     "WHERE bi.bill_id = %s", (1,)),
+    ("lookup by barcode",
+     "SELECT id, name, price, stock FROM products WHERE barcode = %s", ('8901234567890',)),
+    ("search by name prefix", catalog.NAME_PREFIX_SQL, ('Key%', 50)),
+    ("lookup by name prefix, ranked", catalog.RANKED_PREFIX_SQL, ('Key%', 10)),
+    ("customer by phone",
+     "SELECT id, name FROM customers WHERE phone = %s", ('9999999999',)),
+    ("quick-add by phone key",
+     customers.BY_PHONE_SQL, (1, '9999999999')),
+]
+
+
+def explain_hot_queries(conn, min_rows=1000):
+    """Return [(query name, table, estimated rows)] for hot queries that full-scan.
+
+    A plan counts as a regression when any table is read with type ALL and
+    the optimizer expects at least `min_rows` rows. Tiny tables are skipped,
+    since MySQL rightly prefers scanning those.
+    """
+    failures = []
+    cur = conn.cursor(MySQLdb.cursors.DictCursor)
+    for name, sql, params in HOT_QUERIES:
+        cur.execute("EXPLAIN " + sql, params)
+        for row in cur.fetchall():
+            if row.get('type') == 'ALL' and (row.get('rows') or 0) >= min_rows:
+                failures.append((name, row.get('table'), row.get('rows')))
+    cur.close()
+    return failures
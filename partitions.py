@@ -0,0 +1,183 @@
+"""Monthly partitions for bills/bill_items and fiscal-year archiving.
+
+`bills` and `bill_items` are RANGE partitioned by month on `created_at`
+(bill_items carries its bill's timestamp so both tables split the same way).
+Partitions are named pYYYYMM, plus a trailing `pmax` catch-all.
+
+Closed fiscal years are moved to the compressed `bills_archive` /
+`bill_items_archive` tables and their partitions dropped. `fetch_bill` reads
+the hot tables first and falls back to the archive, so invoice pages and PDFs
+keep working for archived bills.
+"""
+import datetime
+
+
+TABLES = ('bills', 'bill_items')
+# Where a bill can be read from, in lookup order
+SOURCES = (('bills', 'bill_items'), ('bills_archive', 'bill_items_archive'))
+
+BILL_SQL = """
+    SELECT b.*, c.name, c.phone, c.email, c.address
+    FROM {table} b
+    LEFT JOIN customers c ON b.customer_id = c.id
+    WHERE b.id = %s
+"""
+
+ITEMS_SQL = """
+    SELECT bi.id, bi.bill_id, bi.product_id, bi.quantity, bi.unit_price, bi.total_price, p.name
+    FROM {table} bi
+    JOIN products p ON bi.product_id = p.id
+    WHERE bi.bill_id = %s
+"""
+
+
+def month_start(day):
+    return datetime.date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return month.strftime('p%Y%m')
+
+
+def _partition_clause(month):
+    upper = add_months(month, 1)
+    return (f"PARTITION {partition_name(month)} VALUES LESS THAN "
+            f"(UNIX_TIMESTAMP('{upper:%Y-%m-%d} 00:00:00'))")
+
+
+def existing_partitions(conn, table):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT PARTITION_NAME FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """, (table,))
+    names = [row[0] for row in cur.fetchall()]
+    cur.close()
+    return names
+
+
+def partition_tables(conn, months_ahead=3, today=None):
+    """One-off: partition bills and bill_items monthly from the oldest bill onwards.
+
+    Run after database/partitioning.sql has prepared the keys. Rebuilds the
+    tables, so do it in a quiet window.
+    """
+    today = today or datetime.date.today()
+    cur = conn.cursor()
+    cur.execute("SELECT MIN(created_at) FROM bills")
+    oldest = cur.fetchone()[0]
+    first = month_start(oldest.date() if oldest else today)
+    last = add_months(month_start(today), months_ahead)
+
+    months = []
+    month = first
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    clauses = ",\n".join([_partition_clause(m) for m in months] +
+                         ["PARTITION pmax VALUES LESS THAN MAXVALUE"])
+    for table in TABLES:
+        if existing_partitions(conn, table):
+            continue
+        cur.execute(f"ALTER TABLE {table} PARTITION BY RANGE (UNIX_TIMESTAMP(created_at)) (\n{clauses}\n)")
+    cur.close()
+    return len(months)
+
+
+def ensure_partitions(conn, months_ahead=3, today=None):
+    """Split `pmax` so the next `months_ahead` months each have a partition."""
+    today = today or datetime.date.today()
+    cur = conn.cursor()
+    added = 0
+    for table in TABLES:
+        names = set(existing_partitions(conn, table))
+        if 'pmax' not in names:
+            continue
+        missing = []
+        for offset in range(months_ahead + 1):
+            month = add_months(month_start(today), offset)
+            if partition_name(month) not in names:
+                missing.append(month)
+        if not missing:
+            continue
+        clauses = ", ".join([_partition_clause(m) for m in missing] +
+                            ["PARTITION pmax VALUES LESS THAN MAXVALUE"])
+        cur.execute(f"ALTER TABLE {table} REORGANIZE PARTITION pmax INTO ({clauses})")
+        added += len(missing)
+    cur.close()
+    return added
+
+
+def fiscal_year_bounds(year, start_month=4):
+    """[start, end) dates of the fiscal year that starts in `year` (FY 2024 = Apr 2024 - Mar 2025)."""
+    start = datetime.date(year, start_month, 1)
+    return start, add_months(start, 12)
+
+
+def archive_fiscal_year(conn, year, start_month=4, today=None):
+    """Move a closed fiscal year to the archive tables and drop its partitions.
+
+    Safe to re-run: rows are copied with INSERT IGNORE and partitions that
+    are already gone are skipped. Returns (bills, items) archived.
+    """
+    today = today or datetime.date.today()
+    start, end = fiscal_year_bounds(year, start_month)
+    if end > today:
+        raise ValueError(f"Fiscal year {year} is not closed yet")
+
+    cur = conn.cursor()
+    bills = cur.execute("""
+        INSERT IGNORE INTO bills_archive
+        SELECT * FROM bills WHERE created_at >= %s AND created_at < %s
+    """, (start, end))
+    # Items follow their bill even if their own timestamp crossed the boundary
+    items = cur.execute("""
+        INSERT IGNORE INTO bill_items_archive
+        SELECT bi.* FROM bill_items bi
+        JOIN bills b ON b.id = bi.bill_id
+        WHERE b.created_at >= %s AND b.created_at < %s
+    """, (start, end))
+    cur.execute("""
+        DELETE bi FROM bill_items bi
+        JOIN bills_archive a ON a.id = bi.bill_id
+        WHERE bi.created_at >= %s AND a.created_at >= %s AND a.created_at < %s
+    """, (end, start, end))
+    conn.commit()
+
+    months = []
+    month = start
+    while month < end:
+        months.append(partition_name(month))
+        month = add_months(month, 1)
+    # Items first so the fallback DELETE never trips a foreign key
+    for table in reversed(TABLES):
+        partitions = set(existing_partitions(conn, table))
+        present = [name for name in months if name in partitions]
+        if present:
+            cur.execute(f"ALTER TABLE {table} DROP PARTITION {', '.join(present)}")
+        elif not partitions:
+            cur.execute(f"DELETE FROM {table} WHERE created_at >= %s AND created_at < %s", (start, end))
+    conn.commit()
+    cur.close()
+    return bills, items
+
+
+def fetch_bill(conn, bill_id):
+    """(bill row, item rows) for a bill, from the hot tables or the archive."""
+    cur = conn.cursor()
+    for bills_table, items_table in SOURCES:
+        cur.execute(BILL_SQL.format(table=bills_table), (bill_id,))
+        bill = cur.fetchone()
+        if bill:
+            cur.execute(ITEMS_SQL.format(table=items_table), (bill_id,))
+            items = cur.fetchall()
+            cur.close()
+            return bill, items
+    cur.close()
+    return None, ()
@@ -0,0 +1,328 @@
+"""Local PDF job queue backed by SQLite, rendered by worker processes.
+
+Web requests fetch the bill, `enqueue` it and return a job id right away. A
+pool of separate processes claims jobs in priority order (cashier receipts
+before invoices before bulk exports), renders them with `invoice_pdf` and
+writes the file next to the queue database. Nothing outside the machine is
+needed.
+
+The pool is its own process (`run_pool`), never a fork of a threaded web
+worker. It holds an flock on `<queue>.lock`, which its workers inherit, so
+at most one pool runs per queue, and a new pool knows that any job still
+marked running was cut off and puts it back in the queue. A worker logs and
+survives anything that goes wrong between jobs (a locked queue database, a
+full disk); one that dies anyway is replaced within POOL_CHECK_SECONDS and
+its job is queued again. STALE_SECONDS is only the last resort.
+
+The till's post-bill page asks for its PDF as a receipt; `flask
+queue-invoice-pdfs` queues a day's invoices as bulk work behind everything
+else.
+
+With PDF_WORKERS_EMBEDDED=1 (the default) the background job leader starts
+the pool (`ensure_pool`) and the pool stops once no web process has held the
+leader lock for LEADER_GRACE_SECONDS, so it outlives a recycled leader but
+not the server. Or run it on its own:
+
+    python pdfqueue.py --workers 4
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import pickle
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server only
+    fcntl = None
+
+
+PRIORITY_RECEIPT = 0
+PRIORITY_INVOICE = 5
+PRIORITY_BULK = 9
+PRIORITIES = {'receipt': PRIORITY_RECEIPT, 'invoice': PRIORITY_INVOICE, 'bulk': PRIORITY_BULK}
+
+STALE_SECONDS = 300
+KEEP_SECONDS = 86400
+ERROR_BACKOFF_SECONDS = 5
+POOL_CHECK_SECONDS = 5
+LEADER_GRACE_SECONDS = 120
+
+log = logging.getLogger(__name__)
+
+# The pool process forks its workers; it has no other threads, so that is safe
+_context = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+_pool = []
+_supervisor = {"process": None, "checked": 0.0}
+_supervisor_lock = threading.Lock()
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            priority INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            payload BLOB,
+            filename TEXT,
+            output TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            worker INTEGER
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority, created_at)")
+    return conn
+
+
+def enqueue(path, bill, items, filename, priority=PRIORITY_INVOICE):
+    job_id = uuid.uuid4().hex
+    conn = _connect(path)
+    conn.execute("INSERT INTO jobs (id, priority, status, payload, filename, created_at) "
+                 "VALUES (?, ?, 'queued', ?, ?, ?)",
+                 (job_id, priority, pickle.dumps((list(bill), [list(i) for i in items])),
+                  filename, time.time()))
+    conn.close()
+    return job_id
+
+
+def get_job(path, job_id):
+    conn = _connect(path)
+    row = conn.execute("SELECT status, filename, output, error, priority, created_at, finished_at "
+                       "FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    position = None
+    if row and row[0] == 'queued':
+        position = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND "
+                                "(priority < ? OR (priority = ? AND created_at < ?))",
+                                (row[4], row[4], row[5])).fetchone()[0]
+    conn.close()
+    if not row:
+        return None
+    return {"id": job_id, "status": row[0], "filename": row[1], "output": row[2],
+            "error": row[3], "queue_position": position}
+
+
+def queue_stats(path):
+    conn = _connect(path)
+    rows = conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+    conn.close()
+    return dict(rows)
+
+
+def _claim(conn):
+    """Atomically take the highest-priority queued job."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Jobs whose worker died mid-render go back to the queue
+        conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running' AND started_at < ?",
+                     (time.time() - STALE_SECONDS,))
+        row = conn.execute("SELECT id, payload FROM jobs WHERE status = 'queued' "
+                           "ORDER BY priority, created_at LIMIT 1").fetchone()
+        if row:
+            conn.execute("UPDATE jobs SET status = 'running', started_at = ?, worker = ? WHERE id = ?",
+                         (time.time(), os.getpid(), row[0]))
+        conn.execute("COMMIT")
+        return row
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _cleanup(conn, output_dir):
+    cutoff = time.time() - KEEP_SECONDS
+    for (output,) in conn.execute("SELECT output FROM jobs WHERE finished_at < ?", (cutoff,)).fetchall():
+        if output and os.path.exists(output):
+            os.remove(output)
+    conn.execute("DELETE FROM jobs WHERE finished_at < ?", (cutoff,))
+
+
+def _render(conn, job_id, payload, output_dir):
+    import invoice_pdf
+
+    try:
+        bill, items = pickle.loads(payload)
+        pdf = invoice_pdf.render_invoice(bill, items)
+        output = os.path.join(output_dir, f"{job_id}.pdf")
+        with open(output + ".tmp", "wb") as f:
+            f.write(pdf)
+        os.replace(output + ".tmp", output)
+        conn.execute("UPDATE jobs SET status = 'done', output = ?, payload = NULL, finished_at = ? "
+                     "WHERE id = ?", (output, time.time(), job_id))
+    except Exception as e:
+        log.warning("PDF job %s failed: %s", job_id, e)
+        conn.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                     (str(e), time.time(), job_id))
+
+
+def worker_loop(path, output_dir, poll=0.2):
+    conn = _connect(path)
+    parent = os.getppid()
+    last_cleanup = 0
+    # Stop with the pool, so a new pool can take the lock
+    while os.getppid() == parent:
+        try:
+            job = _claim(conn)
+            if job is None:
+                if time.time() - last_cleanup > 600:
+                    _cleanup(conn, output_dir)
+                    last_cleanup = time.time()
+                time.sleep(poll)
+                continue
+            _render(conn, *job, output_dir)
+        except Exception:
+            # A job left 'running' here is requeued by _claim once it is stale
+            log.exception("PDF worker %s: error outside a job, retrying in %ss",
+                          multiprocessing.current_process().name, ERROR_BACKOFF_SECONDS)
+            time.sleep(ERROR_BACKOFF_SECONDS)
+
+
+def _requeue(path, worker=None):
+    """Put jobs of a dead worker (or, without one, all running jobs) back in the queue."""
+    conn = _connect(path)
+    if worker is None:
+        cur = conn.execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running'")
+    else:
+        cur = conn.execute("UPDATE jobs SET status = 'queued', worker = NULL "
+                           "WHERE status = 'running' AND worker = ?", (worker,))
+    conn.close()
+    return cur.rowcount
+
+
+def start_workers(path, output_dir, count):
+    """Keep `count` worker processes running: start them once, then replace any that died."""
+    if not _pool:
+        _pool.extend([None] * count)
+    for i, process in enumerate(_pool):
+        if process is not None and process.is_alive():
+            continue
+        if process is not None:
+            process.join()
+            log.warning("PDF worker %s exited with code %s; restarting it, %d jobs requeued",
+                        process.name, process.exitcode, _requeue(path, process.pid))
+        process = _context.Process(target=worker_loop, args=(path, output_dir),
+                                   name=f"pdf-worker-{i}", daemon=True)
+        process.start()
+        _pool[i] = process
+    return _pool
+
+
+def _lock_pool(path):
+    """The open lock file for `path`'s pool, or None if another pool holds it."""
+    f = open(path + '.lock', 'a')
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return None
+    return f
+
+
+def _unlocked(lock_path):
+    """True if nobody holds an flock on `lock_path` (no web process is the job leader)."""
+    if fcntl is None or not os.path.exists(lock_path):
+        return fcntl is not None
+    with open(lock_path, 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        fcntl.flock(f, fcntl.LOCK_UN)
+    return True
+
+
+def run_pool(path, output_dir, count, leader_lock=None):
+    """Run the worker pool until killed, or until `leader_lock` has been free for
+    LEADER_GRACE_SECONDS. Returns False right away if a pool already runs."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    lock = _lock_pool(path)
+    if lock is None:
+        log.info("A PDF pool is already running for %s", path)
+        return False
+    os.makedirs(output_dir, exist_ok=True)
+    conn = _connect(path)
+    try:
+        conn.execute("ALTER TABLE jobs ADD COLUMN worker INTEGER")
+    except sqlite3.OperationalError:
+        pass
+    conn.close()
+    # Nobody else holds the lock, so nothing is rendering: running jobs were cut off
+    requeued = _requeue(path)
+    if requeued:
+        log.warning("Requeued %d PDF jobs left running by the previous pool", requeued)
+
+    leaderless_since = None
+    try:
+        while True:
+            start_workers(path, output_dir, count)
+            if leader_lock and _unlocked(leader_lock):
+                leaderless_since = leaderless_since or time.monotonic()
+                if time.monotonic() - leaderless_since > LEADER_GRACE_SECONDS:
+                    log.info("No web process has been the job leader for %ss; stopping the PDF pool",
+                             LEADER_GRACE_SECONDS)
+                    return True
+            else:
+                leaderless_since = None
+            time.sleep(POOL_CHECK_SECONDS)
+    finally:
+        for process in _pool:
+            if process is not None:
+                process.terminate()
+                process.join()
+        lock.close()
+
+
+def ensure_pool(path, output_dir, count, leader_lock=None):
+    """From the job leader: start `python pdfqueue.py` unless a pool already runs.
+
+    The pool is a new process (fork and exec), not a fork of this threaded
+    one, and has its own session, so it survives this worker being
+    recycled. Checked at most every POOL_CHECK_SECONDS.
+    """
+    now = time.monotonic()
+    with _supervisor_lock:
+        if _supervisor["checked"] and now - _supervisor["checked"] < POOL_CHECK_SECONDS:
+            return
+        _supervisor["checked"] = now
+        process = _supervisor["process"]
+        if process is not None and process.poll() is None:
+            return
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        probe = _lock_pool(path)
+        if probe is None:
+            # Started by an earlier leader, still running
+            return
+        probe.close()
+        args = [sys.executable, os.path.abspath(__file__), '--workers', str(count),
+                '--queue', path, '--output', output_dir]
+        if leader_lock:
+            args += ['--leader-lock', leader_lock]
+        _supervisor["process"] = subprocess.Popen(args, start_new_session=True)
+
+
+def main():
+    from config import Config
+
+    parser = argparse.ArgumentParser(description="Run PDF rendering workers")
+    parser.add_argument('--workers', type=int, default=Config.PDF_WORKERS)
+    parser.add_argument('--queue', default=Config.PDF_QUEUE_PATH)
+    parser.add_argument('--output', default=Config.PDF_OUTPUT_DIR)
+    parser.add_argument('--leader-lock', default=None,
+                        help='Stop once no process has held this lock for a while (set by ensure_pool).')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+    run_pool(args.queue, args.output, args.workers, args.leader_lock)
+
+
+if __name__ == '__main__':
+    main()
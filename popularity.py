@@ -0,0 +1,85 @@
+"""Time-decayed product popularity used to rank lookup results.
+
+Scores live in `product_popularity` and decay with a configurable half-life.
+Each refresh decays the existing scores to now and adds the quantities from
+bills created since the last refresh (tracked in `report_watermark`), so the
+cost grows with new sales and the product count, not with history.
+
+As in reports.py, the watermark stops short of the first bill created less
+than SETTLE_SECONDS ago: ids are handed out at insert but rows appear at
+commit, so a lower id may still be in flight. A named lock keeps two
+refreshes from folding the same bills twice.
+"""
+import time
+
+
+SETTLE_SECONDS = 60
+LOCK_NAME = 'popularity_watermark'
+LOCK_WAIT_SECONDS = 30
+
+
+def refresh_popularity(conn, half_life_days=14, settle_seconds=SETTLE_SECONDS):
+    """Fold settled new bill items into the decayed scores.
+
+    Returns timing and row counts, or None if another refresh held the lock
+    throughout.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_WAIT_SECONDS))
+    if not cur.fetchone()[0]:
+        cur.close()
+        return None
+    try:
+        return _fold(conn, cur, half_life_days, settle_seconds)
+    finally:
+        cur.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cur.fetchone()
+        cur.close()
+
+
+def _fold(conn, cur, half_life_days, settle_seconds):
+    started = time.perf_counter()
+    half_life = half_life_days * 86400.0
+
+    cur.execute("SELECT last_bill_id FROM report_watermark WHERE name = 'popularity'")
+    row = cur.fetchone()
+    low = row[0] if row else 0
+    # Stop short of the first bill that has not settled, whatever follows it
+    cur.execute("SELECT MIN(id) FROM bills WHERE id > %s AND created_at >= NOW() - INTERVAL %s SECOND",
+                (low, settle_seconds))
+    unsettled = cur.fetchone()[0]
+    cur.execute("SELECT COALESCE(MAX(id), %s) FROM bills WHERE id > %s AND id < %s",
+                (low, low, unsettled if unsettled is not None else 2**63 - 1))
+    high = cur.fetchone()[0]
+
+    decayed = cur.execute("""
+        UPDATE product_popularity
+        SET score = score * POW(0.5, TIMESTAMPDIFF(SECOND, scored_at, NOW()) / %s),
+            scored_at = NOW()
+    """, (half_life,))
+
+    added = 0
+    if high > low:
+        added = cur.execute("""
+            INSERT INTO product_popularity (product_id, score, scored_at)
+            SELECT bi.product_id,
+                   SUM(bi.quantity * POW(0.5, GREATEST(TIMESTAMPDIFF(SECOND, b.created_at, NOW()), 0) / %s)),
+                   NOW()
+            FROM bills b
+            JOIN bill_items bi ON bi.bill_id = b.id
+            WHERE b.id > %s AND b.id <= %s
+            GROUP BY bi.product_id
+            ON DUPLICATE KEY UPDATE score = score + VALUES(score)
+        """, (half_life, low, high))
+        cur.execute("""
+            INSERT INTO report_watermark (name, last_bill_id) VALUES ('popularity', %s)
+            ON DUPLICATE KEY UPDATE last_bill_id = VALUES(last_bill_id)
+        """, (high,))
+
+    conn.commit()
+    return {
+        "last_bill_id": high,
+        "decayed_rows": decayed,
+        "updated_rows": added,
+        "seconds": round(time.perf_counter() - started, 4),
+    }
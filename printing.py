@@ -0,0 +1,129 @@
+"""PDF download and receipt routes.
+
+Registered on the app by `init_app`, with the same endpoint names as before
+(`generate_pdf`, `pdf_job`, `print_receipt`). Everything heavy is imported
+inside the views: `pdfqueue` pulls in multiprocessing and sqlite3, and the
+renderers pull in ReportLab, so a worker that only serves billing and
+lookup requests never loads any of them.
+"""
+import datetime
+
+from flask import Response, flash, jsonify, redirect, render_template, request, send_file, url_for
+from flask_login import login_required
+
+from config import Config
+import partitions
+import workers
+
+
+def init_app(app, read_db):
+    def generate_pdf(bill_id):
+        return _generate_pdf(read_db, bill_id)
+
+    def print_receipt(bill_id):
+        return _print_receipt(read_db, bill_id)
+
+    app.add_url_rule('/invoices/<int:bill_id>/pdf', 'generate_pdf', login_required(generate_pdf),
+                     methods=['GET', 'POST'])
+    app.add_url_rule('/pdf-jobs/<job_id>', 'pdf_job', login_required(pdf_job))
+    app.add_url_rule('/invoices/<int:bill_id>/receipt', 'print_receipt', login_required(print_receipt))
+
+
+def wants_json():
+    return (request.args.get('format') == 'json' or
+            request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json')
+
+
+def start_pdf_workers():
+    if Config.PDF_WORKERS_EMBEDDED and workers.is_leader(Config.LEADER_LOCK_PATH):
+        import pdfqueue
+
+        pdfqueue.ensure_pool(Config.PDF_QUEUE_PATH, Config.PDF_OUTPUT_DIR, Config.PDF_WORKERS,
+                             leader_lock=Config.LEADER_LOCK_PATH)
+
+
+def queue_day(conn, day):
+    """Queue the PDF of every bill made on `day` as bulk work. Returns [(bill number, job id)]."""
+    import pdfqueue
+
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM bills WHERE created_at >= %s AND created_at < %s ORDER BY id",
+                (day, day + datetime.timedelta(days=1)))
+    bill_ids = [row[0] for row in cur.fetchall()]
+    cur.close()
+    jobs = []
+    for bill_id in bill_ids:
+        bill, items = partitions.fetch_bill(conn, bill_id)
+        jobs.append((bill[2], pdfqueue.enqueue(Config.PDF_QUEUE_PATH, bill, items,
+                                               filename=f"invoice_{bill[2]}.pdf",
+                                               priority=pdfqueue.PRIORITY_BULK)))
+    return jobs
+
+
+def _generate_pdf(read_db, bill_id):
+    import pdfqueue
+
+    # Rendering happens in the pdfqueue worker processes, not in this request
+    bill, items = partitions.fetch_bill(read_db(), bill_id)
+
+    if not bill:
+        if wants_json():
+            return jsonify({"error": "Bill not found"}), 404
+        flash('Bill not found', 'danger')
+        return redirect(url_for('invoices'))
+
+    priority = pdfqueue.PRIORITIES.get(request.args.get('priority'), pdfqueue.PRIORITY_INVOICE)
+    start_pdf_workers()
+    job_id = pdfqueue.enqueue(Config.PDF_QUEUE_PATH, bill, items,
+                              filename=f"invoice_{bill[2]}.pdf", priority=priority)
+
+    if wants_json():
+        return jsonify({
+            "job_id": job_id,
+            "status": "queued",
+            "status_url": url_for('pdf_job', job_id=job_id),
+        }), 202
+    return redirect(url_for('pdf_job', job_id=job_id))
+
+
+def pdf_job(job_id):
+    """Poll a PDF job: the file once it is done, otherwise its status."""
+    import pdfqueue
+
+    job = pdfqueue.get_job(Config.PDF_QUEUE_PATH, job_id)
+    if job is None:
+        if wants_json():
+            return jsonify({"error": "Unknown job"}), 404
+        flash('PDF job not found', 'danger')
+        return redirect(url_for('invoices'))
+
+    if job['status'] == 'done' and not request.args.get('status'):
+        return send_file(job['output'], download_name=job['filename'],
+                         as_attachment=True, mimetype='application/pdf')
+
+    if wants_json() or request.args.get('status'):
+        body = {key: job[key] for key in ('id', 'status', 'error', 'queue_position')}
+        if job['status'] == 'done':
+            body['download_url'] = url_for('pdf_job', job_id=job_id)
+        return jsonify(body)
+    return render_template('pdf_job.html', job=job)
+
+
+def _print_receipt(read_db, bill_id):
+    """80 mm thermal receipt: ?format=pdf (default), text or escpos."""
+    import receipt
+
+    bill, items = receipt.fetch_receipt(read_db(), bill_id)
+    if not bill:
+        flash('Bill not found', 'danger')
+        return redirect(url_for('invoices'))
+
+    width = request.args.get('width', receipt.WIDTH, type=int)
+    fmt = request.args.get('format', 'pdf')
+    if fmt == 'text':
+        return Response(receipt.render_text(bill, items, width), mimetype='text/plain')
+    if fmt == 'escpos':
+        return Response(receipt.render_escpos(bill, items, width), mimetype='application/octet-stream',
+                        headers={'Content-Disposition': f'attachment; filename=receipt_{bill[0]}.bin'})
+    return Response(receipt.render_pdf(bill, items, width), mimetype='application/pdf',
+                    headers={'Content-Disposition': f'inline; filename=receipt_{bill[0]}.pdf'})
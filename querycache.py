@@ -0,0 +1,188 @@
+"""Per-process cache of read query results, invalidated by table versions.
+
+Every cached result records the tables it reads and their versions at the
+time it was fetched. Write routes call `invalidate(store_id, table, ...)`
+after they commit, which bumps that table's counter in a small memory-mapped
+file shared by every worker on the host; a result is served only while all
+of its tables still have the versions it was fetched at. Reading a version
+is a few bytes out of the mapping, with no database round trip, so a hit
+does not touch MySQL at all.
+
+Writes made outside this app (another host, the mysql client) do not bump
+the counters, and a replica may still be behind when a result is fetched,
+so entries also expire after QUERY_CACHE_TTL seconds.
+
+Memory is bounded by an estimate of the rows' size (QUERY_CACHE_MAX_BYTES),
+evicting least recently used results first. Set QUERY_CACHE=0 to bypass it.
+"""
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server only
+    fcntl = None
+
+
+SLOTS = 4096
+SLOT = struct.Struct('<Q')
+
+_state = {"enabled": True, "max_bytes": 64 * 1024 * 1024, "ttl": 30.0, "path": None}
+_entries = OrderedDict()
+_stats = {}
+_totals = {"bytes": 0, "evictions": 0}
+_lock = threading.Lock()
+
+
+def init_app(app):
+    _state["enabled"] = bool(app.config.get('QUERY_CACHE', True))
+    _state["max_bytes"] = app.config.get('QUERY_CACHE_MAX_BYTES', _state["max_bytes"])
+    _state["ttl"] = app.config.get('QUERY_CACHE_TTL', _state["ttl"])
+    _state["path"] = app.config.get('QUERY_CACHE_VERSIONS_PATH')
+
+
+class _Versions:
+    """Table version counters in a memory-mapped file, one 8-byte slot per (store, table).
+
+    Distinct tables may share a slot; that only invalidates a little more
+    than necessary.
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            if os.fstat(self.fd).st_size < SLOTS * SLOT.size:
+                os.ftruncate(self.fd, SLOTS * SLOT.size)
+            self.map = mmap.mmap(self.fd, SLOTS * SLOT.size)
+        else:
+            # No file configured: counters for this process only
+            self.fd = None
+            self.map = bytearray(SLOTS * SLOT.size)
+
+    @staticmethod
+    def slot(store_id, table):
+        return zlib.crc32(f"{store_id}:{table}".encode()) % SLOTS * SLOT.size
+
+    def get(self, store_id, table):
+        return SLOT.unpack_from(self.map, self.slot(store_id, table))[0]
+
+    def bump(self, store_id, table):
+        offset = self.slot(store_id, table)
+        with self.lock:
+            if self.fd is not None and fcntl is not None:
+                fcntl.flock(self.fd, fcntl.LOCK_EX)
+            try:
+                SLOT.pack_into(self.map, offset, SLOT.unpack_from(self.map, offset)[0] + 1)
+            finally:
+                if self.fd is not None and fcntl is not None:
+                    fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+
+_versions = {}
+
+
+def _table_versions():
+    # Opened on first use, after init_app, once per process
+    versions = _versions.get("store")
+    if versions is None:
+        with _lock:
+            versions = _versions.setdefault("store", _Versions(_state["path"]))
+    return versions
+
+
+def _size(rows):
+    """Rough bytes held by a fetchall() result, from its first row."""
+    if not rows:
+        return 64
+    first = rows[0]
+    values = first.values() if isinstance(first, dict) else first
+    return sys.getsizeof(rows) + len(rows) * (sys.getsizeof(first) + sum(sys.getsizeof(v) for v in values))
+
+
+def _count(name, outcome):
+    stats = _stats.setdefault(name, {"hits": 0, "misses": 0, "stale": 0, "bypassed": 0})
+    stats[outcome] += 1
+
+
+def fetch(get_conn, store_id, name, tables, sql, params=(), query=None):
+    """cursor.fetchall() for `sql`, from cache while `tables` are unchanged.
+
+    `name` identifies the query in the stats; the key also includes the
+    store and the parameters. `get_conn` is only called on a miss. Callers
+    must not modify the rows they get back: hits share them. `query(conn,
+    sql, params)` replaces the plain fetchall, for rows that carry more
+    (versions.tagged_query).
+    """
+    query = query or _query
+    if not _state["enabled"]:
+        _count(name, "bypassed")
+        return query(get_conn(), sql, params)
+
+    versions = _table_versions()
+    key = (name, store_id, tuple(params))
+    current = tuple(versions.get(store_id, table) for table in tables)
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[0] == current and entry[1] > now:
+            _entries.move_to_end(key)
+            _count(name, "hits")
+            return entry[2]
+        _count(name, "misses" if entry is None else "stale")
+
+    # Versions are read before the query, so a write that commits meanwhile
+    # makes this entry stale instead of hiding behind it
+    rows = query(get_conn(), sql, params)
+    size = _size(rows)
+    if size > _state["max_bytes"] // 4:
+        return rows
+    with _lock:
+        old = _entries.pop(key, None)
+        if old is not None:
+            _totals["bytes"] -= old[3]
+        _entries[key] = (current, now + _state["ttl"], rows, size)
+        _totals["bytes"] += size
+        while _totals["bytes"] > _state["max_bytes"]:
+            _, evicted = _entries.popitem(last=False)
+            _totals["bytes"] -= evicted[3]
+            _totals["evictions"] += 1
+    return rows
+
+
+def _query(conn, sql, params):
+    cur = conn.cursor()
+    cur.execute(sql, params)
+    rows = cur.fetchall()
+    cur.close()
+    return rows
+
+
+def invalidate(store_id, *tables):
+    """Call after committing a write to `tables`: every worker refetches their results."""
+    versions = _table_versions()
+    for table in tables:
+        versions.bump(store_id, table)
+
+
+def stats():
+    with _lock:
+        queries = {}
+        for name, counts in _stats.items():
+            lookups = counts["hits"] + counts["misses"] + counts["stale"]
+            queries[name] = dict(counts, hit_rate=round(counts["hits"] / lookups, 3) if lookups else None)
+        return {"enabled": _state["enabled"], "entries": len(_entries), "bytes": _totals["bytes"],
+                "max_bytes": _state["max_bytes"], "evictions": _totals["evictions"], "queries": queries}
+
+
+def clear():
+    with _lock:
+        _entries.clear()
+        _totals["bytes"] = 0
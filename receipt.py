@@ -0,0 +1,154 @@
+"""80 mm thermal receipts: plain text, ESC/POS bytes or a one-column PDF.
+
+Works from named columns (`fetch_receipt`) rather than the positional `b.*`
+row, and lays lines out by hand: no templates, no platypus. The PDF is drawn
+straight onto a canvas one text line at a time.
+
+48 columns is Font A on 80 mm paper (42 on printers with wider margins).
+"""
+import io
+
+from partitions import SOURCES
+
+
+WIDTH = 48
+
+RECEIPT_SQL = """
+    SELECT b.bill_number, b.created_at, b.payment_method, b.total_amount, b.discount_amount,
+           b.cgst_amount, b.sgst_amount, b.igst_amount, b.gst_amount, b.final_amount,
+           c.name, c.phone
+    FROM {table} b
+    LEFT JOIN customers c ON b.customer_id = c.id
+    WHERE b.id = %s
+"""
+
+RECEIPT_ITEMS_SQL = """
+    SELECT p.name, bi.quantity, bi.unit_price, bi.total_price
+    FROM {table} bi
+    JOIN products p ON bi.product_id = p.id
+    WHERE bi.bill_id = %s
+    ORDER BY bi.id
+"""
+
+SHOP_LINES = ("SHOP BILLING SYSTEM", "123 College Street", "Phone: (555) 123-4567")
+
+# ESC/POS control sequences
+ESC_INIT = b'\x1b@'
+ESC_CENTER = b'\x1ba\x01'
+ESC_LEFT = b'\x1ba\x00'
+ESC_BOLD_ON = b'\x1bE\x01'
+ESC_BOLD_OFF = b'\x1bE\x00'
+ESC_DOUBLE = b'\x1d!\x11'
+ESC_NORMAL = b'\x1d!\x00'
+ESC_FEED_CUT = b'\x1bd\x04\x1dV\x01'
+
+
+def fetch_receipt(conn, bill_id):
+    """(bill row, item rows) in receipt column order, hot tables then archive."""
+    cur = conn.cursor()
+    for bills_table, items_table in SOURCES:
+        cur.execute(RECEIPT_SQL.format(table=bills_table), (bill_id,))
+        bill = cur.fetchone()
+        if bill:
+            cur.execute(RECEIPT_ITEMS_SQL.format(table=items_table), (bill_id,))
+            items = cur.fetchall()
+            cur.close()
+            return bill, items
+    cur.close()
+    return None, ()
+
+
+def _money(value):
+    return f"{float(value or 0):.2f}"
+
+
+def _pair(left, right, width):
+    return f"{left[:width - len(right) - 1]:<{width - len(right)}}{right}"
+
+
+def lines(bill, items, width=WIDTH):
+    """The receipt as [(style, text)], style one of '', 'title', 'bold', 'center'."""
+    (number, created_at, payment, subtotal, discount,
+     cgst, sgst, igst, gst, final, customer, phone) = bill
+    rule = '-' * width
+    out = [('title', SHOP_LINES[0])]
+    out.extend(('center', text) for text in SHOP_LINES[1:])
+    out.append(('', rule))
+    out.append(('', _pair(f"Bill: {number}", created_at.strftime('%d-%m-%Y %H:%M') if created_at else '', width)))
+    if customer:
+        out.append(('', f"Customer: {customer}"[:width]))
+    if phone:
+        out.append(('', f"Phone: {phone}"[:width]))
+    out.append(('', rule))
+
+    # name on its own line, then "qty x price ... total" under it
+    for name, qty, price, total in items:
+        out.append(('', str(name)[:width]))
+        out.append(('', _pair(f"  {qty} x {_money(price)}", _money(total), width)))
+    out.append(('', rule))
+
+    out.append(('', _pair("Subtotal", _money(subtotal), width)))
+    if discount:
+        out.append(('', _pair("Discount", '-' + _money(discount), width)))
+    if igst:
+        out.append(('', _pair("IGST", _money(igst), width)))
+    elif cgst or sgst:
+        out.append(('', _pair("CGST", _money(cgst), width)))
+        out.append(('', _pair("SGST", _money(sgst), width)))
+    elif gst:
+        out.append(('', _pair("GST", _money(gst), width)))
+    out.append(('bold', _pair("TOTAL Rs.", _money(final), width)))
+    if payment:
+        out.append(('', _pair("Paid by", str(payment), width)))
+    out.append(('', rule))
+    out.append(('center', "Thank you! Visit again."))
+    return out
+
+
+def render_text(bill, items, width=WIDTH):
+    return '\n'.join(text.center(width) if style in ('title', 'center') else text
+                     for style, text in lines(bill, items, width)) + '\n'
+
+
+def render_escpos(bill, items, width=WIDTH, encoding='cp437'):
+    """Raw bytes for an ESC/POS printer, ending with feed and partial cut."""
+    out = bytearray(ESC_INIT)
+    for style, text in lines(bill, items, width):
+        data = text.encode(encoding, 'replace')
+        if style == 'title':
+            out += ESC_CENTER + ESC_DOUBLE + data[:width // 2] + ESC_NORMAL + b'\n' + ESC_LEFT
+        elif style == 'center':
+            out += ESC_CENTER + data + b'\n' + ESC_LEFT
+        elif style == 'bold':
+            out += ESC_BOLD_ON + data + ESC_BOLD_OFF + b'\n'
+        else:
+            out += data + b'\n'
+    out += ESC_FEED_CUT
+    return bytes(out)
+
+
+def render_pdf(bill, items, width=WIDTH):
+    """A single 80 mm wide page, as tall as the receipt, in Courier."""
+    from reportlab.lib.units import mm
+    from reportlab.pdfgen import canvas
+
+    rows = lines(bill, items, width)
+    page_width = 80 * mm
+    margin = 4 * mm
+    font_size = (page_width - 2 * margin) / (width * 0.6)
+    leading = font_size * 1.25
+    page_height = 2 * margin + leading * len(rows)
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=(page_width, page_height), pageCompression=0)
+    y = page_height - margin - font_size
+    for style, text in rows:
+        pdf.setFont('Courier-Bold' if style in ('title', 'bold') else 'Courier', font_size)
+        if style in ('title', 'center'):
+            pdf.drawCentredString(page_width / 2, y, text)
+        else:
+            pdf.drawString(margin, y, text)
+        y -= leading
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
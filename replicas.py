@@ -0,0 +1,214 @@
+"""Read-replica routing for read-only queries.
+
+Read routes call `read_connection()` instead of `mysql.connection`. It hands
+out a connection to a healthy replica when one is configured and within the
+lag budget, and falls back to the primary otherwise. Writes always use the
+primary through `mysql.connection` as before.
+
+Right after a user writes something their reads are pinned to the primary for
+`READ_AFTER_WRITE_SECONDS`, so a bill that was just created is always visible
+on the next page.
+
+Each server thread keeps one connection per replica across requests, checked
+with `ping()` before use and rolled back after each request so the next one
+reads a fresh snapshot.
+"""
+import itertools
+import os
+import threading
+import time
+
+import MySQLdb
+import MySQLdb.cursors
+from flask import current_app, g, request, session
+
+
+_state = {
+    "mysql": None,
+    "replicas": [],
+    "max_lag": 5,
+    "lag_check": 10,
+    "sticky": 5,
+}
+_lag = {}
+_rotation = None
+_metrics = {}
+_lock = threading.Lock()
+# Per thread: (pid, {replica index: connection}); the pid check drops
+# connections inherited across a fork
+_local = threading.local()
+
+WRITE_ENDPOINTS = {'delete_product', 'delete_customer'}
+
+
+def parse_replicas(value):
+    replicas = []
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        host, _, port = part.partition(':')
+        replicas.append((host, int(port) if port else 3306))
+    return replicas
+
+
+def init_app(app, mysql):
+    global _rotation
+    _state["mysql"] = mysql
+    _state["replicas"] = parse_replicas(app.config.get('MYSQL_REPLICAS'))
+    _state["max_lag"] = app.config.get('REPLICA_MAX_LAG_SECONDS', 5)
+    _state["lag_check"] = app.config.get('REPLICA_LAG_CHECK_SECONDS', 10)
+    _state["sticky"] = app.config.get('READ_AFTER_WRITE_SECONDS', 5)
+    _rotation = itertools.cycle(range(len(_state["replicas"]))) if _state["replicas"] else None
+
+    app.after_request(_remember_write)
+    app.teardown_appcontext(_close_replica)
+
+
+def _remember_write(response):
+    if request.method == 'POST' or request.endpoint in WRITE_ENDPOINTS:
+        session['primary_until'] = time.time() + _state["sticky"]
+    return response
+
+
+def _close_replica(exc):
+    conn = g.pop('_replica_conn', None)
+    if conn is None:
+        return
+    try:
+        # End the read snapshot; the connection itself stays with the thread
+        conn.rollback()
+    except MySQLdb.Error:
+        _discard(g.pop('_replica_index'), conn)
+
+
+def _thread_connections():
+    pid, conns = getattr(_local, 'conns', (None, None))
+    if pid != os.getpid():
+        conns = {}
+        _local.conns = (os.getpid(), conns)
+    return conns
+
+
+def _discard(index, conn):
+    _thread_connections().pop(index, None)
+    try:
+        conn.close()
+    except MySQLdb.Error:
+        pass
+
+
+def _replica_connection(index):
+    """This thread's connection to replica `index`, reconnecting if it went away."""
+    conns = _thread_connections()
+    conn = conns.get(index)
+    if conn is not None:
+        try:
+            conn.ping()
+            return conn
+        except MySQLdb.Error:
+            _discard(index, conn)
+    host, port = _state["replicas"][index]
+    conn = conns[index] = _connect(host, port)
+    return conn
+
+
+def _connect(host, port):
+    app_config = current_app.config
+    return MySQLdb.connect(
+        host=host,
+        port=port,
+        user=app_config['MYSQL_USER'],
+        passwd=app_config['MYSQL_PASSWORD'],
+        db=app_config['MYSQL_DB'],
+        connect_timeout=2,
+        charset='utf8mb4',
+    )
+
+
+def _replica_lag(index, conn):
+    """Seconds behind the primary, cached for REPLICA_LAG_CHECK_SECONDS. None if unknown."""
+    now = time.time()
+    checked = _lag.get(index)
+    if checked and now - checked[0] < _state["lag_check"]:
+        return checked[1]
+
+    lag = None
+    cur = conn.cursor(MySQLdb.cursors.DictCursor)
+    for statement in ("SHOW REPLICA STATUS", "SHOW SLAVE STATUS"):
+        try:
+            cur.execute(statement)
+        except MySQLdb.Error:
+            continue
+        row = cur.fetchone() or {}
+        lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+        break
+    cur.close()
+    _lag[index] = (now, lag)
+    return lag
+
+
+def _may_be_healthy(index):
+    checked = _lag.get(index)
+    if not checked or time.time() - checked[0] >= _state["lag_check"]:
+        return True
+    return checked[1] is not None and checked[1] <= _state["max_lag"]
+
+
+def _record(target):
+    key = (request.endpoint or '-', target)
+    with _lock:
+        _metrics[key] = _metrics.get(key, 0) + 1
+
+
+def read_connection():
+    """Connection for read-only queries in the current request.
+
+    The routing decision is made once per request and counted once.
+    """
+    target = g.get('_read_target')
+    if target is None:
+        target = _choose()
+        g._read_target = target
+        _record(target)
+    if target == 'replica':
+        return g._replica_conn
+    return _state["mysql"].connection
+
+
+def _choose():
+    if not _state["replicas"]:
+        return 'primary'
+    if session.get('primary_until', 0) > time.time():
+        return 'primary-after-write'
+
+    for _ in range(len(_state["replicas"])):
+        index = next(_rotation)
+        if not _may_be_healthy(index):
+            continue
+        try:
+            conn = _replica_connection(index)
+            lag = _replica_lag(index, conn)
+        except MySQLdb.Error:
+            _lag[index] = (time.time(), None)
+            continue
+        if lag is not None and lag <= _state["max_lag"]:
+            g._replica_conn = conn
+            g._replica_index = index
+            return 'replica'
+    return 'primary-fallback'
+
+
+def routing_metrics():
+    with _lock:
+        counts = dict(_metrics)
+    return {
+        "replicas": [
+            {"host": host, "port": port, "lag": _lag.get(i, (None, None))[1]}
+            for i, (host, port) in enumerate(_state["replicas"])
+        ],
+        "routes": [
+            {"endpoint": endpoint, "target": target, "count": count}
+            for (endpoint, target), count in sorted(counts.items())
+        ],
+    }
@@ -0,0 +1,286 @@
+"""Sales reporting over pre-aggregated fact tables.
+
+Report queries never touch `bills`/`bill_items` directly. `refresh_facts`
+folds newly created bills into daily fact tables, keyed by a bill id
+watermark, so each refresh only reads the bills added since the last one.
+
+Bill ids are handed out at insert but become visible at commit, so bill 101
+can be visible while bill 100 is still being written. The watermark only
+moves past bills created more than SETTLE_SECONDS ago, by which time every
+bill with a lower id has committed too.
+"""
+import datetime
+
+
+REFRESH_BATCH = 5000
+SETTLE_SECONDS = 60
+# Held while folding, so the job and `flask refresh-reports` never fold the same bills twice
+LOCK_NAME = 'report_watermark'
+LOCK_WAIT_SECONDS = 30
+
+
+def _watermark(cur):
+    cur.execute("SELECT last_bill_id FROM report_watermark WHERE name = 'sales'")
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+
+def refresh_facts(conn, batch=REFRESH_BATCH, settle_seconds=SETTLE_SECONDS):
+    """Aggregate settled bills newer than the watermark into the fact tables.
+
+    Works through the new bills in id ranges of `batch` so a large backlog
+    never holds long locks on the billing tables. Returns the number of
+    bills folded in, or None if another refresh held the lock throughout.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_WAIT_SECONDS))
+    if not cur.fetchone()[0]:
+        cur.close()
+        return None
+    try:
+        return _fold(conn, cur, batch, settle_seconds)
+    finally:
+        cur.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cur.fetchone()
+        cur.close()
+
+
+def _fold(conn, cur, batch, settle_seconds):
+    done = 0
+    while True:
+        low = _watermark(cur)
+        # Stop short of the first bill that has not settled, whatever follows it
+        cur.execute("SELECT MIN(id) FROM bills WHERE id > %s AND created_at >= NOW() - INTERVAL %s SECOND",
+                    (low, settle_seconds))
+        unsettled = cur.fetchone()[0]
+        cur.execute("""
+            SELECT MAX(id), COUNT(*) FROM (
+                SELECT id FROM bills WHERE id > %s AND id < %s ORDER BY id LIMIT %s) t
+        """, (low, unsettled if unsettled is not None else 2**63 - 1, batch))
+        high, count = cur.fetchone()
+        if not count:
+            break
+
+        cur.execute("""
+            INSERT INTO sales_fact_product (sale_date, product_id, quantity, revenue)
+            SELECT DATE(b.created_at), bi.product_id, SUM(bi.quantity), SUM(bi.total_price)
+            FROM bills b
+            JOIN bill_items bi ON bi.bill_id = b.id
+            WHERE b.id > %s AND b.id <= %s
+            GROUP BY DATE(b.created_at), bi.product_id
+            ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity),
+                                    revenue = revenue + VALUES(revenue)
+        """, (low, high))
+
+        cur.execute("""
+            INSERT INTO sales_fact_hourly (sale_date, sale_hour, payment_method, bill_count, revenue)
+            SELECT DATE(created_at), HOUR(created_at), COALESCE(payment_method, 'Unknown'),
+                   COUNT(*), COALESCE(SUM(final_amount), 0)
+            FROM bills
+            WHERE id > %s AND id <= %s
+            GROUP BY DATE(created_at), HOUR(created_at), COALESCE(payment_method, 'Unknown')
+            ON DUPLICATE KEY UPDATE bill_count = bill_count + VALUES(bill_count),
+                                    revenue = revenue + VALUES(revenue)
+        """, (low, high))
+
+        cur.execute("""
+            INSERT INTO sales_fact_customer (sale_date, customer_id, bill_count, revenue)
+            SELECT DATE(created_at), customer_id, COUNT(*), COALESCE(SUM(final_amount), 0)
+            FROM bills
+            WHERE id > %s AND id <= %s AND customer_id IS NOT NULL
+            GROUP BY DATE(created_at), customer_id
+            ON DUPLICATE KEY UPDATE bill_count = bill_count + VALUES(bill_count),
+                                    revenue = revenue + VALUES(revenue)
+        """, (low, high))
+
+        cur.execute("""
+            INSERT INTO report_watermark (name, last_bill_id) VALUES ('sales', %s)
+            ON DUPLICATE KEY UPDATE last_bill_id = VALUES(last_bill_id)
+        """, (high,))
+        conn.commit()
+        done += count
+    return done
+
+
+def parse_range(start, end, default_days=30):
+    """Turn optional YYYY-MM-DD strings into an inclusive (start, end) date pair."""
+    today = datetime.date.today()
+    end_date = datetime.datetime.strptime(end, "%Y-%m-%d").date() if end else today
+    if start:
+        start_date = datetime.datetime.strptime(start, "%Y-%m-%d").date()
+    else:
+        start_date = end_date - datetime.timedelta(days=default_days - 1)
+    if start_date > end_date:
+        start_date, end_date = end_date, start_date
+    return start_date, end_date
+
+
+def sales_by_product(conn, start, end, limit=50):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT f.product_id, p.name, SUM(f.quantity), SUM(f.revenue)
+        FROM sales_fact_product f
+        LEFT JOIN products p ON p.id = f.product_id
+        WHERE f.sale_date BETWEEN %s AND %s
+        GROUP BY f.product_id, p.name
+        ORDER BY SUM(f.revenue) DESC
+        LIMIT %s
+    """, (start, end, limit))
+    rows = cur.fetchall()
+    cur.close()
+    return [{"product_id": r[0], "name": r[1], "quantity": int(r[2]), "revenue": float(r[3])}
+            for r in rows]
+
+
+def sales_by_category(conn, start, end):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT COALESCE(p.category, 'Uncategorised'), SUM(f.quantity), SUM(f.revenue)
+        FROM sales_fact_product f
+        LEFT JOIN products p ON p.id = f.product_id
+        WHERE f.sale_date BETWEEN %s AND %s
+        GROUP BY COALESCE(p.category, 'Uncategorised')
+        ORDER BY SUM(f.revenue) DESC
+    """, (start, end))
+    rows = cur.fetchall()
+    cur.close()
+    return [{"category": r[0], "quantity": int(r[1]), "revenue": float(r[2])} for r in rows]
+
+
+def hourly_heatmap(conn, start, end):
+    """Revenue per (weekday, hour) cell; weekday 0 is Monday."""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT WEEKDAY(sale_date), sale_hour, SUM(bill_count), SUM(revenue)
+        FROM sales_fact_hourly
+        WHERE sale_date BETWEEN %s AND %s
+        GROUP BY WEEKDAY(sale_date), sale_hour
+    """, (start, end))
+    rows = cur.fetchall()
+    cur.close()
+
+    bills = [[0] * 24 for _ in range(7)]
+    revenue = [[0.0] * 24 for _ in range(7)]
+    for weekday, hour, count, amount in rows:
+        bills[weekday][hour] = int(count)
+        revenue[weekday][hour] = float(amount)
+    return {"days": ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"],
+            "bills": bills, "revenue": revenue}
+
+
+def payment_mix(conn, start, end):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT payment_method, SUM(bill_count), SUM(revenue)
+        FROM sales_fact_hourly
+        WHERE sale_date BETWEEN %s AND %s
+        GROUP BY payment_method
+        ORDER BY SUM(revenue) DESC
+    """, (start, end))
+    rows = cur.fetchall()
+    cur.close()
+    return [{"payment_method": r[0], "bills": int(r[1]), "revenue": float(r[2])} for r in rows]
+
+
+def top_customers(conn, start, end, limit=10):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT f.customer_id, c.name, SUM(f.bill_count), SUM(f.revenue)
+        FROM sales_fact_customer f
+        LEFT JOIN customers c ON c.id = f.customer_id
+        WHERE f.sale_date BETWEEN %s AND %s
+        GROUP BY f.customer_id, c.name
+        ORDER BY SUM(f.revenue) DESC
+        LIMIT %s
+    """, (start, end, limit))
+    rows = cur.fetchall()
+    cur.close()
+    return [{"customer_id": r[0], "name": r[1], "bills": int(r[2]), "revenue": float(r[3])}
+            for r in rows]
+
+
+def daily_totals(conn, start, end):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT sale_date, SUM(bill_count), SUM(revenue)
+        FROM sales_fact_hourly
+        WHERE sale_date BETWEEN %s AND %s
+        GROUP BY sale_date
+        ORDER BY sale_date
+    """, (start, end))
+    rows = cur.fetchall()
+    cur.close()
+    return [{"date": r[0].strftime("%Y-%m-%d"), "bills": int(r[1]), "revenue": float(r[2])}
+            for r in rows]
+
+
+def total_bill_count(conn):
+    """All-time bill count: fact totals plus bills newer than the watermark."""
+    cur = conn.cursor()
+    cur.execute("SELECT COALESCE(SUM(bill_count), 0) FROM sales_fact_hourly")
+    folded = cur.fetchone()[0]
+    cur.execute("SELECT COUNT(*) FROM bills WHERE id > %s", (_watermark(cur),))
+    recent = cur.fetchone()[0]
+    cur.close()
+    return int(folded) + recent
+
+
+def customer_totals(conn, customer_id):
+    """(bill count, amount spent) for one customer, without scanning old bills."""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT COALESCE(SUM(bill_count), 0), COALESCE(SUM(revenue), 0)
+        FROM sales_fact_customer WHERE customer_id = %s
+    """, (customer_id,))
+    folded_count, folded_spent = cur.fetchone()
+    cur.execute("""
+        SELECT COUNT(*), COALESCE(SUM(final_amount), 0)
+        FROM bills WHERE id > %s AND customer_id = %s
+    """, (_watermark(cur), customer_id))
+    recent_count, recent_spent = cur.fetchone()
+    cur.close()
+    return int(folded_count) + recent_count, folded_spent + recent_spent
+
+
+# Keys used to line up rows from different stores in a cross-store report.
+# Product and customer ids are per shard, so those merge by name.
+MERGE_KEYS = {
+    "products": "name",
+    "categories": "category",
+    "payments": "payment_method",
+    "customers": "name",
+    "daily": "date",
+}
+
+
+def combine(name, per_store):
+    """Merge one report's results from several stores into a single result."""
+    results = list(per_store.values())
+    if name == "hourly":
+        combined = {"days": results[0]["days"] if results else [],
+                    "bills": [[0] * 24 for _ in range(7)],
+                    "revenue": [[0.0] * 24 for _ in range(7)]}
+        for result in results:
+            for d in range(7):
+                for h in range(24):
+                    combined["bills"][d][h] += result["bills"][d][h]
+                    combined["revenue"][d][h] += result["revenue"][d][h]
+        return combined
+
+    key = MERGE_KEYS[name]
+    merged = {}
+    for result in results:
+        for row in result:
+            target = merged.get(row[key])
+            if target is None:
+                merged[row[key]] = {k: v for k, v in row.items() if not k.endswith("_id")}
+                continue
+            for field in ("quantity", "bills", "revenue"):
+                if field in row:
+                    target[field] += row[field]
+    rows = list(merged.values())
+    if name == "daily":
+        rows.sort(key=lambda r: r["date"])
+    else:
+        rows.sort(key=lambda r: r["revenue"], reverse=True)
+    return rows
@@ -0,0 +1,178 @@
+"""Per-store routing of bills, customers and stock to database shards.
+
+The `stores` table (in the main database) maps each store to a shard: a
+MySQL host/port/database holding that store's `products`, `customers`,
+`bills` and `bill_items`. A store with no `db_name` lives in the main
+database; that is the default, single-store setup. Each shard database holds
+exactly one store, since nothing filters on `bills.store_id`: a second store
+pointing at a database already taken (the main one included) is left out of
+the map, with an error in the log.
+
+A store that is not in the map, or any store before the map has loaded once,
+raises `StoreUnavailable` (a 503) rather than falling back to the main
+database.
+
+Requests use `connection()`, which follows the logged-in user's store.
+Cross-store reports use `scatter_gather()`, which queries every shard in
+parallel on its own connection.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import MySQLdb
+from flask import current_app, g
+from flask_login import current_user
+from werkzeug.exceptions import ServiceUnavailable
+
+
+DEFAULT_STORE_ID = 1
+
+# "stores" is replaced whole on refresh, never changed in place, so readers
+# need no lock and never see a half-loaded map
+_state = {"mysql": None, "cache_seconds": 60, "stores": {}, "loaded_at": 0.0, "loaded": False}
+_lock = threading.Lock()
+
+
+class StoreUnavailable(ServiceUnavailable):
+    description = 'Store database unavailable, please retry shortly'
+
+
+def init_app(app, mysql):
+    _state["mysql"] = mysql
+    _state["cache_seconds"] = app.config.get('STORE_CACHE_SECONDS', 60)
+    app.teardown_appcontext(_close_shards)
+
+
+def _close_shards(exc):
+    for conn in g.pop('_shard_conns', {}).values():
+        conn.close()
+
+
+def load_stores(force=False):
+    """Store id -> shard settings, cached for STORE_CACHE_SECONDS.
+
+    If the stores table cannot be read, the previous map stays in use and
+    the next call tries again. DEFAULT_STORE_ID is in the map even without a
+    row, in the main database unless its row names a shard.
+    """
+    if not force and time.time() - _state["loaded_at"] < _state["cache_seconds"]:
+        return _state["stores"]
+    with _lock:
+        if not force and time.time() - _state["loaded_at"] < _state["cache_seconds"]:
+            return _state["stores"]
+        cur = _state["mysql"].connection.cursor()
+        try:
+            cur.execute("SELECT id, name, db_host, db_port, db_name FROM stores")
+            rows = cur.fetchall()
+        except MySQLdb.Error:
+            current_app.logger.warning("Could not load the store map; keeping the previous one", exc_info=True)
+            return _state["stores"]
+        finally:
+            cur.close()
+        stores = {store_id: {"name": name, "host": host, "port": port or 3306, "db": db}
+                  for store_id, name, host, port, db in rows}
+        stores.setdefault(DEFAULT_STORE_ID, {"name": None, "host": None, "port": 3306, "db": None})
+        _state["stores"] = _one_store_per_database(stores)
+        _state["loaded_at"] = time.time()
+        _state["loaded"] = True
+    return _state["stores"]
+
+
+def _one_store_per_database(stores):
+    """Drop every store whose database another store already holds; the default
+    store keeps the main database, otherwise the lowest id wins."""
+    config = current_app.config
+    main = (config['MYSQL_HOST'], config['MYSQL_PORT'], config['MYSQL_DB'])
+    owners = {}
+    for store_id in sorted(stores, key=lambda i: (i != DEFAULT_STORE_ID, i)):
+        store = stores[store_id]
+        target = (store["host"] or config['MYSQL_HOST'], store["port"], store["db"]) if store["db"] else main
+        if target in owners:
+            current_app.logger.error("Store %s shares database %s with store %s; it is unavailable until it has its own",
+                                     store_id, target[2], owners[target])
+            continue
+        owners[target] = store_id
+    return {store_id: stores[store_id] for store_id in owners.values()}
+
+
+def current_store_id():
+    store_id = getattr(current_user, 'store_id', None)
+    return store_id or DEFAULT_STORE_ID
+
+
+def _shard(store_id):
+    """(host, port, db) of the store's shard, or None for the main database."""
+    store = load_stores().get(store_id)
+    if store is None or not _state["loaded"]:
+        raise StoreUnavailable(retry_after=_state["cache_seconds"])
+    if not store["db"]:
+        return None
+    return (store["host"] or current_app.config['MYSQL_HOST'], store["port"], store["db"])
+
+
+def is_default(store_id=None):
+    return _shard(store_id or current_store_id()) is None
+
+
+def _connect(shard):
+    config = current_app.config
+    host, port, db = shard
+    return MySQLdb.connect(host=host, port=port, user=config['MYSQL_USER'],
+                           passwd=config['MYSQL_PASSWORD'], db=db, charset='utf8mb4')
+
+
+def connection(store_id=None):
+    """Connection to the shard holding `store_id` (default: the user's store)."""
+    shard = _shard(store_id or current_store_id())
+    if shard is None:
+        return _state["mysql"].connection
+    conns = g.setdefault('_shard_conns', {})
+    if shard not in conns:
+        conns[shard] = _connect(shard)
+    return conns[shard]
+
+
+def store_ids():
+    stores = load_stores()
+    if not _state["loaded"]:
+        raise StoreUnavailable(retry_after=_state["cache_seconds"])
+    return sorted(stores)
+
+
+def for_each_shard(fn):
+    """Call `fn(conn, store_id)` once per store, sequentially. Used by background jobs.
+
+    Raises StoreUnavailable until the store map has loaded, so a job never
+    mistakes the main database for every store's.
+    """
+    results = {}
+    for store_id in store_ids():
+        results[store_id] = fn(connection(store_id), store_id)
+    return results
+
+
+def scatter_gather(fn, only=None, max_workers=8):
+    """Run `fn(conn, store_id)` on every store's shard in parallel.
+
+    Each call gets a private connection (request connections are not thread
+    safe). Returns {store_id: result}.
+    """
+    ids = only or store_ids()
+    config = current_app.config
+    targets = {}
+    for store_id in ids:
+        shard = _shard(store_id) or (config['MYSQL_HOST'], config['MYSQL_PORT'], config['MYSQL_DB'])
+        targets[store_id] = shard
+    app = current_app._get_current_object()
+
+    def run(store_id):
+        with app.app_context():
+            conn = _connect(targets[store_id])
+            try:
+                return store_id, fn(conn, store_id)
+            finally:
+                conn.close()
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(ids)) or 1) as pool:
+        return dict(pool.map(run, ids))
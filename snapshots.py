@@ -0,0 +1,125 @@
+"""Warm-start snapshots of in-process caches.
+
+Caches that every worker builds from MySQL (the fuzzy product index) would
+otherwise be rebuilt by all workers at once on every deploy. The background
+job leader writes their state to WARM_SNAPSHOT_PATH every
+WARM_SNAPSHOT_SECONDS, if anything changed. The gunicorn master maps the file
+before it forks (wsgi.py), so workers start with the caches in memory and
+only pull the changes made since the snapshot was written.
+
+File layout:
+
+  8s   magic
+  I    header length
+  ...  header (JSON): Python version, and per section its cache, store,
+       version and the offset and length of its payload
+  ...  payloads, one marshal blob per (cache, store)
+
+A section's version is the table change counter its cache follows (for the
+fuzzy index, catalog_version), so a reader can tell from the header alone
+whether the payload is newer than what it has. marshal's format depends on
+the Python version; a snapshot written by another version is ignored.
+"""
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+import time
+
+
+MAGIC = b'WARMSNP1'
+PREFIX = struct.Struct('<8sI')
+PYTHON = f"{sys.version_info[0]}.{sys.version_info[1]}/{marshal.version}"
+
+# name -> (versions() -> {store_id: version},
+#          dump(store_id, encode) -> (version, encode(state)), encoding under the cache's lock,
+#          restore(store_id, version, state) -> bool)
+CACHES = {}
+
+
+def register(name, versions, dump, restore):
+    CACHES[name] = (versions, dump, restore)
+
+
+def _parse(data):
+    """(header, payload offset) from the start of a snapshot, or (None, 0)."""
+    try:
+        magic, length = PREFIX.unpack_from(data)
+        header = json.loads(bytes(data[PREFIX.size:PREFIX.size + length]))
+    except (ValueError, struct.error):
+        return None, 0
+    if magic != MAGIC or header.get("python") != PYTHON:
+        return None, 0
+    return header, PREFIX.size + length
+
+
+def read_header(path):
+    """The snapshot's header, or None if there is no usable snapshot at `path`."""
+    try:
+        with open(path, 'rb') as f:
+            prefix = f.read(PREFIX.size)
+            return _parse(prefix + f.read(PREFIX.unpack(prefix)[1]))[0]
+    except (OSError, struct.error):
+        return None
+
+
+def write(path):
+    """Write every registered cache's state to `path`, unless the file already has these versions."""
+    started = time.perf_counter()
+    current = {(name, store_id): version for name, (versions, _, _) in CACHES.items()
+               for store_id, version in versions().items() if version}
+    existing = read_header(path)
+    if existing is not None and _versions(existing["sections"]) == current:
+        return {"written": False, "sections": len(current)}
+
+    blobs, sections, offset = [], [], 0
+    for name, store_id in sorted(current):
+        version, blob = CACHES[name][1](store_id, marshal.dumps)
+        sections.append({"cache": name, "store": store_id, "version": version,
+                         "offset": offset, "length": len(blob)})
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = json.dumps({"python": PYTHON, "written_at": time.time(), "sections": sections}).encode()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(PREFIX.pack(MAGIC, len(header)))
+        f.write(header)
+        for blob in blobs:
+            f.write(blob)
+    # Readers see the old file or the new one, never half of one
+    os.replace(tmp, path)
+    return {"written": True, "sections": len(sections), "bytes": PREFIX.size + len(header) + offset,
+            "ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+def _versions(sections):
+    return {(s["cache"], s["store"]): s["version"] for s in sections}
+
+
+def load(path):
+    """Restore every section newer than what this process has. Returns a summary."""
+    started = time.perf_counter()
+    restored = skipped = 0
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            # Header and payloads from the same mapping: the leader may replace the file meanwhile
+            header, base = _parse(mapped)
+            if header is None:
+                return {"restored": 0, "skipped": 0}
+            for section in header["sections"]:
+                cache = CACHES.get(section["cache"])
+                if cache is None or cache[0]().get(section["store"], 0) >= section["version"]:
+                    skipped += 1
+                    continue
+                start = base + section["offset"]
+                with memoryview(mapped)[start:start + section["length"]] as payload:
+                    state = marshal.loads(payload)
+                restored += cache[2](section["store"], section["version"], state)
+    except (OSError, ValueError):
+        return {"restored": 0, "skipped": 0}
+    return {"restored": restored, "skipped": skipped, "age_seconds": round(time.time() - header["written_at"]),
+            "ms": round((time.perf_counter() - started) * 1000, 1)}
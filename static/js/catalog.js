@@ -0,0 +1,143 @@
+// Local product catalog for the billing screen.
+//
+// Keeps a copy of the store's products in IndexedDB, kept current from
+// /api/products/changes (see catalog.py), so lookups run in the browser
+// instead of hitting the server on every keystroke. Falls back to the
+// server while the copy is empty or IndexedDB is unavailable.
+//
+// Each store gets its own database, and the copy remembers which catalog
+// (store and database epoch) its versions belong to; the server answers a
+// copy of another catalog with a full reset.
+
+const LocalCatalog = (function() {
+    const SYNC_INTERVAL_MS = 30000;
+    let dbName = 'shop-catalog';
+    let products = new Map();
+    let version = 0;
+    let catalog = null;
+    let ready = false;
+    let syncing = null;
+
+    function openDb() {
+        return new Promise((resolve, reject) => {
+            const request = indexedDB.open(dbName, 1);
+            request.onupgradeneeded = () => {
+                request.result.createObjectStore('products', { keyPath: 'id' });
+                request.result.createObjectStore('meta');
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    function done(tx) {
+        return new Promise((resolve, reject) => {
+            tx.oncomplete = resolve;
+            tx.onerror = () => reject(tx.error);
+            tx.onabort = () => reject(tx.error);
+        });
+    }
+
+    async function load(db) {
+        const tx = db.transaction(['products', 'meta'], 'readonly');
+        const all = tx.objectStore('products').getAll();
+        const meta = tx.objectStore('meta').get('version');
+        const owner = tx.objectStore('meta').get('catalog');
+        await done(tx);
+        products = new Map(all.result.map(p => [p.id, p]));
+        version = meta.result || 0;
+        catalog = owner.result || null;
+    }
+
+    async function apply(db, feed) {
+        const tx = db.transaction(['products', 'meta'], 'readwrite');
+        const store = tx.objectStore('products');
+        if (feed.reset) {
+            store.clear();
+            products.clear();
+        }
+        feed.upserts.forEach(p => { store.put(p); products.set(p.id, p); });
+        feed.deletes.forEach(id => { store.delete(id); products.delete(id); });
+        tx.objectStore('meta').put(feed.version, 'version');
+        tx.objectStore('meta').put(feed.catalog, 'catalog');
+        await done(tx);
+        version = feed.version;
+        catalog = feed.catalog;
+    }
+
+    async function syncOnce() {
+        const db = await openDb();
+        if (!ready) {
+            // Last session's copy is usable right away, even offline
+            await load(db);
+            ready = products.size > 0;
+        }
+        let more = true;
+        let resume = null;
+        while (more) {
+            const params = new URLSearchParams({ since: version });
+            if (catalog) params.set('catalog', catalog);
+            // Continues a full copy that spans several pages
+            if (resume) params.set('resume', resume);
+            const r = await fetch(`/api/products/changes?${params}`);
+            if (!r.ok) throw new Error(`catalog sync failed: ${r.status}`);
+            const feed = await r.json();
+            if (!feed.reset && catalog && feed.catalog !== catalog) {
+                // Versions from another catalog: start over from a full copy
+                version = 0;
+                resume = null;
+                continue;
+            }
+            await apply(db, feed);
+            more = feed.more;
+            resume = feed.resume;
+        }
+        db.close();
+        ready = products.size > 0;
+    }
+
+    function sync() {
+        if (!window.indexedDB) return Promise.resolve();
+        if (!syncing) {
+            syncing = syncOnce()
+                .catch(err => console.warn(err))
+                .finally(() => { syncing = null; });
+        }
+        return syncing;
+    }
+
+    // Exact id for digits, otherwise names containing q, most popular first
+    // (scores as of the last sync). Plainer than /api/product/lookup, which
+    // also ranks misspellings, prefixes and sound-alikes (fuzzy.py), so the
+    // two can differ; the billing page asks the server when nothing matches.
+    function lookup(q) {
+        if (!ready) return null;
+        q = q.trim();
+        if (/^\d+$/.test(q)) {
+            const p = products.get(Number(q));
+            return p ? [p] : [];
+        }
+        const needle = q.toLowerCase();
+        const matches = [];
+        for (const p of products.values()) {
+            if (p.name && p.name.toLowerCase().includes(needle)) matches.push(p);
+        }
+        matches.sort((a, b) => (b.score - a.score) || a.name.localeCompare(b.name));
+        return matches.slice(0, 10);
+    }
+
+    function start(storeId) {
+        if (storeId != null) {
+            dbName = `shop-catalog-${storeId}`;
+            // Copies used to share one database across stores; drop it
+            if (window.indexedDB) indexedDB.deleteDatabase('shop-catalog');
+        }
+        sync();
+        setInterval(sync, SYNC_INTERVAL_MS);
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'visible') sync();
+        });
+    }
+
+    return { start, sync, lookup };
+})();
@@ -0,0 +1,87 @@
+"""Change versions of tables, and conditional GET on top of them.
+
+A table's version is a counter that every write to it advances in the same
+transaction: products use the change feed's `catalog_version` (catalog.bump),
+customers their row in `table_versions` (`bump`, migration 0012). Reading a
+version is one primary-key lookup, whatever the size of the table.
+
+Writers hold the counter row until they commit, so writes to one table are
+serialised on it. For products that is already the case for the change
+feed (bills bump it for the stock they take); customers change only on
+adds, edits, quick-adds and merges, never on a plain bill.
+
+Conditional views tag their rows with `tagged_query`, which reads the
+versions together with the rows. Served from the query cache, the rows
+keep the tag they were fetched with, so a 304 always means the client
+already has this body.
+"""
+import hashlib
+
+from flask import make_response, request
+
+
+COUNTERS = {
+    'products': "SELECT DATABASE(), version FROM catalog_version WHERE id = 1",
+    'customers': "SELECT DATABASE(), version FROM table_versions WHERE name = 'customers'",
+}
+VERSIONED_TABLES = tuple(COUNTERS)
+
+
+def bump(cur, table):
+    """Advance `table`'s version; call before committing the write. Products use catalog.bump."""
+    if table == 'products' or table not in COUNTERS:
+        raise ValueError(f"{table} has no table_versions counter")
+    cur.execute("UPDATE table_versions SET version = version + 1 WHERE name = %s", (table,))
+
+
+def table_version(conn, table):
+    if table not in VERSIONED_TABLES:
+        raise ValueError(f"{table} has no change version")
+    cur = conn.cursor()
+    cur.execute(COUNTERS[table])
+    row = cur.fetchone()
+    cur.close()
+    return ':'.join(str(v) for v in (table,) + tuple(row))
+
+
+def etag_for(conn, tables):
+    versions = '|'.join(table_version(conn, table) for table in tables)
+    return hashlib.sha1(versions.encode()).hexdigest()[:20]
+
+
+class TaggedRows(list):
+    """Query rows and the ETag of the table versions they were read at."""
+    etag = None
+
+
+def tagged_query(tables):
+    """Query function for querycache.fetch that tags the rows with the versions of `tables`.
+
+    Versions and rows are read in the same transaction (autocommit is off),
+    so from the same snapshot: the tag describes exactly these rows, and a
+    cached entry carries its own tag.
+    """
+    def query(conn, sql, params):
+        etag = etag_for(conn, tables)
+        cur = conn.cursor()
+        cur.execute(sql, params)
+        rows = TaggedRows(cur.fetchall())
+        cur.close()
+        rows.etag = etag
+        return rows
+    return query
+
+
+def respond(etag, render):
+    """Conditional GET: 304 if the client's If-None-Match still matches `etag`, else `render()`.
+
+    Clients must revalidate every time (no-cache), so a change shows up on
+    the next request.
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,106 @@
+"""Tiny in-process scheduler for periodic background jobs.
+
+Each job runs on its own daemon thread inside an application context, so it
+can use `mysql.connection` exactly like a request handler does. The context
+is torn down after every run, which returns the connection.
+"""
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server only
+    fcntl = None
+
+
+_jobs = {}
+_lock = threading.Lock()
+_leader = {"file": None, "checked": 0.0}
+
+
+def is_leader(lock_path, retry_seconds=30):
+    """True in exactly one process per host: the one holding an flock on `lock_path`.
+
+    Under a preforking server every worker runs `before_request`, so the
+    periodic jobs (and the PDF pool) would otherwise start once per worker.
+    The lock is released when its process exits; another worker takes over
+    on a later request (tried at most every `retry_seconds`).
+    """
+    if fcntl is None or _leader["file"] is not None:
+        return True
+    now = time.monotonic()
+    if _leader["checked"] and now - _leader["checked"] < retry_seconds:
+        return False
+    _leader["checked"] = now
+    os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+    f = open(lock_path, 'a')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    _leader["file"] = f
+    return True
+
+
+def start_periodic(app, name, interval, fn):
+    """Run `fn()` every `interval` seconds on a daemon thread (once per process)."""
+    with _lock:
+        if name in _jobs:
+            return _jobs[name]
+        stats = {"runs": 0, "errors": 0, "last_result": None, "last_seconds": 0.0, "last_run": None}
+        thread = threading.Thread(target=_loop, args=(app, name, interval, fn, stats),
+                                  name=f"worker-{name}", daemon=True)
+        _jobs[name] = stats
+        thread.start()
+        return stats
+
+
+def _loop(app, name, interval, fn, stats):
+    while True:
+        started = time.perf_counter()
+        try:
+            with app.app_context():
+                stats["last_result"] = fn()
+        except Exception:
+            stats["errors"] += 1
+            app.logger.exception("background job %s failed", name)
+        stats["runs"] += 1
+        stats["last_seconds"] = time.perf_counter() - started
+        stats["last_run"] = time.time()
+        time.sleep(interval)
+
+
+def run_once(app, name, fn):
+    """Run `fn()` once on a daemon thread; False if a job called `name` is still running."""
+    with _lock:
+        stats = _jobs.get(name)
+        if stats is not None and stats.get("running"):
+            return False
+        stats = _jobs[name] = {"runs": 0, "errors": 0, "last_result": None, "last_seconds": 0.0,
+                               "last_run": None, "running": True}
+    threading.Thread(target=_run, args=(app, name, fn, stats), name=f"job-{name}", daemon=True).start()
+    return True
+
+
+def _run(app, name, fn, stats):
+    started = time.perf_counter()
+    try:
+        with app.app_context():
+            stats["last_result"] = fn()
+    except Exception:
+        stats["errors"] += 1
+        app.logger.exception("background job %s failed", name)
+    stats["runs"] += 1
+    stats["last_seconds"] = time.perf_counter() - started
+    stats["last_run"] = time.time()
+    stats["running"] = False
+
+
+def is_running(name):
+    return bool(_jobs.get(name, {}).get("running"))
+
+
+def job_stats():
+    return {name: dict(stats) for name, stats in _jobs.items()}
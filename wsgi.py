@@ -0,0 +1,75 @@
+"""Production entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this module (once, in the gunicorn master, with preload_app) loads
+the app and warms everything that is safe to share across fork: compiled
+templates and URL map, hashed/compressed static assets, the invoice PDF
+layout and the lookup indexes saved in the warm-start snapshot
+(snapshots.py). Each worker then runs `warm_worker()` before it accepts
+traffic: it checks that the database answers, loads the store map and pulls
+only the catalog changes made since the snapshot. The connections it opens
+close with its app context, like a request's; requests open their own.
+"""
+import gc
+import logging
+import time
+
+_started = time.perf_counter()
+
+from app import app, mysql  # noqa: E402
+import compression  # noqa: E402
+from config import Config  # noqa: E402
+import fuzzy  # noqa: E402
+import invoice_pdf  # noqa: E402
+import shards  # noqa: E402
+import snapshots  # noqa: E402
+
+log = logging.getLogger('gunicorn.error')
+timings = {"import_ms": (time.perf_counter() - _started) * 1000}
+
+
+def warm_process():
+    """Fork-safe warmup: no sockets, no threads."""
+    started = time.perf_counter()
+    for name in app.jinja_env.list_templates(filter_func=lambda n: n.endswith('.html')):
+        app.jinja_env.get_template(name)
+    app.url_map.bind('localhost').match('/login')
+    compression._load_assets(app.static_folder)
+    invoice_pdf.layout()
+    if Config.WARM_SNAPSHOT_PATH:
+        timings["snapshot"] = snapshots.load(Config.WARM_SNAPSHOT_PATH)
+    # Keep the collector off everything loaded so far, so workers do not
+    # copy the pages they share with the master just by scanning them
+    gc.freeze()
+    timings["warm_process_ms"] = (time.perf_counter() - started) * 1000
+    timings["preload_ms"] = (time.perf_counter() - _started) * 1000
+    return timings
+
+
+def warm_worker():
+    """Per-worker warmup, after fork: database check, store map, lookup index and one full request."""
+    started = time.perf_counter()
+    with app.app_context():
+        cur = mysql.connection.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchone()
+        cur.close()
+        shards.load_stores(force=True)
+        # Default store's fuzzy lookup index, so the first search does not build
+        # it: the changes since the snapshot, or the whole catalog without one
+        fuzzy.index_for(shards.connection(shards.DEFAULT_STORE_ID), shards.DEFAULT_STORE_ID,
+                        Config.FUZZY_REFRESH_SECONDS)
+    # Runs the before_request hooks (schema check, background job leader)
+    # and the template path end to end
+    with app.test_client() as client:
+        client.get('/login')
+    return (time.perf_counter() - started) * 1000
+
+
+warm_process()
+log.info("Preloaded app in %.0f ms (import %.0f ms, warmup %.0f ms)",
+         timings["preload_ms"], timings["import_ms"], timings["warm_process_ms"])
+if timings.get("snapshot", {}).get("restored"):
+    log.info("Restored %d cached indexes from a %d s old snapshot in %.0f ms",
+             timings["snapshot"]["restored"], timings["snapshot"]["age_seconds"], timings["snapshot"]["ms"])
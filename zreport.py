@@ -0,0 +1,289 @@
+"""End-of-day close: the Z-report, frozen once per store and business day.
+
+`compute` builds the report from two grouped queries over the day's bills
+(by till and payment method) and bill_items (by product), so the database
+returns a few dozen summary rows however busy the day was. A till is the
+signed-in user who rang the bill up.
+
+`close_day` adds the cash the manager counted per till, renders the PDF
+once and stores both in `day_close`. After that the day is never
+recomputed: `get` and `get_pdf` read that one row by its primary key,
+while bills stay untouched for the rest of the evening.
+
+Only the live tables are read; a day is closed long before its fiscal year
+is archived.
+"""
+import datetime
+import io
+import json
+from decimal import Decimal, ROUND_HALF_UP
+
+
+CASH_METHODS = ('cash',)
+
+BILLS_SQL = """
+    SELECT b.user_id, u.username, COALESCE(b.payment_method, 'Unknown'), COUNT(*),
+           COALESCE(SUM(b.total_amount), 0), COALESCE(SUM(b.discount_amount), 0),
+           COALESCE(SUM(COALESCE(b.gst_amount, COALESCE(b.cgst_amount, 0) + COALESCE(b.sgst_amount, 0)
+                                 + COALESCE(b.igst_amount, 0))), 0),
+           COALESCE(SUM(b.final_amount), 0), SUM(COALESCE(b.status, '') <> 'Completed'),
+           MIN(b.bill_number), MAX(b.bill_number), MIN(b.created_at), MAX(b.created_at)
+    FROM bills b
+    LEFT JOIN users u ON u.id = b.user_id
+    WHERE b.store_id = %s AND b.created_at >= %s AND b.created_at < %s
+    GROUP BY b.user_id, u.username, COALESCE(b.payment_method, 'Unknown')
+"""
+
+# bi.created_at is the bill's time too (migration 0003): the range lets
+# partitioned bill_items read one partition
+ITEMS_SQL = """
+    SELECT bi.product_id, p.name, SUM(bi.quantity), SUM(bi.total_price), p.stock
+    FROM bill_items bi
+    JOIN bills b ON b.id = bi.bill_id
+    LEFT JOIN products p ON p.id = bi.product_id
+    WHERE b.store_id = %s AND b.created_at >= %s AND b.created_at < %s
+      AND bi.created_at >= %s AND bi.created_at < %s
+    GROUP BY bi.product_id, p.name, p.stock
+    ORDER BY SUM(bi.quantity) DESC, bi.product_id
+"""
+
+
+def money(value):
+    return float(Decimal(value or 0).quantize(Decimal('0.01'), ROUND_HALF_UP))
+
+
+def parse_date(text):
+    try:
+        return datetime.datetime.strptime(text, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError("Date must be YYYY-MM-DD") from None
+
+
+def _till_key(user_id):
+    return str(user_id) if user_id is not None else 'none'
+
+
+def compute(conn, store_id, day):
+    """The Z-report for `day` as it stands now (a dict ready for JSON)."""
+    start = datetime.datetime.combine(day, datetime.time())
+    end = start + datetime.timedelta(days=1)
+    cur = conn.cursor()
+    cur.execute(BILLS_SQL, (store_id, start, end))
+    bill_rows = cur.fetchall()
+    cur.execute(ITEMS_SQL, (store_id, start, end, start, end))
+    item_rows = cur.fetchall()
+    cur.close()
+
+    totals = {"bills": 0, "gross": Decimal(0), "discount": Decimal(0), "tax": Decimal(0), "net": Decimal(0),
+              "not_completed": 0}
+    by_payment, tills = {}, {}
+    first = last = None
+    for (user_id, username, method, count, gross, discount, tax, net, pending,
+         low_number, high_number, opened, closed) in bill_rows:
+        for key, value in (("bills", count), ("gross", gross), ("discount", discount), ("tax", tax),
+                           ("net", net), ("not_completed", int(pending or 0))):
+            totals[key] += value
+        payment = by_payment.setdefault(method, {"method": method, "bills": 0, "net": Decimal(0)})
+        payment["bills"] += count
+        payment["net"] += net
+        till = tills.setdefault(_till_key(user_id), {
+            "till": _till_key(user_id), "user": username or ('Unassigned' if user_id is None else f"#{user_id}"),
+            "bills": 0, "net": Decimal(0), "payments": {}, "cash_expected": Decimal(0),
+            "first_bill": low_number, "last_bill": high_number})
+        till["bills"] += count
+        till["net"] += net
+        till["payments"][method] = money(net)
+        if method.lower() in CASH_METHODS:
+            till["cash_expected"] += net
+        # Bill numbers are timestamps, so they sort in time order
+        till["first_bill"] = min(filter(None, (till["first_bill"], low_number)), default=None)
+        till["last_bill"] = max(filter(None, (till["last_bill"], high_number)), default=None)
+        first = opened if first is None else min(first, opened)
+        last = closed if last is None else max(last, closed)
+
+    items = [{"product_id": product_id, "name": name or f"Product {product_id}", "qty": int(qty or 0),
+              "revenue": money(revenue), "stock_left": stock}
+             for product_id, name, qty, revenue, stock in item_rows]
+    cash_expected = sum((t["cash_expected"] for t in tills.values()), Decimal(0))
+    return {
+        "store_id": store_id,
+        "date": day.isoformat(),
+        "first_sale": first.isoformat(sep=' ') if first else None,
+        "last_sale": last.isoformat(sep=' ') if last else None,
+        "totals": {key: money(value) if isinstance(value, Decimal) else value for key, value in totals.items()},
+        "payments": [dict(p, net=money(p["net"])) for p in sorted(by_payment.values(), key=lambda p: -p["net"])],
+        "tills": [dict(t, net=money(t["net"]), cash_expected=money(t["cash_expected"]), cash_counted=None,
+                       cash_variance=None)
+                  for _, t in sorted(tills.items())],
+        "cash": {"expected": money(cash_expected), "counted": None, "variance": None},
+        "items": items,
+        "items_sold": sum(item["qty"] for item in items),
+    }
+
+
+def apply_count(report, counted):
+    """Fill in counted cash ({till: amount}) and the variances against what the bills expect."""
+    if not counted:
+        return report
+    total = Decimal(0)
+    for till in report["tills"]:
+        amount = counted.get(till["till"])
+        if amount is None:
+            continue
+        amount = Decimal(str(amount))
+        total += amount
+        till["cash_counted"] = money(amount)
+        till["cash_variance"] = money(amount - Decimal(str(till["cash_expected"])))
+    report["cash"]["counted"] = money(total)
+    report["cash"]["variance"] = money(total - Decimal(str(report["cash"]["expected"])))
+    return report
+
+
+def lines(report, width=64):
+    """The report as (style, text) lines, as receipt.lines does for a bill."""
+    def row(label, value):
+        value = f"{value:,.2f}" if isinstance(value, float) else str(value)
+        return ('', f"{label[:width - len(value) - 1]:<{width - len(value)}}{value}")
+
+    rule = ('', '-' * width)
+    out = [('title', "Z-REPORT (END OF DAY)"), ('center', f"Store {report['store_id']}  {report['date']}")]
+    if report.get("closed_at"):
+        out.append(('center', f"Closed {report['closed_at']}"))
+    out += [rule, ('bold', "SALES")]
+    totals = report["totals"]
+    out += [row("Bills", totals["bills"]), row("Gross", totals["gross"]), row("Discounts", totals["discount"]),
+            row("Tax", totals["tax"]), row("Net sales", totals["net"]),
+            row("Bills not completed", totals["not_completed"])]
+    if report["first_sale"]:
+        out += [row("First sale", report["first_sale"]), row("Last sale", report["last_sale"])]
+    out += [rule, ('bold', "PAYMENT METHODS")]
+    out += [row(f"{p['method']} ({p['bills']})", p["net"]) for p in report["payments"]]
+    out += [rule, ('bold', "TILLS")]
+    for till in report["tills"]:
+        out += [row(f"{till['user']} ({till['bills']} bills)", till["net"]),
+                row("  Bills", f"{till['first_bill']} .. {till['last_bill']}")]
+        for method, net in sorted(till["payments"].items()):
+            out.append(row(f"  {method}", net))
+        out.append(row("  Cash expected", till["cash_expected"]))
+        if till["cash_counted"] is not None:
+            out += [row("  Cash counted", till["cash_counted"]), row("  Variance", till["cash_variance"])]
+    cash = report["cash"]
+    out += [rule, ('bold', "CASH"), row("Expected", cash["expected"])]
+    if cash["counted"] is not None:
+        out += [row("Counted", cash["counted"]), row("Variance", cash["variance"])]
+    out += [rule, ('bold', f"ITEMS SOLD ({report['items_sold']})")]
+    for item in report["items"]:
+        stock = '' if item["stock_left"] is None else f"  left {item['stock_left']}"
+        out.append(row(f"{item['qty']:>5} x {item['name']}{stock}", item["revenue"]))
+    out += [rule, ('center', "*** END OF REPORT ***")]
+    return out
+
+
+def render_pdf(report, width=64):
+    """A4 pages in Courier, one report line per text line."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.pdfgen import canvas
+
+    page_width, page_height = A4
+    margin = 15 * mm
+    font_size = (page_width - 2 * margin) / (width * 0.6)
+    leading = font_size * 1.3
+    per_page = int((page_height - 2 * margin) // leading)
+
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    rows = lines(report, width)
+    for page_start in range(0, len(rows), per_page):
+        y = page_height - margin - font_size
+        for style, text in rows[page_start:page_start + per_page]:
+            pdf.setFont('Courier-Bold' if style in ('title', 'bold') else 'Courier', font_size)
+            if style in ('title', 'center'):
+                pdf.drawCentredString(page_width / 2, y, text)
+            else:
+                pdf.drawString(margin, y, text)
+            y -= leading
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def close_day(conn, store_id, day, closed_by=None, counted=None):
+    """Freeze the day's Z-report. Returns (report, created); closing twice returns the first close."""
+    existing = get(conn, store_id, day)
+    if existing is not None:
+        return existing, False
+    report = apply_count(compute(conn, store_id, day), counted)
+    report["closed_at"] = datetime.datetime.now().isoformat(sep=' ', timespec='seconds')
+    report["closed_by"] = closed_by
+    pdf = render_pdf(report)
+    cur = conn.cursor()
+    created = cur.execute("""
+        INSERT IGNORE INTO day_close (store_id, business_date, closed_at, closed_by, bill_count, net_sales,
+                                      tax_total, cash_expected, cash_counted, report, pdf)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, (store_id, day, report["closed_at"], closed_by, report["totals"]["bills"], report["totals"]["net"],
+          report["totals"]["tax"], report["cash"]["expected"], report["cash"]["counted"],
+          json.dumps(report), pdf))
+    conn.commit()
+    cur.close()
+    if not created:
+        # Closed by someone else in the meantime: theirs is the report
+        return get(conn, store_id, day), False
+    return report, True
+
+
+def get(conn, store_id, day):
+    """The frozen report for a closed day, or None."""
+    cur = conn.cursor()
+    cur.execute("SELECT report FROM day_close WHERE store_id = %s AND business_date = %s", (store_id, day))
+    row = cur.fetchone()
+    cur.close()
+    return json.loads(row[0]) if row else None
+
+
+def get_pdf(conn, store_id, day):
+    cur = conn.cursor()
+    cur.execute("SELECT pdf FROM day_close WHERE store_id = %s AND business_date = %s", (store_id, day))
+    row = cur.fetchone()
+    cur.close()
+    return bytes(row[0]) if row and row[0] is not None else None
+
+
+def history(conn, store_id, limit=30):
+    """Headline figures of the latest closed days, newest first."""
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT business_date, closed_at, bill_count, net_sales, tax_total, cash_expected, cash_counted
+        FROM day_close WHERE store_id = %s ORDER BY business_date DESC LIMIT %s
+    """, (store_id, limit))
+    rows = cur.fetchall()
+    cur.close()
+    return [{"date": d.isoformat(), "closed_at": str(closed_at), "bills": bills, "net": money(net),
+             "tax": money(tax), "cash_expected": money(expected),
+             "cash_counted": None if counted is None else money(counted),
+             "cash_variance": None if counted is None else money(counted - expected)}
+            for d, closed_at, bills, net, tax, expected, counted in rows]
+
+
+def close_open_days(conn, store_id, days_back=7, today=None):
+    """Close (without a cash count) days that have bills but were never closed.
+
+    Yesterday is left open for the manager to count the cash; a day is
+    closed automatically once the day after it has ended too.
+    """
+    today = today or datetime.date.today()
+    start = today - datetime.timedelta(days=days_back)
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT DISTINCT DATE(created_at) FROM bills
+        WHERE store_id = %s AND created_at >= %s AND created_at < %s
+    """, (store_id, start, today - datetime.timedelta(days=1)))
+    days = {row[0] for row in cur.fetchall()}
+    cur.execute("SELECT business_date FROM day_close WHERE store_id = %s AND business_date >= %s",
+                (store_id, start))
+    days -= {row[0] for row in cur.fetchall()}
+    cur.close()
+    for day in sorted(days):
+        close_day(conn, store_id, day)
+    return len(days)